@@ -2,6 +2,8 @@
 
 if [[ "${1}" == "celery" ]]; then
   celery -A online_shop worker --loglevel=info
+elif [[ "${1}" == "beat" ]]; then
+  celery -A online_shop beat --loglevel=info
 elif [[ "${1}" == "flower" ]]; then
   celery -A online_shop flower
  fi
@@ -18,5 +18,12 @@ python manage.py migrate
 # Сбор статистических файлов
 python manage.py collectstatic --no-input --clear
 #python manage.py runserver 0.0.0.0:8000
-gunicorn online_shop.wsgi:application --bind 0.0.0.0:8000
+# режим запуска: wsgi (синхронные воркеры и представления) или asgi
+# (воркеры uvicorn, асинхронные представления), см. SERVER_MODE в settings.py
+if [ "$SERVER_MODE" = "asgi" ]
+then
+    gunicorn online_shop.asgi:application -k uvicorn.workers.UvicornWorker --bind 0.0.0.0:8000
+else
+    gunicorn online_shop.wsgi:application --bind 0.0.0.0:8000
+fi
 exec "$@"
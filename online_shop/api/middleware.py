@@ -0,0 +1,92 @@
+import logging
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+
+from services.metrics import (
+    export_enabled,
+    export_request,
+    finish_request,
+    server_timing,
+    start_request,
+)
+
+log = logging.getLogger(__name__)
+
+
+class RequestMetricsMiddleware(object):
+    """
+    Показатели обработки запроса: количество и время запросов к базе данных,
+    обращения к кешу и время сериализации. Передаются клиенту в заголовке
+    Server-Timing, пишутся в лог и (если включен экспорт) добавляются
+    в гистограммы для Prometheus. Работает в режимах WSGI и ASGI
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        token = start_request()
+        start = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics = finish_request(token)
+        duration = perf_counter() - start
+
+        self.report(request, response, metrics, duration)
+        if export_enabled():
+            export_request(self.view_name(request), request.method, metrics, duration)
+        return response
+
+    async def __acall__(self, request):
+        token = start_request()
+        start = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics = finish_request(token)
+        duration = perf_counter() - start
+
+        self.report(request, response, metrics, duration)
+        if export_enabled():
+            await sync_to_async(export_request, thread_sensitive=False)(
+                self.view_name(request), request.method, metrics, duration
+            )
+        return response
+
+    @staticmethod
+    def view_name(request) -> str:
+        # имя маршрута, а не путь: у путей с id слишком много значений
+        match = getattr(request, "resolver_match", None)
+        if match is None:
+            return "unmatched"
+        return match.view_name
+
+    def report(self, request, response, metrics, duration: float) -> None:
+        response["Server-Timing"] = server_timing(metrics, duration)
+        fields = {
+            "view": self.view_name(request),
+            "method": request.method,
+            "status": response.status_code,
+            "duration_ms": round(duration * 1000, 1),
+            "queries": metrics.queries,
+            "sql_ms": round(metrics.sql_time * 1000, 1),
+            "serializer_ms": round(metrics.serializer_time * 1000, 1),
+            "cache_hits": metrics.cache_hits,
+            "cache_misses": metrics.cache_misses,
+        }
+        log.info(
+            " ".join(f"{name}=%s" for name in fields),
+            *fields.values(),
+            extra={"metrics": fields},
+        )
@@ -1,3 +1,99 @@
-from django.test import TestCase
+from datetime import datetime, timezone
+from decimal import Decimal
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django_redis import get_redis_connection
+from rest_framework.renderers import JSONRenderer
+
+from api.renderers import FastJSONRenderer
+
+from services.metrics import METRICS_KEY
+
+
+class RequestMetricsTestCase(TestCase):
+    fixtures = ["data.json"]
+
+    def setUp(self) -> None:
+        get_redis_connection("default").delete(METRICS_KEY)
+        self.addCleanup(get_redis_connection("default").delete, METRICS_KEY)
+
+    def test_server_timing(self):
+        """
+        Тест заголовка Server-Timing с количеством запросов к базе данных
+        """
+        with self.assertNumQueries(4):
+            response = self.client.get(
+                reverse("api:orders_details", kwargs={"pk": 1}),
+            )
+
+        self.assertIn('desc="4 queries"', response["Server-Timing"])
+        self.assertIn("serializer;dur=", response["Server-Timing"])
+
+    def test_metrics_disabled(self):
+        """
+        Тест недоступности метрик без токена в настройках
+        """
+        response = self.client.get(reverse("api:metrics"))
+
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_metrics(self):
+        """
+        Тест вывода гистограмм в формате Prometheus
+        """
+        self.client.get(reverse("api:product_details", kwargs={"pk": 1}))
+
+        forbidden = self.client.get(
+            reverse("api:metrics"), HTTP_AUTHORIZATION="Bearer wrong"
+        )
+        response = self.client.get(
+            reverse("api:metrics"), HTTP_AUTHORIZATION="Bearer secret"
+        )
+
+        self.assertEqual(forbidden.status_code, 403)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            'shop_request_queries_count{view="api:product_details",method="GET"} 1',
+            response.content.decode(),
+        )
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_metrics_invalid_header(self):
+        """
+        Тест отказа в доступе к метрикам без токена, с пустым токеном,
+        без схемы Bearer и с не-ASCII символами в заголовке
+        """
+        for header in (None, "Bearer ", "secret", "Bearer sécret"):
+            with self.subTest(header=header):
+                extra = {} if header is None else {"HTTP_AUTHORIZATION": header}
+                response = self.client.get(reverse("api:metrics"), **extra)
+
+                self.assertEqual(response.status_code, 403)
+
+
+class FastJSONRendererTestCase(SimpleTestCase):
+    def test_render_same_as_json_renderer(self):
+        """
+        Тест совпадения вывода с JSONRenderer
+        """
+        data = {
+            "price": Decimal("67399.00"),
+            "date": datetime(2024, 11, 1, 12, 30, 15, 120, tzinfo=timezone.utc),
+            "title": "Ноутбук\u2028",
+            "items": [{"id": 1, "rating": 4.5, "tags": []}],
+            1: None,
+        }
+
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_render_indent(self):
+        """
+        Тест форматированного вывода стандартным рендерером
+        """
+        rendered = FastJSONRenderer().render(
+            {"id": 1}, "application/json; indent=4", {}
+        )
+
+        self.assertEqual(rendered, b'{\n    "id": 1\n}')
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 
 from myauth.views import (
@@ -15,11 +16,18 @@ from shopapp.views import (
     ProductReviewApiView,
     CategoriesApiView,
     CatalogApiView,
+    CatalogFacetsApiView,
+    SearchApiView,
     GetUserForReviewApiView,
     PopularListApiView,
     LimitListApiView,
     BannersListApiView,
     SalesListApiView,
+    AsyncProductApiView,
+    AsyncCategoriesApiView,
+    AsyncCatalogApiView,
+    AsyncCatalogFacetsApiView,
+    AsyncBannersListApiView,
 )
 
 from basket.views import BasketApiView
@@ -27,10 +35,20 @@ from orders.views import (
     OrderApiView,
     OrderDetailApiView,
     PaymentApiView,
+    PaymentCallbackApiView,
 )
+from api.views import MetricsApiView
 
 app_name = "api"
 
+if settings.SERVER_MODE == "asgi":
+    # в режиме ASGI чтение каталога не блокирует цикл событий
+    ProductApiView = AsyncProductApiView
+    CategoriesApiView = AsyncCategoriesApiView
+    CatalogApiView = AsyncCatalogApiView
+    CatalogFacetsApiView = AsyncCatalogFacetsApiView
+    BannersListApiView = AsyncBannersListApiView
+
 urlpatterns = [
     path("sign-up/", UserRegistrationView.as_view(), name="sign_up"),
     path("sign-out/", LogoutAPIView.as_view(), name="logout"),
@@ -41,6 +59,8 @@ urlpatterns = [
     path("tags/", TagApiView.as_view(), name="tags"),
     path("categories/", CategoriesApiView.as_view(), name="categories"),
     path("catalog/", CatalogApiView.as_view(), name="catalog"),
+    path("catalog/facets/", CatalogFacetsApiView.as_view(), name="catalog_facets"),
+    path("search/", SearchApiView.as_view(), name="search"),
     path("banners/", BannersListApiView.as_view(), name="banners"),
     path("sales/", SalesListApiView.as_view(), name="sales"),
     path("products/popular/", PopularListApiView.as_view(), name="popular"),
@@ -56,4 +76,10 @@ urlpatterns = [
     path("orders/", OrderApiView.as_view(), name="orders"),
     path("order/<int:pk>/", OrderDetailApiView.as_view(), name="orders_details"),
     path("payment/<int:pk>/", PaymentApiView.as_view(), name="payment"),
+    path(
+        "payment/callback/",
+        PaymentCallbackApiView.as_view(),
+        name="payment_callback",
+    ),
+    path("metrics/", MetricsApiView.as_view(), name="metrics"),
 ]
@@ -1,3 +1,63 @@
-from django.shortcuts import render
+import hmac
+import logging
 
-# Create your views here.
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from rest_framework import status
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from drf_spectacular.utils import extend_schema, OpenApiResponse
+
+from services.metrics import export_enabled, prometheus_text
+
+log = logging.getLogger(__name__)
+
+
+class MetricsApiView(APIView):
+    # внутренний эндпоинт для Prometheus, доступ по токену METRICS_TOKEN
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    @extend_schema(
+        tags=["metrics"],
+        summary="Метрики запросов в формате Prometheus",
+        responses={
+            status.HTTP_200_OK: OpenApiResponse(
+                response=str,
+                description="Гистограммы времени, запросов к базе данных и сериализации",
+            ),
+            status.HTTP_403_FORBIDDEN: OpenApiResponse(
+                response=None,
+                description="Неверный токен",
+            ),
+            status.HTTP_404_NOT_FOUND: OpenApiResponse(
+                response=None,
+                description="Экспорт метрик выключен",
+            ),
+        },
+    )
+    def get(self, request):
+        """
+        Вывод гистограмм (заголовок Authorization: Bearer <METRICS_TOKEN>)
+        :param request:
+        :return:
+        """
+        if not export_enabled():
+            raise Http404
+
+        # заголовок может содержать не-ASCII символы: сравниваются байты
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        if (
+            scheme != "Bearer"
+            or not token
+            or not hmac.compare_digest(token.encode(), settings.METRICS_TOKEN.encode())
+        ):
+            log.warning("Запрос метрик с неверным токеном")
+            return Response(
+                {"message": "Invalid token"}, status=status.HTTP_403_FORBIDDEN
+            )
+
+        return HttpResponse(
+            prometheus_text(), content_type="text/plain; version=0.0.4; charset=utf-8"
+        )
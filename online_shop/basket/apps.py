@@ -5,3 +5,6 @@ class BasketConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "basket"
     verbose_name = "Basket"
+
+    def ready(self):
+        import basket.signals  # noqa: F401
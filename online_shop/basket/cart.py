@@ -1,30 +1,118 @@
 from typing import Any
 import logging
-from datetime import datetime
-from zoneinfo import ZoneInfo
+from uuid import uuid4
 
 from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+from django_redis import get_redis_connection
 
-from shopapp.models import Product, Sales
+from services.pricing import get_price_resolver
+from services.reservation import merge as merge_reservations
+from shopapp.models import Product
 
 log = logging.getLogger(__name__)
 
 
+def session_cart_token(session) -> str:
+    """
+    Токен корзины, хранящийся в сессии (сохраняется при входе пользователя)
+    :param session:
+        сессия покупателя
+    :return: str
+    """
+    token = session.get(settings.CART_TOKEN_SESSION_ID)
+    if not token:
+        token = session[settings.CART_TOKEN_SESSION_ID] = uuid4().hex
+    return token
+
+
+def get_cart_class() -> type:
+    """
+    Класс корзины, выбранный настройкой CART_BACKEND
+    :return: type
+    """
+    return import_string(settings.CART_BACKEND)
+
+
+def get_cart(request):
+    """
+    Корзина покупателя текущего запроса
+    :param request:
+    :return: Cart | RedisCart
+    """
+    return get_cart_class()(request)
+
+
+def discard_cart(token: str) -> None:
+    """
+    Удаление корзины по токену вне запроса покупателя (после оплаты заказа)
+    :param token: str
+        токен корзины
+    :return: None
+    """
+    get_cart_class().discard(token)
+
+
 class Cart(object):
+    """
+    Корзина, хранящаяся в сессии покупателя
+    """
+
+    # отметка в кеше об удалении корзины вне запроса покупателя
+    DISCARDED_KEY = "cart_discarded:{}"
 
     def __init__(self, request):
         """
         Инициализация корзины
         """
+        self.request = request
         self.session = request.session
 
         cart = self.session.get(settings.CART_SESSION_ID)
+        if cart and cache.delete(self.DISCARDED_KEY.format(self.token)):
+            log.info("Корзина товаров удалена после оплаты заказа")
+            cart = None
         if not cart:
             log.info("Инициализация корзины товаров")
             cart = self.session[settings.CART_SESSION_ID] = {}
 
         self.cart = cart
 
+    @property
+    def token(self) -> str:
+        """
+        Токен корзины, под который резервируются товары на складе
+        :return: str
+        """
+        return session_cart_token(self.session)
+
+    @classmethod
+    def merge(cls, request, user) -> None:
+        """
+        Объединение корзин при входе пользователя
+        (корзина в сессии сохраняется при входе, объединять нечего)
+        """
+        return None
+
+    @classmethod
+    def discard(cls, token: str) -> None:
+        """
+        Удаление корзины по токену. Сессия покупателя вне его запроса
+        недоступна, поэтому корзина удаляется при следующем обращении к ней
+        :param token: str
+        :return: None
+        """
+        cache.set(cls.DISCARDED_KEY.format(token), True, settings.SESSION_COOKIE_AGE)
+
+    def price(self, product: Product) -> str:
+        """
+        Цена товара в корзине (с учетом действующей скидки)
+        :param product: Product
+        :return: str
+        """
+        return str(get_price_resolver(self.request).price(product.pk))
+
     def add(self, product: Product, quantity: int = 1):
         """
         Добавить продукт в корзину или обновить его количество.
@@ -36,20 +124,7 @@ class Cart(object):
         """
         product_id = str(product.id)
         if product_id not in self.cart:
-            self.cart[product_id] = {"quantity": 0, "price": str(product.price)}
-
-            # search discount for product
-            date_now = datetime.now(tz=ZoneInfo(settings.TIME_ZONE))
-            product_discount = Sales.objects.filter(product=product).first()
-
-            if product_discount and (
-                product_discount.dateFrom <= date_now <= product_discount.dateTo
-            ):
-                log.info(
-                    "У товара с id%s цена со скидкой %s"
-                    % (product_id, product_discount.salePrice)
-                )
-                self.cart[product_id]["price"] = str(product_discount.salePrice)
+            self.cart[product_id] = {"quantity": 0, "price": self.price(product)}
 
         self.cart[product_id]["quantity"] += quantity
         self.save()
@@ -106,3 +181,168 @@ class Cart(object):
     def delete_cart(self):
         log.info("Удаление корзины товаров")
         del self.session[settings.CART_SESSION_ID]
+
+
+class RedisCart(object):
+    """
+    Корзина, хранящаяся в Redis в виде хэша с полями
+    "<id товара>:quantity" и "<id товара>:price".
+    Изменение количества товара выполняется одной командой HINCRBY,
+    брошенная корзина удаляется Redis по истечении TTL.
+    Корзина авторизованного пользователя привязана к нему,
+    при входе в нее переносится корзина анонимного покупателя
+    """
+
+    QUANTITY_FIELD = "{}:quantity"
+    PRICE_FIELD = "{}:price"
+
+    def __init__(self, request):
+        """
+        Инициализация корзины
+        """
+        self.request = request
+        self.session = request.session
+        self.user = getattr(request, "user", None)
+        self.redis = get_redis_connection("default")
+        self.key = self.cart_key(self.token)
+
+    @staticmethod
+    def cart_key(token: str) -> str:
+        """
+        Ключ хэша корзины в Redis
+        :param token: str
+        :return: str
+        """
+        return cache.make_key(f"cart:{token}")
+
+    @staticmethod
+    def user_token(user) -> str:
+        """
+        Токен корзины авторизованного пользователя
+        :return: str
+        """
+        return f"user:{user.pk}"
+
+    @property
+    def token(self) -> str:
+        """
+        Токен корзины, под который резервируются товары на складе
+        :return: str
+        """
+        if self.user is not None and self.user.is_authenticated:
+            return self.user_token(self.user)
+        return session_cart_token(self.session)
+
+    @classmethod
+    def merge(cls, request, user) -> None:
+        """
+        Перенос корзины анонимного покупателя в корзину вошедшего пользователя
+        (вместе с резервом товаров на складе)
+        :param request:
+        :param user: User
+        :return: None
+        """
+        anonymous_token = request.session.get(settings.CART_TOKEN_SESSION_ID)
+        if not anonymous_token:
+            return
+
+        redis = get_redis_connection("default")
+        source = cls.cart_key(anonymous_token)
+        target = cls.cart_key(cls.user_token(user))
+
+        items = redis.hgetall(source)
+        if items:
+            with redis.pipeline() as pipe:
+                for field, value in items.items():
+                    if field.endswith(b":quantity"):
+                        pipe.hincrby(target, field, int(value))
+                    else:
+                        pipe.hsetnx(target, field, value)
+                pipe.delete(source)
+                pipe.expire(target, settings.SESSION_COOKIE_AGE)
+                pipe.execute()
+            log.info("Корзина покупателя перенесена пользователю с id %s", user.pk)
+
+        merge_reservations(anonymous_token, cls.user_token(user))
+
+    @classmethod
+    def discard(cls, token: str) -> None:
+        """
+        Удаление корзины по токену
+        :param token: str
+        :return: None
+        """
+        get_redis_connection("default").delete(cls.cart_key(token))
+
+    def price(self, product: Product) -> str:
+        """
+        Цена товара в корзине (с учетом действующей скидки)
+        :param product: Product
+        :return: str
+        """
+        return str(get_price_resolver(self.request).price(product.pk))
+
+    def add(self, product: Product, quantity: int = 1):
+        """
+        Добавить продукт в корзину или обновить его количество.
+        :param product: Product
+            добавляемый продукт в корзину
+        :param quantity: int
+            количество добавляемого продукта
+        :return: None
+        """
+        price_field = self.PRICE_FIELD.format(product.id)
+        if not self.redis.hexists(self.key, price_field):
+            self.redis.hsetnx(self.key, price_field, self.price(product))
+
+        with self.redis.pipeline() as pipe:
+            pipe.hincrby(self.key, self.QUANTITY_FIELD.format(product.id), quantity)
+            pipe.expire(self.key, settings.SESSION_COOKIE_AGE)
+            pipe.execute()
+
+    def remove(self, id: int, quantity: int):
+        """
+        Удаление товара из корзины.
+        :param id: int
+            id продукта удаляемого из корзины
+        :param quantity: int
+            количество удаляемых из корзины продуктов
+        :return:
+        """
+        quantity_field = self.QUANTITY_FIELD.format(id)
+        if not self.redis.hexists(self.key, quantity_field):
+            return
+
+        left = self.redis.hincrby(self.key, quantity_field, -quantity)
+        if left <= 0:
+            # пустой хэш Redis удаляет сам
+            self.redis.hdel(self.key, quantity_field, self.PRICE_FIELD.format(id))
+
+    def list_id_products(self) -> list[str]:
+        """
+        Возвращает список id товаров в корзине
+        :return: list[str]
+        """
+        return [
+            field.decode().split(":")[0]
+            for field in self.redis.hkeys(self.key)
+            if field.endswith(b":quantity")
+        ]
+
+    def get(self, id: int) -> dict[str, Any]:
+        """
+        Возвращает данные о продукте в корзине по его id
+        :param id:int
+            id продукта
+        :return: dict[str, Any]
+        """
+        quantity, price = self.redis.hmget(
+            self.key, self.QUANTITY_FIELD.format(id), self.PRICE_FIELD.format(id)
+        )
+        if quantity is None:
+            raise KeyError(str(id))
+        return {"quantity": int(quantity), "price": price.decode()}
+
+    def delete_cart(self):
+        log.info("Удаление корзины товаров")
+        self.redis.delete(self.key)
@@ -1,3 +1,43 @@
 from django.db import models
 
-# Create your models here.
+from shopapp.models import Product
+
+
+class Reservation(models.Model):
+    """
+    Товар, зарезервированный на складе под корзину покупателя
+    """
+
+    cart_token = models.CharField(
+        max_length=32, db_index=True, verbose_name="Токен корзины"
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name="reservations",
+        verbose_name="Товар",
+    )
+    quantity = models.PositiveIntegerField(default=0, verbose_name="Количество")
+    expires_at = models.DateTimeField(
+        db_index=True, verbose_name="Окончание резервирования"
+    )
+
+    class Meta:
+        """
+        Имена в административной панели, ограничения
+        """
+
+        verbose_name = "Резерв товара"
+        verbose_name_plural = "Резервы товаров"
+
+        constraints = [
+            models.UniqueConstraint(
+                fields=["cart_token", "product"], name="reservation_cart_product"
+            ),
+        ]
+
+    def __str__(self):
+        """
+        Возвращение строки
+        """
+        return f"{self.cart_token}_{self.product_id}"
@@ -0,0 +1,18 @@
+import logging
+
+from django.contrib.auth.signals import user_logged_in
+from django.dispatch import receiver
+
+from basket.cart import get_cart_class
+
+log = logging.getLogger(__name__)
+
+
+@receiver(user_logged_in)
+def merge_cart_on_login(sender, request, user, **kwargs):
+    """
+    Объединение корзины анонимного покупателя с корзиной вошедшего пользователя
+    """
+    if request is None:
+        return
+    get_cart_class().merge(request, user)
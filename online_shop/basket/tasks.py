@@ -0,0 +1,15 @@
+import logging
+
+from celery import shared_task
+
+from services.reservation import release_expired
+
+log = logging.getLogger(__name__)
+
+
+@shared_task
+def release_expired_reservations() -> int:
+    """
+    Периодическая задача возврата на склад товаров из брошенных корзин
+    """
+    return release_expired()
@@ -1,8 +1,21 @@
 import json
-from django.test import TestCase
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django_redis import get_redis_connection
 
+from basket.cart import RedisCart
+from basket.models import Reservation
+from services.cache import CATEGORY_TAG, get_tag_versions
+from services.reservation import release_expired, reserve, release
 from shopapp.models import Product
 
 
@@ -54,6 +67,20 @@ class BasketTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(count_add - count_after_delete, count_product - 1)
 
+    def test_reserve_invalidates_category(self):
+        """
+        Тест сброса кеша категории при изменении остатка товара
+        (страницы каталога с фильтром по наличию)
+        """
+        product = Product.objects.get(pk=1)
+        tag = CATEGORY_TAG.format(product.category_id)
+        version = get_tag_versions((tag,))[tag]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve("cart-category", product.pk, 1)
+
+        self.assertNotEqual(get_tag_versions((tag,))[tag], version)
+
     def test_add_product_out_of_stock(self):
         """
         Тест добавления продукта в корзину при его отсутствии на складе
@@ -73,6 +100,24 @@ class BasketTestCase(TestCase):
         self.assertEqual(count_product, 0)
         self.assertEqual(received_data["message"], "The product is out of stock")
 
+    def test_get_basket_prices_single_query(self):
+        """
+        Тест загрузки цен всех товаров корзины без запросов к скидкам
+        (цена с учетом скидки хранится в товаре)
+        """
+        for id_product in (1, 2, 3):
+            self.client.post(reverse("api:basket"), {"id": id_product, "count": 1})
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("api:basket"))
+
+        sales_queries = [
+            query for query in queries if '"shopapp_sales"' in query["sql"]
+        ]
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.content)), 3)
+        self.assertEqual(len(sales_queries), 0)
+
     def test_add_product_limit(self):
         """
         Тест добавления продукта в корзину при превышении наличия
@@ -92,3 +137,154 @@ class BasketTestCase(TestCase):
         self.assertEqual(response.status_code, 201)
         self.assertTrue(count_product_real == count_in_basket)
         self.assertTrue(count_product > count_in_basket)
+
+
+@override_settings(CART_BACKEND="basket.cart.RedisCart")
+class RedisBasketTestCase(TestCase):
+    fixtures = ["data.json"]
+
+    def delete_redis_cart(self, token: str):
+        get_redis_connection("default").delete(RedisCart.cart_key(token))
+
+    def tearDown(self):
+        token = self.client.session.get(settings.CART_TOKEN_SESSION_ID)
+        if token:
+            self.delete_redis_cart(token)
+
+    def test_add_and_delete_product(self):
+        """
+        Тест добавления и удаления продукта в корзине, хранящейся в Redis
+        """
+        data = {"id": 1, "count": 2}
+        response = self.client.post(reverse("api:basket"), data)
+        received_data = json.loads(response.content)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(received_data[0]["count"], 2)
+        self.assertEqual(received_data[0]["price"], "67399.00")
+
+        headers = {"Content-Type": "application/json"}
+        response = self.client.delete(
+            reverse("api:basket"), headers=headers, data=json.dumps(data)
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), [])
+        self.assertFalse(Reservation.objects.exists())
+
+    def test_order_shortage_after_commit(self):
+        """
+        Тест уменьшения количества недостающего товара в корзине
+        при оформлении заказа только после фиксации транзакции
+        """
+        user = User.objects.get(username="Sem")
+        self.addCleanup(self.delete_redis_cart, RedisCart.user_token(user))
+        self.client.force_login(user)
+        self.client.post(reverse("api:basket"), {"id": 1, "count": 2})
+        Reservation.objects.all().delete()
+        Product.objects.filter(pk=1).update(count=1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("api:orders"))
+            basket = json.loads(self.client.get(reverse("api:basket")).content)
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(basket[0]["count"], 2)
+
+        basket = json.loads(self.client.get(reverse("api:basket")).content)
+        self.assertEqual(basket[0]["count"], 1)
+
+    def test_merge_on_login(self):
+        """
+        Тест переноса корзины анонимного покупателя пользователю при входе
+        """
+        user = User.objects.create_user(username="RedisCartUser", password="1qaz!QAZ")
+        self.addCleanup(self.delete_redis_cart, RedisCart.user_token(user))
+        self.client.post(reverse("api:basket"), {"id": 1, "count": 2})
+
+        self.client.force_login(user)
+        response = self.client.get(reverse("api:basket"))
+        received_data = json.loads(response.content)
+
+        self.assertEqual(received_data[0]["count"], 2)
+        self.assertEqual(
+            Reservation.objects.get(product_id=1).cart_token, f"user:{user.pk}"
+        )
+
+
+class ReservationConcurrencyTestCase(TransactionTestCase):
+    """
+    Резервирование товара параллельными запросами (каждый поток работает
+    в своем соединении с базой данных)
+    """
+
+    fixtures = ["data.json"]
+    threads = 8
+
+    def run_in_threads(self, func, args: list[tuple]) -> list:
+        def target(arguments):
+            try:
+                return func(*arguments)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            return list(executor.map(target, args))
+
+    def test_reserve_no_oversell(self):
+        """
+        Тест отсутствия перепродажи при одновременном резервировании
+        """
+        id_product = 1
+        Product.objects.filter(pk=id_product).update(count=10)
+
+        reserved = self.run_in_threads(
+            reserve, [(f"cart{i}", id_product, 3) for i in range(self.threads)]
+        )
+
+        product = Product.objects.get(pk=id_product)
+        total = sum(Reservation.objects.values_list("quantity", flat=True))
+
+        self.assertEqual(sum(reserved), 10)
+        self.assertEqual(sorted(reserved)[-3:], [3, 3, 3])
+        self.assertEqual(product.count, 0)
+        self.assertEqual(total, 10)
+
+    def test_reserve_release_balance(self):
+        """
+        Тест сохранения общего количества товара при резервировании и возврате
+        """
+        id_product = 1
+        Product.objects.filter(pk=id_product).update(count=20)
+
+        def add_and_remove(cart_token: str) -> int:
+            kept = 0
+            for _ in range(5):
+                kept += reserve(cart_token, id_product, 2)
+                kept -= release(cart_token, id_product, 1)
+            return kept
+
+        kept = self.run_in_threads(
+            add_and_remove, [(f"cart{i}",) for i in range(self.threads)]
+        )
+
+        product = Product.objects.get(pk=id_product)
+        total = sum(Reservation.objects.values_list("quantity", flat=True))
+
+        self.assertEqual(total, sum(kept))
+        self.assertEqual(product.count + total, 20)
+
+    def test_release_expired(self):
+        """
+        Тест возврата на склад товаров из просроченных резервов
+        """
+        id_product = 1
+        Product.objects.filter(pk=id_product).update(count=5)
+        reserve("abandoned", id_product, 2)
+        reserve("active", id_product, 1)
+        Reservation.objects.filter(cart_token="abandoned").update(
+            expires_at=timezone.now() - timedelta(minutes=1)
+        )
+
+        self.assertEqual(release_expired(), 1)
+        self.assertEqual(Product.objects.get(pk=id_product).count, 4)
+        self.assertFalse(Reservation.objects.filter(cart_token="abandoned").exists())
@@ -10,13 +10,33 @@ from drf_spectacular.utils import (
     OpenApiExample,
 )
 
-from basket.cart import Cart
+from basket.cart import get_cart
+from services.metrics import serializer_data
+from services.pricing import get_price_resolver
+from services.reservation import reserve, release, touch
 from shopapp.views import Product
 from basket.serializers import BasketSerializer, BasketDataSerializer
 
 log = logging.getLogger(__name__)
 
 
+def basket_context(request, cart, list_id: list[str]) -> dict:
+    """
+    Контекст сериализатора корзины: корзина и цены всех ее товаров
+    (цены загружаются одним запросом)
+    :param request:
+    :param cart: Cart | RedisCart
+    :param list_id: list[str]
+        id товаров в корзине
+    :return: dict
+    """
+    return {
+        "request": request,
+        "cart": cart,
+        "prices": get_price_resolver(request).prices(list_id),
+    }
+
+
 class BasketApiView(APIView):
     @extend_schema(
         tags=["basket"],
@@ -57,24 +77,18 @@ class BasketApiView(APIView):
         id_product = int(request.data.get("id"))
         count_product = int(request.data.get("count"))
 
-        cart = Cart(request)
+        cart = get_cart(request)
         product: Product = get_object_or_404(Product, pk=id_product)
 
-        if product.count == 0:
+        # резервирование выполняется атомарно, при нехватке товара - частично
+        count_product = reserve(cart.token, product.pk, count_product)
+        if count_product == 0:
             log.info("Товар с id %s отсутствует на складе" % id_product)
             return Response(
                 {"message": "The product is out of stock"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        if product.count > count_product:
-            product.count -= count_product
-        else:
-            count_product = product.count
-            product.count = 0
-
-        product.save()
-
         cart.add(product=product, quantity=count_product)
         log.info(
             "Добавление в корзину продукта с id %s в количестве %s"
@@ -82,18 +96,13 @@ class BasketApiView(APIView):
         )
 
         list_id = cart.list_id_products()
-        products = (
-            Product.objects.filter(id__in=list_id)
-            .select_related("category")
-            .prefetch_related(
-                "tags", "images", "specifications", "reviews", "reviews__author"
-            )
-            .order_by("id")
+        products = Product.objects.filter(id__in=list_id).for_basket()
+        serializer = BasketSerializer(
+            products, many=True, context=basket_context(request, cart, list_id)
         )
-        serializer = BasketSerializer(products, many=True, context={"request": request})
 
         return Response(
-            serializer.data,
+            serializer_data(serializer),
             status=status.HTTP_201_CREATED,
         )
 
@@ -114,19 +123,15 @@ class BasketApiView(APIView):
         :param request:
         :return:
         """
-        cart = Cart(request)
+        cart = get_cart(request)
+        touch(cart.token)
         list_id = cart.list_id_products()
-        products = (
-            Product.objects.filter(id__in=list_id)
-            .select_related("category")
-            .prefetch_related(
-                "tags", "images", "specifications", "reviews", "reviews__author"
-            )
-            .order_by("id")
+        products = Product.objects.filter(id__in=list_id).for_basket()
+        serializer = BasketSerializer(
+            products, many=True, context=basket_context(request, cart, list_id)
         )
-        serializer = BasketSerializer(products, many=True, context={"request": request})
         return Response(
-            serializer.data,
+            serializer_data(serializer),
             status=status.HTTP_200_OK,
         )
 
@@ -169,28 +174,23 @@ class BasketApiView(APIView):
             "Удаление из корзины продукта с id %s в количестве %s"
             % (id_product, count_product)
         )
-        cart = Cart(request)
+        cart = get_cart(request)
         cart.remove(id_product, count_product)
 
         product: Product = get_object_or_404(Product, pk=id_product)
-        product.count += count_product
-        product.save()
+        # на склад возвращается не больше, чем было зарезервировано корзиной
+        count_product = release(cart.token, product.pk, count_product)
         log.info(
             "Возвращение на склад из корзины продукта с id %s в количестве %s"
             % (id_product, count_product)
         )
 
         list_id = cart.list_id_products()
-        products = (
-            Product.objects.filter(id__in=list_id)
-            .select_related("category")
-            .prefetch_related(
-                "tags", "images", "specifications", "reviews", "reviews__author"
-            )
-            .order_by("id")
+        products = Product.objects.filter(id__in=list_id).for_basket()
+        serializer = BasketSerializer(
+            products, many=True, context=basket_context(request, cart, list_id)
         )
-        serializer = BasketSerializer(products, many=True, context={"request": request})
         return Response(
-            serializer.data,
+            serializer_data(serializer),
             status=status.HTTP_200_OK,
         )
@@ -19,6 +19,12 @@ env = environ.Env(
     DJANGO_LOGLEVEL=(str, "info"),
     DJANGO_ALLOWED_HOSTS=(str, ""),
     POSTGRES_HOST=(str, "localhost"),
+    CART_BACKEND=(str, "basket.cart.Cart"),
+    PAYMENT_PROVIDER=(str, "services.payment.FakePaymentProvider"),
+    PAYMENT_WEBHOOK_SECRET=(str, ""),
+    METRICS_TOKEN=(str, ""),
+    BANNERS_STRATEGY=(str, "cheapest"),
+    SERVER_MODE=(str, "wsgi"),
 )
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -50,6 +56,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "debug_toolbar",
     "drf_spectacular",
     "rest_framework",
@@ -63,6 +70,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.middleware.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -114,7 +122,19 @@ DATABASES = {
     }
 }
 
+# хранилище корзины: basket.cart.Cart (сессия) или basket.cart.RedisCart
+CART_BACKEND = env("CART_BACKEND")
 CART_SESSION_ID = "cart"
+CART_TOKEN_SESSION_ID = "cart_token"
+# время резервирования товаров брошенной корзины (сек)
+CART_RESERVATION_TTL = 60 * 60
+
+# выбор товара подкатегории для баннеров: cheapest, newest, rating, sale
+BANNERS_STRATEGY = env("BANNERS_STRATEGY")
+
+# режим запуска: wsgi (синхронные представления) или asgi (асинхронные
+# представления каталога, товара, фасетов, баннеров и категорий)
+SERVER_MODE = env("SERVER_MODE")
 
 SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
 SESSION_CACHE_ALIAS = "default"
@@ -136,6 +156,28 @@ CELERY_ACCEPT_CONTENT = ["application/json"]
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TASK_SERIALIZER = "json"
 CELERY_TIMEZONE = "Europe/Moscow"
+CELERY_BEAT_SCHEDULE = {
+    "release-expired-reservations": {
+        "task": "basket.tasks.release_expired_reservations",
+        "schedule": 5 * 60,
+    },
+    "refresh-popular-products": {
+        "task": "shopapp.tasks.refresh_popular_products",
+        "schedule": 15 * 60,
+    },
+    # цены со скидкой меняются не позже минуты после границы периода скидки
+    "refresh-sale-prices": {
+        "task": "shopapp.tasks.refresh_sale_prices",
+        "schedule": 60,
+    },
+}
+
+# адаптер платежного провайдера и секрет подписи его callback-запросов
+PAYMENT_PROVIDER = env("PAYMENT_PROVIDER")
+PAYMENT_WEBHOOK_SECRET = env("PAYMENT_WEBHOOK_SECRET")
+
+# токен доступа к метрикам запросов /api/metrics/ (пустой - экспорт выключен)
+METRICS_TOKEN = env("METRICS_TOKEN")
 
 # вывод письма клиенту на консоль (для тестирования)
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
@@ -196,6 +238,11 @@ REST_FRAMEWORK = {
         "django_filters.rest_framework.DjangoFilterBackend",
     ],
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    # рендерер на orjson (без установленного orjson - стандартный JSONRenderer)
+    "DEFAULT_RENDERER_CLASSES": [
+        "api.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
 }
 
 SPECTACULAR_SETTINGS = {
@@ -0,0 +1,70 @@
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from services.order import DELIVERY_TITLES
+from shopapp.models import Product
+
+
+class Command(BaseCommand):
+    """
+    Measures queries and time of order creation for baskets of different size
+    (all changes are rolled back)
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--items",
+            type=int,
+            nargs="+",
+            default=[1, 3, 5],
+            help="Numbers of products in the basket",
+        )
+        parser.add_argument(
+            "--runs", type=int, default=5, help="Runs for every basket size"
+        )
+
+    def create_order(self, product_ids: list[int]) -> tuple[int, float]:
+        host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else "localhost"
+        with transaction.atomic():
+            client = Client(HTTP_HOST=host)
+            for product_id in product_ids:
+                client.post(reverse("api:basket"), {"id": product_id, "count": 1})
+
+            with CaptureQueriesContext(connection) as queries:
+                start = perf_counter()
+                response = client.post(reverse("api:orders"))
+                elapsed = perf_counter() - start
+
+            transaction.set_rollback(True)
+
+        if response.status_code != 201:
+            raise RuntimeError(f"Order was not created: {response.content!r}")
+        return len(queries), elapsed
+
+    def handle(self, *args, **options):
+        self.stdout.write("Start benchmark of order creation")
+
+        for items in options["items"]:
+            product_ids = list(
+                Product.objects.filter(count__gt=0)
+                .exclude(title__in=DELIVERY_TITLES)
+                .order_by("id")
+                .values_list("pk", flat=True)[:items]
+            )
+            results = [self.create_order(product_ids) for _ in range(options["runs"])]
+            # количество запросов последнего запуска (конфигурация доставки уже в памяти)
+            queries = results[-1][0]
+            average = sum(result[1] for result in results) / len(results)
+
+            self.stdout.write(
+                f"{len(product_ids)} items: {queries} queries, "
+                f"{average * 1000:.1f} ms per order"
+            )
+
+        self.stdout.write(self.style.SUCCESS("Benchmark finished"))
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.15 on 2026-10-18 19:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0004_payment"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="cart_token",
+            field=models.CharField(
+                blank=True, db_index=True, max_length=64, verbose_name="Токен корзины"
+            ),
+        ),
+    ]
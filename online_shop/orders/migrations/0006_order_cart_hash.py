@@ -0,0 +1,20 @@
+# Generated by Django 5.1.15 on 2026-10-18 21:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0005_order_cart_token"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="cart_hash",
+            field=models.CharField(
+                blank=True, max_length=64, verbose_name="Хэш содержимого корзины"
+            ),
+        ),
+    ]
@@ -23,6 +23,12 @@ class StatusType(models.TextChoices):
     PAID = "paid"
 
 
+class PaymentStatus(models.TextChoices):
+    PROCESSING = "processing"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
 class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     user = models.ForeignKey(
@@ -66,6 +72,12 @@ class Order(models.Model):
     basket = models.ManyToManyField(
         Product, through="OrderInfoBasket", verbose_name="Товары из корзины"
     )
+    cart_token = models.CharField(
+        max_length=64, blank=True, db_index=True, verbose_name="Токен корзины"
+    )
+    cart_hash = models.CharField(
+        max_length=64, blank=True, verbose_name="Хэш содержимого корзины"
+    )
 
     def __str__(self):
         return f"Заказ с номером {self.pk}"
@@ -105,3 +117,49 @@ class OrderInfoBasket(models.Model):
     class Meta:
         verbose_name = "Содержание заказа"
         verbose_name_plural = "Содержание заказа"
+
+
+class Payment(models.Model):
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        related_name="payments",
+        verbose_name="Заказ",
+    )
+    idempotency_key = models.CharField(
+        max_length=64, unique=True, verbose_name="Ключ идемпотентности"
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=PaymentStatus.choices,
+        default=PaymentStatus.PROCESSING,
+        verbose_name="Статус платежа",
+    )
+    amount = models.DecimalField(
+        max_digits=10, decimal_places=2, verbose_name="Сумма платежа"
+    )
+    transaction_id = models.CharField(
+        max_length=64, blank=True, verbose_name="Id платежа у провайдера"
+    )
+    message = models.CharField(max_length=255, blank=True, verbose_name="Сообщение")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Платеж {self.idempotency_key} по заказу {self.order_id}"
+
+    class Meta:
+        ordering = ("-created_at",)
+        verbose_name = "Платеж"
+        verbose_name_plural = "Платежи"
+
+        constraints = [
+            # по заказу может обрабатываться или пройти только один платеж
+            models.UniqueConstraint(
+                fields=["order"],
+                condition=models.Q(
+                    status__in=[PaymentStatus.PROCESSING, PaymentStatus.SUCCEEDED]
+                ),
+                name="payment_order_active",
+            ),
+        ]
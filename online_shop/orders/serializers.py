@@ -1,15 +1,7 @@
 from rest_framework import serializers
-from django.db.models import Avg, Count, Value, FloatField
-from django.db.models.functions import Coalesce
-from drf_spectacular.utils import extend_schema_field
-from drf_spectacular.types import OpenApiTypes
 
-from orders.models import Order, OrderInfoBasket
+from orders.models import Order, OrderInfoBasket, PaymentStatus
 from shopapp.serializers import ProductImageSerializer
-from shopapp.models import (
-    Product,
-    Category,
-)
 
 
 class OrderIdSerializer(serializers.Serializer):
@@ -17,50 +9,41 @@ class OrderIdSerializer(serializers.Serializer):
 
 
 class ProductOrderSerializer(serializers.ModelSerializer):
-    images = ProductImageSerializer(many=True, read_only=True)
+    """
+    Товар в заказе: данные товара берутся из строки заказа
+    (товар, его изображения и тэги загружаются заранее через prefetch)
+    """
+
+    id = serializers.IntegerField(source="product.id", read_only=True)
     # вывод только id из связанной модели Category
-    category = serializers.SlugRelatedField(
-        queryset=Category.objects.all(), slug_field="id"
+    category = serializers.IntegerField(source="product.category_id", read_only=True)
+    # цена товара в заказе
+    price = serializers.DecimalField(
+        source="price_in_order",
+        max_digits=8,
+        decimal_places=2,
+        coerce_to_string=False,
+        read_only=True,
     )
-    # расчет количества отзывов о продукте
-    reviews = serializers.SerializerMethodField()
-    # создание дополнительного поля с расчетным средним значением
-    rating = serializers.SerializerMethodField()
-    # создание поля со значением количества товара в корзине
-    count = serializers.SerializerMethodField()
-    # создание поля со значением цены товара в корзине
-    price = serializers.SerializerMethodField()
-
-    @extend_schema_field(OpenApiTypes.INT)
-    def get_count(self, obj):
-        order_info = OrderInfoBasket.objects.get(
-            order=self.context["order"], product=obj
-        )
-        return order_info.count_in_order
-
-    @extend_schema_field(OpenApiTypes.DECIMAL)
-    def get_price(self, obj):
-        order_info = OrderInfoBasket.objects.get(
-            order=self.context["order"], product=obj
-        )
-        return order_info.price_in_order
-
-    @extend_schema_field(OpenApiTypes.FLOAT)
-    def get_rating(self, obj):
-        return Product.objects.filter(pk=obj.pk).aggregate(
-            rating=Coalesce(Avg("reviews__rate", output_field=FloatField()), Value(0.0))
-        )["rating"]
-
-    @extend_schema_field(OpenApiTypes.INT)
-    def get_reviews(self, obj):
-        return Product.objects.filter(pk=obj.pk).aggregate(
-            reviews=Count("reviews__id")
-        )["reviews"]
+    # количество товара в заказе
+    count = serializers.IntegerField(source="count_in_order", read_only=True)
+    date = serializers.DateTimeField(source="product.date", read_only=True)
+    title = serializers.CharField(source="product.title", read_only=True)
+    description = serializers.CharField(source="product.description", read_only=True)
+    freeDelivery = serializers.BooleanField(
+        source="product.freeDelivery", read_only=True
+    )
+    images = ProductImageSerializer(source="product.images", many=True, read_only=True)
+    tags = serializers.PrimaryKeyRelatedField(
+        source="product.tags", many=True, read_only=True
+    )
+    # количество отзывов о продукте (денормализованное поле товара)
+    reviews = serializers.IntegerField(source="product.reviews_count", read_only=True)
+    # среднее значение оценок (денормализованное поле товара)
+    rating = serializers.FloatField(source="product.rating_avg", read_only=True)
 
     class Meta:
-        model = Product
-        # для вывода данных из связанных таблиц, а не только перечень id
-        # depth = 1
+        model = OrderInfoBasket
         fields = (
             "id",
             "category",
@@ -78,7 +61,7 @@ class ProductOrderSerializer(serializers.ModelSerializer):
 
 
 class OrderSerializer(serializers.ModelSerializer):
-    products = ProductOrderSerializer(source="basket", many=True, read_only=True)
+    products = ProductOrderSerializer(source="lines", many=True, read_only=True)
     createdAt = serializers.DateTimeField(source="created_at")
     fullName = serializers.CharField(source="user.first_name")
     email = serializers.CharField(source="user.email")
@@ -123,3 +106,13 @@ class PaymentSerializer(serializers.Serializer):
 class PaymentResultSerializer(serializers.Serializer):
     message = serializers.CharField()
     status = serializers.CharField()
+    paymentId = serializers.IntegerField()
+
+
+class PaymentCallbackSerializer(serializers.Serializer):
+    idempotencyKey = serializers.CharField()
+    status = serializers.ChoiceField(
+        choices=[PaymentStatus.SUCCEEDED, PaymentStatus.FAILED]
+    )
+    transactionId = serializers.CharField(required=False, default="")
+    message = serializers.CharField(required=False, default="")
@@ -3,7 +3,13 @@ import logging
 from celery import shared_task
 from django.core.mail import send_mail
 from django.template.loader import render_to_string
-from orders.models import Order, OrderInfoBasket
+from orders.models import Order, OrderInfoBasket, PaymentStatus
+from services.payment import (
+    PaymentProviderError,
+    PaymentResult,
+    complete_payment,
+    process_payment,
+)
 
 log = logging.getLogger(__name__)
 
@@ -42,3 +48,35 @@ def send_email_about_order_created(order_id: int):
 
     except Order.DoesNotExist as exp:
         log.exception("Order not find: %s" % exp)
+
+
+@shared_task(bind=True, max_retries=5, default_retry_delay=10)
+def process_order_payment(self, payment_id: int, card_token: str) -> bool:
+    """
+    Задача списания средств по принятому платежу (по токену карты,
+    данные карты в очередь задач не передаются).
+    При недоступности провайдера задача повторяется с тем же ключом
+    идемпотентности, поэтому повторного списания не происходит.
+    Когда попытки исчерпаны, платеж отмечается неуспешным,
+    и заказ можно оплатить заново
+    """
+    try:
+        payment = process_payment(payment_id, card_token)
+    except PaymentProviderError as exp:
+        log.warning("Платежный провайдер недоступен: %s", exp)
+        if self.request.retries >= self.max_retries:
+            complete_payment(
+                payment_id,
+                PaymentResult(
+                    status=PaymentStatus.FAILED,
+                    message="Платежный провайдер недоступен",
+                ),
+            )
+            log.error("Платеж %s не выполнен: попытки исчерпаны", payment_id)
+            return False
+        raise self.retry(exc=exp)
+
+    if payment is None:
+        return False
+    send_email_about_order_created.delay(order_id=payment.order_id)
+    return True
@@ -1,11 +1,32 @@
 import json
-from django.test import TestCase, Client
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.shortcuts import get_object_or_404
 from django.conf import settings
 
-from shopapp.models import Product
-from orders.models import Order
+from services.cache import DELIVERY_TAG, get_tag_versions, invalidate_tags
+from services.payment import (
+    PaymentProvider,
+    PaymentProviderError,
+    callback_signature,
+    get_payment_provider,
+    start_payment,
+)
+from shopapp.models import Product, Specification
+from orders.models import Order, OrderInfoBasket, Payment
+from orders.tasks import process_order_payment
+
+
+class UnavailablePaymentProvider(PaymentProvider):
+    """
+    Провайдер, который всегда недоступен
+    """
+
+    def charge(self, idempotency_key, amount, card_token):
+        raise PaymentProviderError("Provider is down")
 
 
 class OrderTestCase(TestCase):
@@ -47,6 +68,83 @@ class OrderTestCase(TestCase):
         self.assertEqual(received_data["orderId"], 3)
         self.assertEqual(order.status, "created")
 
+    def test_create_order_repeated(self):
+        """
+        Тест повторного оформления корзины: возвращается тот же заказ,
+        товар со склада списывается один раз
+        """
+        stock = Product.objects.get(pk=1).count
+
+        order_ids = {
+            json.loads(OrderTestCase.client.post(reverse("api:orders")).content)[
+                "orderId"
+            ]
+            for _ in range(2)
+        }
+
+        self.assertEqual(len(order_ids), 1)
+        self.assertEqual(Product.objects.get(pk=1).count, stock - 2)
+
+    def test_create_order_cart_changed(self):
+        """
+        Тест оформления измененной корзины: неоплаченный заказ
+        с прежним содержимым не возвращается, создается новый заказ
+        """
+        response = OrderTestCase.client.post(reverse("api:orders"))
+        abandoned_id = json.loads(response.content)["orderId"]
+
+        OrderTestCase.client.post(reverse("api:basket"), {"id": 2, "count": 1})
+        self.addCleanup(
+            OrderTestCase.client.delete,
+            reverse("api:basket"),
+            data=json.dumps({"id": 2, "count": 1}),
+            content_type="application/json",
+        )
+        response = OrderTestCase.client.post(reverse("api:orders"))
+        order: Order = get_object_or_404(
+            Order, pk=json.loads(response.content)["orderId"]
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertNotEqual(order.pk, abandoned_id)
+        self.assertTrue(order.basket.filter(pk=2).exists())
+
+    def test_create_order_paid_delivery(self):
+        """
+        Тест создание ордера с платной доставкой
+        (порог бесплатной доставки читается заново после его изменения)
+        """
+        self.addCleanup(invalidate_tags, DELIVERY_TAG)
+        threshold = Specification.objects.get(
+            product__title="Доставка", name="Сумма заказа"
+        )
+        threshold.value = "1000000"
+        threshold.save()
+
+        response = OrderTestCase.client.post(reverse("api:orders"))
+        received_data = json.loads(response.content)
+
+        order: Order = get_object_or_404(Order, pk=received_data["orderId"])
+        product: Product = get_object_or_404(Product, pk=1)
+        delivery: Product = get_object_or_404(Product, title="Доставка")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(order.total_cost, product.price * 2 + delivery.price)
+        self.assertTrue(order.basket.filter(pk=delivery.pk).exists())
+
+    def test_delivery_renamed(self):
+        """
+        Тест сброса конфигурации доставки при переименовании товара доставки
+        """
+        self.addCleanup(invalidate_tags, DELIVERY_TAG)
+        version = get_tag_versions((DELIVERY_TAG,))[DELIVERY_TAG]
+
+        delivery = Product.objects.get(title="Экспресс-доставка")
+        delivery.title = "Курьер"
+        delivery.save()
+
+        self.assertNotEqual(get_tag_versions((DELIVERY_TAG,))[DELIVERY_TAG], version)
+
     def test_get_order_id(self):
         """
         Тест получения ордера по id
@@ -102,16 +200,139 @@ class OrderTestCase(TestCase):
         received_data = json.loads(response.content)
         order_id = received_data["orderId"]
 
-        response = OrderTestCase.client.post(
-            reverse("api:payment", args=(order_id,)), data
-        )
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = OrderTestCase.client.post(
+                reverse("api:payment", args=(order_id,)), data
+            )
         received_data = json.loads(response.content)
 
         order: Order = get_object_or_404(Order, pk=order_id)
 
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(received_data["message"], "Платеж принят в обработку")
+        self.assertEqual(received_data["status"], "processing")
+        self.assertEqual(order.status, "created")
+        self.assertEqual(len(callbacks), 1)
+        # корзина сохраняется до успешной оплаты
+        self.assertTrue(
+            json.loads(OrderTestCase.client.get(reverse("api:basket")).content)
+        )
+
+        # в задачу передается только токен карты
+        with self.captureOnCommitCallbacks(execute=True):
+            process_order_payment.apply(
+                kwargs={
+                    "payment_id": received_data["paymentId"],
+                    "card_token": get_payment_provider().tokenize(data),
+                }
+            )
+
+        response = OrderTestCase.client.get(reverse("api:payment", args=(order_id,)))
+        received_data = json.loads(response.content)
+        order.refresh_from_db()
+
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(received_data["message"], "Данные указаны верно")
+        self.assertEqual(received_data["status"], "succeeded")
         self.assertEqual(order.status, "paid")
+        self.assertFalse(
+            json.loads(OrderTestCase.client.get(reverse("api:basket")).content)
+        )
+
+    def test_pyment_idempotency_key(self):
+        """
+        Тест повторной оплаты ордера (платеж регистрируется один раз)
+        """
+        data = {
+            "name": "Lena Lee",
+            "number": "9999999999999999",
+            "year": "23",
+            "month": "11",
+            "code": "123",
+        }
+
+        order = Order.objects.create(
+            user=User.objects.get(username="Sem"), total_cost=100
+        )
+
+        payment_ids = set()
+        for headers in ({"Idempotency-Key": "key-1"}, {"Idempotency-Key": "key-1"}, {}):
+            with self.captureOnCommitCallbacks():
+                response = self.client.post(
+                    reverse("api:payment", args=(order.pk,)), data, headers=headers
+                )
+            self.assertEqual(response.status_code, 202)
+            payment_ids.add(json.loads(response.content)["paymentId"])
+
+        self.assertEqual(len(payment_ids), 1)
+        self.assertEqual(Payment.objects.filter(order=order).count(), 1)
+
+        # ключ другого заказа не возвращает чужой платеж
+        other = Order.objects.create(
+            user=User.objects.get(username="Sem"), total_cost=100
+        )
+        response = self.client.post(
+            reverse("api:payment", args=(other.pk,)),
+            data,
+            headers={"Idempotency-Key": "key-1"},
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Payment.objects.filter(order=other).exists())
+
+    @override_settings(PAYMENT_PROVIDER="orders.tests.UnavailablePaymentProvider")
+    def test_pyment_retries_exhausted(self):
+        """
+        Тест платежа при недоступном провайдере: после последней попытки
+        платеж отмечается неуспешным, и заказ можно оплатить заново
+        """
+        order = Order.objects.create(
+            user=User.objects.get(username="Sem"), total_cost=100
+        )
+        payment, created = start_payment(order, "key-3")
+
+        result = process_order_payment.apply(
+            kwargs={"payment_id": payment.pk, "card_token": "tok_1111"},
+            retries=process_order_payment.max_retries,
+        )
+        payment.refresh_from_db()
+
+        self.assertFalse(result.get())
+        self.assertEqual(payment.status, "failed")
+        self.assertTrue(start_payment(order, "key-4")[1])
+
+    @override_settings(PAYMENT_WEBHOOK_SECRET="secret")
+    def test_pyment_callback(self):
+        """
+        Тест фиксации результата платежа по callback-запросу провайдера
+        """
+        order = Order.objects.create(
+            user=User.objects.get(username="Sem"), total_cost=100
+        )
+        payment = Payment.objects.create(
+            order=order, idempotency_key="key-2", amount=100
+        )
+        body = json.dumps(
+            {"idempotencyKey": "key-2", "status": "failed", "message": "Отказ"}
+        ).encode()
+
+        response = self.client.post(
+            reverse("api:payment_callback"),
+            body,
+            content_type="application/json",
+            headers={"X-Signature": "bad"},
+        )
+        self.assertEqual(response.status_code, 403)
+
+        response = self.client.post(
+            reverse("api:payment_callback"),
+            body,
+            content_type="application/json",
+            headers={"X-Signature": callback_signature(body)},
+        )
+        payment.refresh_from_db()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(payment.status, "failed")
+        self.assertEqual(payment.message, "Отказ")
 
     def test_pyment_err_number(self):
         """
@@ -232,3 +453,35 @@ class OrderTestCase(TestCase):
 
         self.assertEqual(response.status_code, 400)
         self.assertEqual(received_data["message"], "Имя указано не верно")
+
+    def test_get_orders_queries(self):
+        """
+        Тест количества запросов к базе данных при выводе истории заказов
+        (не зависит от количества заказов и позиций в них)
+        """
+        user: User = User.objects.get(username="Sem")
+        self.client.force_login(user)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("api:orders"))
+
+        products = Product.objects.all()[:5]
+        for _ in range(5):
+            order = Order.objects.create(user=user, total_cost=0)
+            OrderInfoBasket.objects.bulk_create(
+                OrderInfoBasket(
+                    order=order,
+                    product=product,
+                    count_in_order=1,
+                    price_in_order=product.price,
+                )
+                for product in products
+            )
+
+        with self.assertNumQueries(len(queries)):
+            response = self.client.get(reverse("api:orders"))
+        received_data = json.loads(response.content)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(received_data), 7)
+        self.assertEqual(len(received_data[0]["products"]), 5)
@@ -1,31 +1,53 @@
 import logging
 from decimal import Decimal
-import time
 
+from django.db import transaction
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.contrib.auth.models import User
 from rest_framework import status
+from rest_framework.permissions import AllowAny
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from drf_spectacular.utils import (
     extend_schema,
     OpenApiResponse,
     OpenApiExample,
+    OpenApiParameter,
 )
 
-from basket.cart import Cart
-from shopapp.models import Product, Specification
-from orders.models import Order, OrderInfoBasket, StatusType, DeliveryType
+from basket.cart import get_cart
+from services.metrics import serializer_data
+from services.order import create_order, get_delivery_config, with_products
+from shopapp.models import Product
+from orders.models import (
+    Order,
+    OrderInfoBasket,
+    Payment,
+    PaymentStatus,
+    StatusType,
+    DeliveryType,
+)
 from orders.serializers import (
     OrderSerializer,
     OrderIdSerializer,
     OrderUpdateSerializer,
     PaymentSerializer,
     PaymentResultSerializer,
+    PaymentCallbackSerializer,
 )
 from shopapp.serializers import ProductShortSerializer
-from services.payment import checking_payments
-from orders.tasks import send_email_about_order_created
+from services.payment import (
+    IdempotencyKeyConflict,
+    PaymentProviderError,
+    PaymentResult,
+    check_callback_signature,
+    checking_payments,
+    complete_payment,
+    get_payment_provider,
+    start_payment,
+)
+from orders.tasks import process_order_payment, send_email_about_order_created
 
 log = logging.getLogger(__name__)
 
@@ -46,20 +68,13 @@ class OrderApiView(APIView):
         """
         Генерирует список заказов пользователя
         """
-        orders = (
-            Order.objects.filter(user=self.request.user)
-            .select_related("user")
-            .prefetch_related("basket", "user__profile")
-            .order_by("-created_at")
+        orders = with_products(
+            Order.objects.filter(user=self.request.user).order_by("-created_at")
         )
-
-        orders_list = list()
-        for order in orders:
-            serializer = OrderSerializer(order, context={"order": order})
-            orders_list.append(serializer.data)
+        serializer = OrderSerializer(orders, many=True)
 
         return Response(
-            orders_list,
+            serializer_data(serializer),
             status=status.HTTP_200_OK,
         )
 
@@ -80,75 +95,20 @@ class OrderApiView(APIView):
         Создается ордер из товаров в корзине
         """
         log.info("Начало выполнения запроса по созданию ордера")
-        cart = Cart(request)
+        cart = get_cart(request)
 
         if request.user.is_authenticated:
             user: User = self.request.user
         else:
             user = get_object_or_404(User, pk=1)
 
-        list_id = cart.list_id_products()
-
-        if len(list_id) == 0:
+        order = create_order(user, cart)
+        if order is None:
             return Response(
                 {"message": "The basket is empty"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        products = Product.objects.filter(id__in=list_id)
-
-        total_cost = 0
-        for i_id in list_id:
-            product_from_basket = cart.get(i_id)
-            total_cost += Decimal(product_from_basket["quantity"]) * Decimal(
-                product_from_basket["price"]
-            )
-
-        order = Order.objects.create(
-            user=user,
-            total_cost=total_cost,
-        )
-
-        free_delivery = True
-        for product in products:
-            free_delivery &= product.freeDelivery
-            product_from_basket = cart.get(product.pk)
-            m2m_order = OrderInfoBasket.objects.create(
-                order=order,
-                product=product,
-                count_in_order=product_from_basket["quantity"],
-                price_in_order=product_from_basket["price"],
-            )
-
-        delivery: Product = Product.objects.filter(title="Доставка").first()
-        specifications: Specification = Specification.objects.filter(
-            product=delivery, name="Сумма заказа"
-        ).first()
-
-        if not free_delivery and Decimal(total_cost) < Decimal(specifications.value):
-            log.info("Добавление в ордер id%s стоимость доставки" % order.pk)
-            m2m_order = OrderInfoBasket.objects.create(
-                order=order,
-                product=delivery,
-                count_in_order=1,
-                price_in_order=delivery.price,
-            )
-            order.total_cost += Decimal(delivery.price)
-            order.save()
-
-        else:
-            delivery_free: Product = Product.objects.filter(
-                title="Бесплатная доставка"
-            ).first()
-            m2m_order = OrderInfoBasket.objects.create(
-                order=order,
-                product=delivery_free,
-                count_in_order=1,
-                price_in_order=delivery_free.price,
-            )
-
-        log.info("Новый ордер с %s создан, статус ордера %s" % (order.pk, order.status))
-
         return Response(
             {"orderId": order.pk},
             status=status.HTTP_201_CREATED,
@@ -175,21 +135,16 @@ class OrderDetailApiView(APIView):
         Номер ордера
         :return:
         """
-        order = (
-            Order.objects.filter(pk=pk)
-            .select_related("user")
-            .prefetch_related("basket", "user__profile")
-            .first()
-        )
+        order = with_products(Order.objects.filter(pk=pk)).first()
 
         if request.user.is_authenticated and (order.user.id == 1):
             order.user = self.request.user
             order.save()
 
-        serializer = OrderSerializer(order, context={"order": order})
+        serializer = OrderSerializer(order)
 
         return Response(
-            serializer.data,
+            serializer_data(serializer),
             status=status.HTTP_200_OK,
         )
 
@@ -230,7 +185,9 @@ class OrderDetailApiView(APIView):
 
         if order.delivery_type == DeliveryType.EXPRESS:
             log.info("Добавление в ордер id%s стоимость экспресс-доставки" % order.pk)
-            delivery: Product = get_object_or_404(Product, title="Экспресс-доставка")
+            delivery: Product = get_delivery_config().express_delivery
+            if delivery is None:
+                raise Http404("No Product matches the given query.")
             m2m_order = OrderInfoBasket.objects.create(
                 order=order,
                 product=delivery,
@@ -249,13 +206,81 @@ class OrderDetailApiView(APIView):
         )
 
 
+def payment_response(payment: Payment, status_code: int | None = None) -> Response:
+    """
+    Ответ с состоянием платежа
+    :param payment: Payment
+    :param status_code: int | None
+        код ответа (None - по статусу платежа)
+    :return: Response
+    """
+    if payment.status == PaymentStatus.PROCESSING:
+        message = "Платеж принят в обработку"
+        default_status = status.HTTP_202_ACCEPTED
+    elif payment.status == PaymentStatus.SUCCEEDED:
+        message = payment.message
+        default_status = status.HTTP_200_OK
+    else:
+        message = payment.message
+        default_status = status.HTTP_400_BAD_REQUEST
+
+    return Response(
+        {"message": message, "status": payment.status, "paymentId": payment.pk},
+        status=status_code or default_status,
+    )
+
+
 class PaymentApiView(APIView):
+    @extend_schema(
+        tags=["payment"],
+        summary="Состояние оплаты заказа по id",
+        responses={
+            status.HTTP_200_OK: PaymentResultSerializer,
+            status.HTTP_404_NOT_FOUND: OpenApiResponse(
+                response=None,
+                description="Заказ не оплачивался",
+            ),
+        },
+    )
+    def get(self, request, pk: int):
+        """
+        Состояние последнего платежа по заказу (для опроса после оплаты)
+        :param request:
+        :param pk: int
+        :return:
+        """
+        payment = Payment.objects.filter(order_id=pk).first()
+        if payment is None:
+            raise Http404("No Payment matches the given query.")
+
+        return payment_response(payment, status.HTTP_200_OK)
+
     @extend_schema(
         tags=["payment"],
         summary="Оплата заказа по id",
         request=PaymentSerializer,
+        parameters=[
+            OpenApiParameter(
+                name="Idempotency-Key",
+                location=OpenApiParameter.HEADER,
+                description="Ключ идемпотентности (повтор запроса не приводит "
+                "к повторному списанию)",
+                required=False,
+                type=str,
+            ),
+        ],
         responses={
+            status.HTTP_202_ACCEPTED: PaymentResultSerializer,
             status.HTTP_200_OK: PaymentResultSerializer,
+            status.HTTP_400_BAD_REQUEST: PaymentResultSerializer,
+            status.HTTP_409_CONFLICT: OpenApiResponse(
+                response=None,
+                description="Ключ идемпотентности использован по другому заказу",
+            ),
+            status.HTTP_503_SERVICE_UNAVAILABLE: OpenApiResponse(
+                response=None,
+                description="Платежный провайдер недоступен",
+            ),
             status.HTTP_500_INTERNAL_SERVER_ERROR: OpenApiResponse(
                 response=None,
                 description="Что-то пошло не так",
@@ -272,38 +297,107 @@ class PaymentApiView(APIView):
                     "month": "11",
                     "code": "123",
                 },
-                status_codes=[str(status.HTTP_200_OK)],
+                status_codes=[str(status.HTTP_202_ACCEPTED)],
             )
         ],
     )
     def post(self, request, pk: int):
         """
-        Оплата заказа по id
+        Оплата заказа по id: платеж принимается в обработку,
+        списание средств выполняется фоновой задачей
         :param request:
         :param pk: int
         :return:
         """
+        order = get_object_or_404(Order, pk=pk)
+
         log.info("Заполнение данных платежной карты")
         result_check = checking_payments(request)
+        if result_check["status"] != status.HTTP_200_OK:
+            return Response(
+                {"message": result_check["massage"]},
+                status=result_check["status"],
+            )
 
-        if result_check["status"] == status.HTTP_200_OK:
-            time.sleep(5)
-            order = get_object_or_404(Order, pk=pk)
-            order.status = StatusType.PAID
-            order.save()
-            log.info("Ордер с %s оплачен, статус ордера %s" % (order.pk, order.status))
+        # данные карты заменяются токеном провайдера до постановки задачи
+        card = {field: request.data[field] for field in PaymentSerializer().fields}
+        try:
+            card_token = get_payment_provider().tokenize(card)
+        except PaymentProviderError as exp:
+            log.warning("Платежный провайдер недоступен: %s", exp)
+            return Response(
+                {"message": "Payment provider is unavailable"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
 
-            log.info(
-                "Отправка письма клиенту %s с информацией об ордере с id %s"
-                % (order.user.first_name, pk)
+        try:
+            payment, created = start_payment(
+                order, request.headers.get("Idempotency-Key")
+            )
+        except IdempotencyKeyConflict:
+            log.warning("Ключ идемпотентности использован по другому заказу")
+            return Response(
+                {"message": "Idempotency-Key is used by another order"},
+                status=status.HTTP_409_CONFLICT,
+            )
+        if created:
+            transaction.on_commit(
+                lambda: process_order_payment.delay(
+                    payment_id=payment.pk, card_token=card_token
+                )
             )
-            send_email_about_order_created.delay(order_id=pk)
 
-            cart = Cart(request)
-            cart.delete_cart()
-            log.info("Карзина с товарами для ордера %s удалена" % order.pk)
+        return payment_response(payment)
 
-        return Response(
-            {"message": result_check["massage"]},
-            status=result_check["status"],
+
+class PaymentCallbackApiView(APIView):
+    # запрос приходит от платежного провайдера и проверяется по подписи
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    @extend_schema(
+        tags=["payment"],
+        summary="Результат платежа от платежного провайдера",
+        request=PaymentCallbackSerializer,
+        responses={
+            status.HTTP_200_OK: PaymentResultSerializer,
+            status.HTTP_403_FORBIDDEN: OpenApiResponse(
+                response=None,
+                description="Неверная подпись запроса",
+            ),
+        },
+    )
+    def post(self, request):
+        """
+        Фиксация результата платежа по callback-запросу провайдера
+        (подпись HMAC-SHA256 тела запроса в заголовке X-Signature)
+        :param request:
+        :return:
+        """
+        if not check_callback_signature(
+            request.body, request.headers.get("X-Signature", "")
+        ):
+            log.warning("Callback платежа с неверной подписью")
+            return Response(
+                {"message": "Invalid signature"}, status=status.HTTP_403_FORBIDDEN
+            )
+
+        serializer = PaymentCallbackSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        payment = get_object_or_404(
+            Payment, idempotency_key=serializer.validated_data["idempotencyKey"]
         )
+
+        paid = complete_payment(
+            payment.pk,
+            PaymentResult(
+                status=serializer.validated_data["status"],
+                transaction_id=serializer.validated_data["transactionId"],
+                message=serializer.validated_data["message"],
+            ),
+        )
+        if paid is not None:
+            send_email_about_order_created.delay(order_id=paid.order_id)
+
+        payment.refresh_from_db()
+        return payment_response(payment, status.HTTP_200_OK)
@@ -0,0 +1,126 @@
+import logging
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Exists, OuterRef, QuerySet
+from django.utils import timezone
+
+from services.cache import (
+    CATEGORIES_TAG,
+    CATEGORY_TAG,
+    PRODUCT_TAG,
+    aget_tag_versions,
+    aset_tagged,
+    get_tag_versions,
+    set_tagged,
+)
+from services.metrics import serializer_data
+from shopapp.models import Category, Product, Sales
+from shopapp.serializers import ProductShortSerializer
+
+log = logging.getLogger(__name__)
+
+# список баннеров хранится отдельно для каждой стратегии выбора товаров
+BANNERS_CACHE_KEY = "catalog_banners:{}"
+# страховочное время хранения (активность скидок зависит от времени)
+BANNERS_CACHE_TIMEOUT = 60 * 60
+
+# отметка о запланированном перестроении и задержка перед ним (сек):
+# изменения товаров за время задержки обрабатываются одним перестроением
+BANNERS_REBUILD_KEY = "catalog_banners:rebuild"
+BANNERS_REBUILD_DELAY = 30
+
+# порядок выбора товара внутри подкатегории для каждой стратегии
+BANNER_STRATEGIES = {
+    "cheapest": ("price",),
+    "newest": ("-date",),
+    "rating": ("-rating_avg", "-reviews_count"),
+    "sale": ("-on_sale", "price"),
+}
+
+
+def banners_cache_key() -> str:
+    """
+    Ключ кеша баннеров для стратегии из настройки BANNERS_STRATEGY
+    :return: str
+    """
+    return BANNERS_CACHE_KEY.format(settings.BANNERS_STRATEGY)
+
+
+def banner_products(strategy: str) -> QuerySet:
+    """
+    По одному товару из каждой подкатегории одним запросом
+    (SELECT DISTINCT ON (category_id) ... ORDER BY category_id, <стратегия>)
+    :param strategy: str
+        стратегия выбора товара (ключ BANNER_STRATEGIES)
+    :return: QuerySet
+    """
+    if strategy not in BANNER_STRATEGIES:
+        raise ImproperlyConfigured(f"Unknown banners strategy {strategy!r}")
+
+    queryset = Product.objects.filter(category__subcategories__isnull=False)
+    if strategy == "sale":
+        now = timezone.now()
+        queryset = queryset.annotate(
+            on_sale=Exists(
+                Sales.objects.filter(
+                    product=OuterRef("pk"), dateFrom__lte=now, dateTo__gte=now
+                )
+            )
+        )
+
+    return (
+        queryset.order_by("category_id", *BANNER_STRATEGIES[strategy], "pk")
+        .distinct("category_id")
+        .for_short_list()
+    )
+
+
+def build_banners() -> list[dict]:
+    """
+    Построение списка товаров для баннеров и сохранение его в кеше.
+    Запись инвалидируется тэгами дерева категорий, подкатегорий
+    и выбранных товаров
+    :return: list[dict]
+    """
+    category_ids = Category.objects.filter(subcategories__isnull=False).values_list(
+        "pk", flat=True
+    )
+    versions = get_tag_versions(
+        (CATEGORIES_TAG, *(CATEGORY_TAG.format(pk) for pk in category_ids))
+    )
+
+    products = list(banner_products(settings.BANNERS_STRATEGY))
+    data = serializer_data(ProductShortSerializer(products, many=True))
+
+    versions.update(get_tag_versions(PRODUCT_TAG.format(item["id"]) for item in data))
+    set_tagged(banners_cache_key(), data, versions, BANNERS_CACHE_TIMEOUT)
+    log.info("Список товаров для баннеров построен: %s товаров", len(data))
+    return data
+
+
+async def abuild_banners() -> list[dict]:
+    """
+    Асинхронный вариант build_banners
+    :return: list[dict]
+    """
+    category_ids = [
+        pk
+        async for pk in Category.objects.filter(
+            subcategories__isnull=False
+        ).values_list("pk", flat=True)
+    ]
+    versions = await aget_tag_versions(
+        (CATEGORIES_TAG, *(CATEGORY_TAG.format(pk) for pk in category_ids))
+    )
+
+    products = [product async for product in banner_products(settings.BANNERS_STRATEGY)]
+    # связанные данные загружены prefetch_related: сериализация без запросов
+    data = serializer_data(ProductShortSerializer(products, many=True))
+
+    versions.update(
+        await aget_tag_versions(PRODUCT_TAG.format(item["id"]) for item in data)
+    )
+    await aset_tagged(banners_cache_key(), data, versions, BANNERS_CACHE_TIMEOUT)
+    log.info("Список товаров для баннеров построен: %s товаров", len(data))
+    return data
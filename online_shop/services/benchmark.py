@@ -0,0 +1,28 @@
+from statistics import mean, quantiles
+
+
+def latency_summary(latencies: list[float]) -> str:
+    """
+    Строка с перцентилями задержки запросов (p50, p95, p99) в миллисекундах
+    :param latencies: list[float]
+        время выполнения запросов (сек)
+    :return: str
+    """
+    if len(latencies) > 1:
+        percentiles = quantiles(latencies, n=100)
+        p50, p95, p99 = percentiles[49], percentiles[94], percentiles[98]
+    else:
+        p50 = p95 = p99 = latencies[0] if latencies else 0
+    return f"p50 {p50 * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms, p99 {p99 * 1000:.1f} ms"
+
+
+def queries_summary(queries: list[int]) -> str:
+    """
+    Строка со средним количеством запросов к базе данных
+    :param queries: list[int]
+        количество запросов к базе данных каждого запроса
+    :return: str
+    """
+    if not queries:
+        return "queries n/a"
+    return f"{mean(queries):.1f} queries"
@@ -0,0 +1,154 @@
+import logging
+from typing import Any, Iterable
+from uuid import uuid4
+
+from django.core.cache import cache
+
+from services.metrics import record_cache
+
+log = logging.getLogger(__name__)
+
+# шаблоны имен тэгов инвалидации
+CATEGORY_TAG = "category:{}"
+PRODUCT_TAG = "product:{}"
+CATEGORIES_TAG = "categories"
+DELIVERY_TAG = "delivery"
+SALES_TAG = "sales"
+
+TAG_KEY = "cache_tag:{}"
+
+
+def get_tag_versions(tags: Iterable[str]) -> dict[str, str]:
+    """
+    Текущие версии тэгов инвалидации (для отсутствующих тэгов создаются новые)
+    :param tags: Iterable[str]
+        имена тэгов
+    :return: dict[str, str]
+        версия каждого тэга
+    """
+    keys = {TAG_KEY.format(tag): tag for tag in tags}
+    versions = cache.get_many(keys)
+
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, uuid4().hex, None)
+        versions.update(cache.get_many(missing))
+
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def invalidate_tags(*tags: str) -> None:
+    """
+    Инвалидация всех записей кеша, помеченных указанными тэгами
+    :param tags: str
+        имена тэгов
+    :return: None
+    """
+    cache.set_many({TAG_KEY.format(tag): uuid4().hex for tag in tags}, None)
+    log.debug("Инвалидированы тэги кеша %s", tags)
+
+
+def get_tagged(key: str) -> Any | None:
+    """
+    Получение записи кеша, если ни один из ее тэгов не был инвалидирован
+    :param key: str
+        ключ записи
+    :return: Any | None
+        сохраненное значение или None
+    """
+    entry = cache.get(key)
+    if not isinstance(entry, dict) or "tags" not in entry:
+        # записи без тэгов (в т.ч. от прежних версий) считаются устаревшими
+        record_cache(hit=False)
+        return None
+
+    current = cache.get_many([TAG_KEY.format(tag) for tag in entry["tags"]])
+    for tag, version in entry["tags"].items():
+        if current.get(TAG_KEY.format(tag)) != version:
+            log.debug("Запись кеша %s устарела по тэгу %s", key, tag)
+            record_cache(hit=False)
+            return None
+
+    record_cache(hit=True)
+    return entry["value"]
+
+
+def set_tagged(
+    key: str,
+    value: Any,
+    versions: dict[str, str],
+    timeout: int | None = None,
+) -> None:
+    """
+    Сохранение записи кеша с версиями ее тэгов.
+    Версии нужно получить через get_tag_versions до построения значения,
+    чтобы изменение данных во время построения не осталось незамеченным.
+    :param key: str
+        ключ записи
+    :param value: Any
+        сохраняемое значение
+    :param versions: dict[str, str]
+        версии тэгов записи
+    :param timeout: int | None
+        время хранения записи (сек)
+    :return: None
+    """
+    cache.set(key, {"tags": versions, "value": value}, timeout)
+
+
+async def aget_tag_versions(tags: Iterable[str]) -> dict[str, str]:
+    """
+    Асинхронный вариант get_tag_versions
+    :param tags: Iterable[str]
+    :return: dict[str, str]
+    """
+    keys = {TAG_KEY.format(tag): tag for tag in tags}
+    versions = await cache.aget_many(keys)
+
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            await cache.aadd(key, uuid4().hex, None)
+        versions.update(await cache.aget_many(missing))
+
+    return {keys[key]: version for key, version in versions.items()}
+
+
+async def aget_tagged(key: str) -> Any | None:
+    """
+    Асинхронный вариант get_tagged
+    :param key: str
+    :return: Any | None
+    """
+    entry = await cache.aget(key)
+    if not isinstance(entry, dict) or "tags" not in entry:
+        record_cache(hit=False)
+        return None
+
+    current = await cache.aget_many([TAG_KEY.format(tag) for tag in entry["tags"]])
+    for tag, version in entry["tags"].items():
+        if current.get(TAG_KEY.format(tag)) != version:
+            log.debug("Запись кеша %s устарела по тэгу %s", key, tag)
+            record_cache(hit=False)
+            return None
+
+    record_cache(hit=True)
+    return entry["value"]
+
+
+async def aset_tagged(
+    key: str,
+    value: Any,
+    versions: dict[str, str],
+    timeout: int | None = None,
+) -> None:
+    """
+    Асинхронный вариант set_tagged
+    :param key: str
+    :param value: Any
+    :param versions: dict[str, str]
+    :param timeout: int | None
+    :return: None
+    """
+    await cache.aset(key, {"tags": versions, "value": value}, timeout)
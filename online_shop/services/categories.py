@@ -0,0 +1,109 @@
+import logging
+from dataclasses import asdict
+from typing import Iterable
+
+from django.db.models import QuerySet
+
+from services.cache import (
+    CATEGORIES_TAG,
+    aget_tag_versions,
+    aget_tagged,
+    aset_tagged,
+    get_tag_versions,
+    get_tagged,
+    set_tagged,
+)
+from services.images import variants_srcset
+from services.schemas import CategoriesSchema
+from shopapp.models import Category
+
+log = logging.getLogger(__name__)
+
+CATEGORIES_CACHE_KEY = "categories_tree"
+
+# категории, не выводимые в меню каталога
+HIDDEN_CATEGORIES = ("Доставка",)
+
+
+def category_rows() -> QuerySet:
+    """
+    Все категории одним запросом (поля, нужные для дерева категорий)
+    :return: QuerySet
+    """
+    return Category.objects.order_by("id").values(
+        "id", "title", "image", "image_variants", "slug", "subcategories_id"
+    )
+
+
+def build_category_tree(rows: Iterable[dict] | None = None) -> list[dict]:
+    """
+    Построение дерева категорий произвольной глубины
+    (все категории загружаются одним запросом и собираются в памяти)
+    :param rows: Iterable[dict] | None
+        загруженные строки категорий (None - загрузить из базы данных)
+    :return: list[dict]
+        родительские категории с вложенными подкатегориями
+    """
+    if rows is None:
+        rows = category_rows()
+
+    nodes = dict()
+    children = dict()
+    for row in rows:
+        nodes[row["id"]] = asdict(
+            CategoriesSchema(
+                id=row["id"],
+                title=row["title"],
+                image={
+                    "src": "".join(["/media/", row["image"] or ""]),
+                    "alt": row["slug"],
+                    "srcset": variants_srcset(row["image_variants"]),
+                },
+            )
+        )
+        children.setdefault(row["subcategories_id"], []).append(row["id"])
+
+    def attach(node_id: int) -> dict:
+        node = nodes[node_id]
+        if node_id in children:
+            node["subcategories"] = [attach(child) for child in children[node_id]]
+        return node
+
+    tree = []
+    for root_id in children.get(None, []):
+        if nodes[root_id]["title"] in HIDDEN_CATEGORIES:
+            continue
+        root = attach(root_id)
+        root.setdefault("subcategories", [])
+        tree.append(root)
+
+    return tree
+
+
+def get_category_tree() -> list[dict]:
+    """
+    Дерево категорий из кеша
+    (снимок дерева сбрасывается при изменении или удалении любой категории)
+    :return: list[dict]
+    """
+    tree = get_tagged(CATEGORIES_CACHE_KEY)
+    if tree is None:
+        versions = get_tag_versions((CATEGORIES_TAG,))
+        tree = build_category_tree()
+        set_tagged(CATEGORIES_CACHE_KEY, tree, versions)
+        log.info("Дерево категорий записано в кеш")
+    return tree
+
+
+async def aget_category_tree() -> list[dict]:
+    """
+    Асинхронный вариант get_category_tree
+    :return: list[dict]
+    """
+    tree = await aget_tagged(CATEGORIES_CACHE_KEY)
+    if tree is None:
+        versions = await aget_tag_versions((CATEGORIES_TAG,))
+        tree = build_category_tree([row async for row in category_rows()])
+        await aset_tagged(CATEGORIES_CACHE_KEY, tree, versions)
+        log.info("Дерево категорий записано в кеш")
+    return tree
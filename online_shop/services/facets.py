@@ -0,0 +1,309 @@
+import logging
+from decimal import Decimal
+from functools import reduce
+
+from django.db.models import (
+    Count,
+    F,
+    Func,
+    IntegerField,
+    Max,
+    Min,
+    Q,
+    QuerySet,
+    Value,
+)
+from django.db.models.functions import Least
+from rest_framework.request import Request
+
+from services.cache import (
+    CATEGORY_TAG,
+    aget_tag_versions,
+    aset_tagged,
+    get_tag_versions,
+    set_tagged,
+)
+from services.search import asearch_products, search_products
+from shopapp.models import Product
+from shopapp.pagination import catalog_cache_key
+from shopapp.utils import aget_category_id, get_catalog_filters, tags_filter
+
+log = logging.getLogger(__name__)
+
+# количество интервалов гистограммы цен
+HISTOGRAM_BUCKETS = 10
+# время хранения фасетов каталога в кеше (сек)
+FACETS_CACHE_TIMEOUT = 10 * 60
+
+# параметры запроса, не влияющие на фасеты
+FACETS_EXCLUDE = ("currentPage", "cursor", "sort", "sortType", "limit", "facets")
+
+
+class WidthBucket(Func):
+    """
+    Номер интервала значения (PostgreSQL width_bucket)
+    """
+
+    function = "width_bucket"
+    output_field = IntegerField()
+
+
+def facet_filters(filters: dict) -> dict[str, Q]:
+    """
+    Условия фильтров каталога по отдельности: счетчик каждого фасета
+    учитывает все фильтры, кроме своего
+    :param filters: dict
+        параметры фильтрации (get_catalog_filters)
+    :return: dict[str, Q]
+    """
+    conditions = {"price": Q(), "freeDelivery": Q(), "available": Q(), "tags": Q()}
+    if filters["min_price"]:
+        conditions["price"] &= Q(effective_price__gte=filters["min_price"])
+    if filters["max_price"]:
+        conditions["price"] &= Q(effective_price__lte=filters["max_price"])
+    if filters["free_delivery"]:
+        conditions["freeDelivery"] = Q(freeDelivery=True)
+    if filters["available"]:
+        conditions["available"] = Q(count__gt=0)
+    if filters["tags"]:
+        conditions["tags"] = tags_filter(filters["tags"], filters["tags_mode"])
+    return conditions
+
+
+def combine(conditions: dict[str, Q], exclude: str | None = None) -> Q:
+    """
+    Объединение условий фильтров, кроме исключенного
+    """
+    return reduce(
+        lambda result, name: result & conditions[name],
+        (name for name in conditions if name != exclude),
+        Q(),
+    )
+
+
+def bucket_counts(products, low: Decimal, high: Decimal) -> QuerySet:
+    """
+    Количество товаров по интервалам цен одним запросом с группировкой
+    :param products: QuerySet
+        товары без фильтра по цене
+    :param low: Decimal
+        минимальная цена
+    :param high: Decimal
+        максимальная цена (больше минимальной)
+    :return: QuerySet
+        пары (номер интервала с 1, количество товаров)
+    """
+    buckets = HISTOGRAM_BUCKETS
+    return (
+        products.annotate(
+            # цена, равная максимальной, попадает в последний интервал
+            bucket=Least(
+                WidthBucket(F("effective_price"), Value(low), Value(high), buckets),
+                Value(buckets),
+            )
+        )
+        .values("bucket")
+        .annotate(products=Count("pk"))
+        .order_by("bucket")
+        .values_list("bucket", "products")
+    )
+
+
+def price_histogram(counts: dict[int, int], stats: dict) -> list[dict]:
+    """
+    Гистограмма цен по количеству товаров в интервалах
+    :param counts: dict[int, int]
+        количество товаров по номерам интервалов (bucket_counts)
+    :param stats: dict
+        агрегаты фасетов (facet_aggregates)
+    :return: list[dict]
+    """
+    low, high = stats["min_price"], stats["max_price"]
+    if low is None:
+        return []
+    if low == high:
+        # у всех товаров одна цена (width_bucket не принимает равные границы)
+        return [{"min": float(low), "max": float(high), "count": stats["priced"]}]
+
+    buckets = HISTOGRAM_BUCKETS
+    width = (high - low) / buckets
+    return [
+        {
+            "min": float(low + width * number),
+            "max": float(high if number == buckets - 1 else low + width * (number + 1)),
+            "count": counts.get(number + 1, 0),
+        }
+        for number in range(buckets)
+    ]
+
+
+def facet_aggregates(conditions: dict[str, Q]) -> dict:
+    """
+    Условные агрегаты (FILTER) счетчиков и диапазона цен фасетов
+    :param conditions: dict[str, Q]
+        условия фильтров (facet_filters)
+    :return: dict
+    """
+    return {
+        "total": Count("pk", filter=combine(conditions)),
+        "min_price": Min("effective_price", filter=combine(conditions, "price")),
+        "max_price": Max("effective_price", filter=combine(conditions, "price")),
+        "free_delivery": Count(
+            "pk", filter=combine(conditions, "freeDelivery") & Q(freeDelivery=True)
+        ),
+        "in_stock": Count(
+            "pk", filter=combine(conditions, "available") & Q(count__gt=0)
+        ),
+        "priced": Count("pk", filter=combine(conditions, "price")),
+    }
+
+
+def tag_counts(products, conditions: dict[str, Q]) -> QuerySet:
+    """
+    Количество товаров по тэгам одним запросом с группировкой
+    :param products: QuerySet
+        товары категории
+    :param conditions: dict[str, Q]
+        условия фильтров (facet_filters)
+    :return: QuerySet
+    """
+    return (
+        Product.tags.through.objects.filter(
+            product__in=products.filter(combine(conditions, "tags")).values("pk")
+        )
+        .values("tag_id", "tag__name")
+        .annotate(products=Count("product_id"))
+        .order_by("-products", "tag__name")
+    )
+
+
+def facets_data(stats: dict, counts: dict[int, int], tags: list[dict]) -> dict:
+    """
+    Ответ с фасетами по результатам запросов
+    :param stats: dict
+        агрегаты фасетов (facet_aggregates)
+    :param counts: dict[int, int]
+        количество товаров по интервалам цен (bucket_counts)
+    :param tags: list[dict]
+        количество товаров по тэгам (tag_counts)
+    :return: dict
+    """
+    return {
+        "count": stats["total"],
+        "price": {
+            "min": float(stats["min_price"] or 0),
+            "max": float(stats["max_price"] or 0),
+        },
+        "histogram": price_histogram(counts, stats),
+        "tags": [
+            {"id": tag["tag_id"], "name": tag["tag__name"], "count": tag["products"]}
+            for tag in tags
+        ],
+        "freeDelivery": stats["free_delivery"],
+        "available": stats["in_stock"],
+    }
+
+
+def has_price_range(stats: dict) -> bool:
+    """
+    Нужна ли группировка по интервалам цен (цены товаров различаются)
+    """
+    return stats["min_price"] is not None and stats["min_price"] < stats["max_price"]
+
+
+def build_facets(filters: dict) -> dict:
+    """
+    Фасеты каталога для текущего состояния фильтров: диапазон и гистограмма
+    цен (с учетом скидок), количество товаров по тэгам, с бесплатной доставкой и в наличии.
+    Счетчики считаются одним запросом с условными агрегатами (FILTER),
+    гистограмма и тэги - запросами с группировкой
+    :param filters: dict
+        параметры фильтрации (get_catalog_filters)
+    :return: dict
+    """
+    products = Product.objects.filter(category_id=filters["category_id"])
+    if filters["name"]:
+        products = search_products(products, filters["name"])
+    conditions = facet_filters(filters)
+
+    stats = products.aggregate(**facet_aggregates(conditions))
+    counts = dict()
+    if has_price_range(stats):
+        counts = dict(
+            bucket_counts(
+                products.filter(combine(conditions, "price")),
+                stats["min_price"],
+                stats["max_price"],
+            )
+        )
+
+    return facets_data(stats, counts, list(tag_counts(products, conditions)))
+
+
+async def abuild_facets(filters: dict) -> dict:
+    """
+    Асинхронный вариант build_facets
+    :param filters: dict
+    :return: dict
+    """
+    products = Product.objects.filter(category_id=filters["category_id"])
+    if filters["name"]:
+        products = await asearch_products(products, filters["name"])
+    conditions = facet_filters(filters)
+
+    stats = await products.aaggregate(**facet_aggregates(conditions))
+    counts = dict()
+    if has_price_range(stats):
+        counts = {
+            bucket: count
+            async for bucket, count in bucket_counts(
+                products.filter(combine(conditions, "price")),
+                stats["min_price"],
+                stats["max_price"],
+            )
+        }
+
+    tags = [tag async for tag in tag_counts(products, conditions)]
+    return facets_data(stats, counts, tags)
+
+
+def facets_cache_key(request: Request) -> str:
+    """
+    Ключ кеша фасетов по параметрам фильтрации запроса
+    """
+    return catalog_cache_key("catalog_facets", request, exclude=FACETS_EXCLUDE)
+
+
+def store_facets(request: Request, cache_key: str) -> dict:
+    """
+    Построение фасетов каталога и сохранение их в кеше
+    (инвалидируются тэгом категории при изменении ее товаров)
+    :param request: Request
+        запрос с параметрами фильтрации
+    :param cache_key: str
+        ключ записи кеша
+    :return: dict
+    """
+    filters = get_catalog_filters(request)
+    versions = get_tag_versions((CATEGORY_TAG.format(filters["category_id"]),))
+
+    data = build_facets(filters)
+    set_tagged(cache_key, data, versions, FACETS_CACHE_TIMEOUT)
+    log.info("Записываем фасеты каталога в кеш %s", cache_key)
+    return data
+
+
+async def astore_facets(request: Request, cache_key: str) -> dict:
+    """
+    Асинхронный вариант store_facets
+    :param request: Request
+    :param cache_key: str
+    :return: dict
+    """
+    filters = get_catalog_filters(request, await aget_category_id(request))
+    versions = await aget_tag_versions((CATEGORY_TAG.format(filters["category_id"]),))
+
+    data = await abuild_facets(filters)
+    await aset_tagged(cache_key, data, versions, FACETS_CACHE_TIMEOUT)
+    log.info("Записываем фасеты каталога в кеш %s", cache_key)
+    return data
@@ -0,0 +1,106 @@
+import logging
+from functools import lru_cache
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+log = logging.getLogger(__name__)
+
+# размеры вариантов изображения (наибольшая сторона, px)
+VARIANT_SIZES = {
+    "thumb": 240,
+    "medium": 640,
+}
+# форматы вариантов и параметры сохранения (AVIF - Pillow 11.3+, собранный с libavif)
+VARIANT_FORMATS = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+    "avif": {"format": "AVIF", "quality": 60},
+}
+
+
+@lru_cache(maxsize=None)
+def variant_formats() -> dict[str, dict]:
+    """
+    Форматы вариантов, поддерживаемые установленным Pillow
+    (проверяются один раз на процесс)
+    :return: dict[str, dict]
+    """
+    return {
+        extension: options
+        for extension, options in VARIANT_FORMATS.items()
+        if features.check(extension)
+    }
+
+
+def variant_name(name: str, size: str, extension: str) -> str:
+    """
+    Имя файла варианта рядом с оригиналом:
+    products/product_1/photo.png -> products/product_1/photo.thumb.webp
+    :param name: str
+        имя оригинала в хранилище
+    :param size: str
+        размер варианта (VARIANT_SIZES)
+    :param extension: str
+        формат варианта (VARIANT_FORMATS)
+    :return: str
+    """
+    path = PurePosixPath(name)
+    return str(path.with_name(f"{path.stem}.{size}.{extension}"))
+
+
+def generate_variants(name: str) -> dict[str, dict[str, str]]:
+    """
+    Построение уменьшенных копий изображения во всех форматах вариантов
+    и сохранение их в хранилище рядом с оригиналом
+    :param name: str
+        имя оригинала в хранилище
+    :return: dict[str, dict[str, str]]
+        имена файлов вариантов по размерам и форматам
+    """
+    with default_storage.open(name) as file:
+        original = ImageOps.exif_transpose(Image.open(file))
+        original.load()
+    if original.mode not in ("RGB", "RGBA"):
+        # прозрачность палитровых изображений задается в info["transparency"]
+        transparent = "A" in original.getbands() or "transparency" in original.info
+        original = original.convert("RGBA" if transparent else "RGB")
+
+    formats = variant_formats()
+    variants = dict()
+    for size, side in VARIANT_SIZES.items():
+        image = original.copy()
+        # изображение только уменьшается, пропорции сохраняются
+        image.thumbnail((side, side), Image.Resampling.LANCZOS)
+
+        variants[size] = dict()
+        for extension, options in formats.items():
+            buffer = BytesIO()
+            image.save(buffer, **options)
+            path = variant_name(name, size, extension)
+            if default_storage.exists(path):
+                default_storage.delete(path)
+            variants[size][extension] = default_storage.save(
+                path, ContentFile(buffer.getvalue())
+            )
+
+    log.info("Построены варианты изображения %s: %s", name, list(variants))
+    return variants
+
+
+def variants_srcset(variants: dict | None) -> dict[str, dict[str, str]]:
+    """
+    Адреса вариантов изображения для вывода клиенту
+    :param variants: dict | None
+        имена файлов вариантов (поле variants)
+    :return: dict[str, dict[str, str]]
+        размер -> формат -> адрес (пустой, пока варианты не построены)
+    """
+    return {
+        size: {
+            extension: "".join(["/media/", path]) for extension, path in formats.items()
+        }
+        for size, formats in (variants or {}).items()
+    }
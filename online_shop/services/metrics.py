@@ -0,0 +1,231 @@
+import logging
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Any
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+log = logging.getLogger(__name__)
+
+# ключ хеша Redis с гистограммами (общий для всех процессов приложения)
+METRICS_KEY = "metrics:requests"
+
+# границы корзин гистограмм: время (сек) и количество запросов к базе данных
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+HISTOGRAMS = {
+    "shop_request_duration_seconds": ("Время обработки запроса", SECONDS_BUCKETS),
+    "shop_request_queries": ("Количество запросов к базе данных", QUERIES_BUCKETS),
+    "shop_request_sql_seconds": ("Время запросов к базе данных", SECONDS_BUCKETS),
+    "shop_request_serializer_seconds": ("Время сериализации", SECONDS_BUCKETS),
+}
+CACHE_COUNTER = "shop_cache_requests_total"
+
+
+@dataclass
+class RequestMetrics:
+    """
+    Показатели обработки одного запроса
+    """
+
+    queries: int = 0
+    sql_time: float = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    serializer_time: float = 0
+
+
+# показатели текущего запроса (None - запрос не отслеживается);
+# контекст копируется в sync_to_async, поэтому объект общий и для async-кода
+_current: ContextVar[RequestMetrics | None] = ContextVar(
+    "request_metrics", default=None
+)
+
+
+def start_request() -> Any:
+    """
+    Начало сбора показателей запроса
+    :return: Token
+        токен для завершения сбора (finish_request)
+    """
+    return _current.set(RequestMetrics())
+
+
+def finish_request(token) -> RequestMetrics:
+    """
+    Завершение сбора показателей запроса
+    :param token: Token
+    :return: RequestMetrics
+    """
+    metrics = _current.get()
+    _current.reset(token)
+    return metrics
+
+
+def query_timer(execute, sql, params, many, context):
+    """
+    Обертка выполнения SQL (connection.execute_wrappers):
+    учитывает количество и время запросов текущего запроса
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+
+    start = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.sql_time += perf_counter() - start
+
+
+def install_query_timer(sender, connection, **kwargs) -> None:
+    """
+    Подключение query_timer к новому соединению с базой данных
+    (обработчик сигнала connection_created)
+    """
+    if query_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_timer)
+
+
+def record_cache(hit: bool) -> None:
+    """
+    Учет обращения к кешу приложения
+    :param hit: bool
+        значение найдено в кеше
+    :return: None
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return
+    if hit:
+        metrics.cache_hits += 1
+    else:
+        metrics.cache_misses += 1
+
+
+def serializer_data(serializer) -> Any:
+    """
+    Данные сериализатора с учетом времени сериализации
+    :param serializer: Serializer
+    :return: Any
+        serializer.data
+    """
+    start = perf_counter()
+    try:
+        return serializer.data
+    finally:
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.serializer_time += perf_counter() - start
+
+
+def server_timing(metrics: RequestMetrics, duration: float) -> str:
+    """
+    Значение заголовка Server-Timing
+    :param metrics: RequestMetrics
+    :param duration: float
+        время обработки запроса (сек)
+    :return: str
+    """
+    return ", ".join(
+        (
+            f'db;dur={metrics.sql_time * 1000:.1f};desc="{metrics.queries} queries"',
+            f"serializer;dur={metrics.serializer_time * 1000:.1f}",
+            f'cache;desc="{metrics.cache_hits} hits, {metrics.cache_misses} misses"',
+            f"total;dur={duration * 1000:.1f}",
+        )
+    )
+
+
+def export_enabled() -> bool:
+    """
+    Экспорт гистограмм включен (задан токен доступа к ним)
+    """
+    return bool(settings.METRICS_TOKEN)
+
+
+def _labels(view: str, method: str) -> str:
+    return f'view="{view}",method="{method}"'
+
+
+def export_request(
+    view: str, method: str, metrics: RequestMetrics, duration: float
+) -> None:
+    """
+    Добавление показателей запроса в гистограммы (одним обращением к Redis).
+    В хеше хранятся счетчики отдельных корзин, накопленные значения
+    считаются при выводе
+    :param view: str
+        имя маршрута представления
+    :param method: str
+        HTTP-метод запроса
+    :param metrics: RequestMetrics
+    :param duration: float
+        время обработки запроса (сек)
+    :return: None
+    """
+    labels = _labels(view, method)
+    values = {
+        "shop_request_duration_seconds": duration,
+        "shop_request_queries": metrics.queries,
+        "shop_request_sql_seconds": metrics.sql_time,
+        "shop_request_serializer_seconds": metrics.serializer_time,
+    }
+
+    pipeline = get_redis_connection("default").pipeline(transaction=False)
+    for name, value in values.items():
+        buckets = HISTOGRAMS[name][1]
+        index = bisect_left(buckets, value)
+        le = buckets[index] if index < len(buckets) else "+Inf"
+        pipeline.hincrby(METRICS_KEY, f"{name}|{labels}|{le}", 1)
+        pipeline.hincrbyfloat(METRICS_KEY, f"{name}|{labels}|sum", value)
+    for result, count in (("hit", metrics.cache_hits), ("miss", metrics.cache_misses)):
+        if count:
+            pipeline.hincrby(
+                METRICS_KEY, f'{CACHE_COUNTER}|{labels},result="{result}"|', count
+            )
+
+    try:
+        pipeline.execute()
+    except Exception as exp:
+        # недоступность Redis не должна влиять на ответ
+        log.warning("Не удалось сохранить метрики запроса: %s", exp)
+
+
+def prometheus_text() -> str:
+    """
+    Гистограммы и счетчики в текстовом формате Prometheus
+    :return: str
+    """
+    raw = get_redis_connection("default").hgetall(METRICS_KEY)
+    series: dict[tuple[str, str], dict[str, float]] = dict()
+    for field, value in raw.items():
+        name, labels, le = field.decode().split("|")
+        series.setdefault((name, labels), dict())[le] = float(value)
+
+    lines = []
+    for name, (description, buckets) in HISTOGRAMS.items():
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} histogram")
+        for (i_name, labels), values in sorted(series.items()):
+            if i_name != name:
+                continue
+            count = 0
+            for le in (*buckets, "+Inf"):
+                count += values.get(str(le), 0)
+                lines.append(f'{name}_bucket{{{labels},le="{le}"}} {count:g}')
+            lines.append(f"{name}_sum{{{labels}}} {values.get('sum', 0):g}")
+            lines.append(f"{name}_count{{{labels}}} {count:g}")
+
+    lines.append(f"# HELP {CACHE_COUNTER} Обращения к кешу приложения")
+    lines.append(f"# TYPE {CACHE_COUNTER} counter")
+    for (name, labels), values in sorted(series.items()):
+        if name == CACHE_COUNTER:
+            lines.append(f"{name}{{{labels}}} {values['']:g}")
+
+    return "\n".join(lines) + "\n"
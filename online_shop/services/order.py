@@ -0,0 +1,247 @@
+import hashlib
+import logging
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Prefetch, QuerySet
+
+from orders.models import Order, OrderInfoBasket, StatusType
+from services.cache import DELIVERY_TAG, get_tag_versions
+from services.reservation import checkout
+from shopapp.models import Product, Specification
+
+log = logging.getLogger(__name__)
+
+# служебные товары доставки и характеристика с порогом бесплатной доставки
+DELIVERY_TITLE = "Доставка"
+FREE_DELIVERY_TITLE = "Бесплатная доставка"
+EXPRESS_DELIVERY_TITLE = "Экспресс-доставка"
+DELIVERY_TITLES = (DELIVERY_TITLE, FREE_DELIVERY_TITLE, EXPRESS_DELIVERY_TITLE)
+FREE_DELIVERY_THRESHOLD = "Сумма заказа"
+
+
+@dataclass(frozen=True)
+class DeliveryConfig:
+    """
+    Товары доставки и порог бесплатной доставки
+    """
+
+    delivery: Product
+    free_delivery: Product
+    express_delivery: Product | None
+    free_threshold: Decimal
+
+
+# конфигурация доставки в памяти процесса и версия тэга, с которой она загружена
+_delivery_config: tuple[str, DeliveryConfig] | None = None
+
+
+def load_delivery_config() -> DeliveryConfig:
+    """
+    Загрузка товаров доставки и порога бесплатной доставки из базы данных
+    :return: DeliveryConfig
+    """
+    products = {
+        product.title: product
+        for product in Product.objects.filter(title__in=DELIVERY_TITLES).only(
+            "id", "title", "price"
+        )
+    }
+    threshold = (
+        Specification.objects.filter(
+            product__title=DELIVERY_TITLE, name=FREE_DELIVERY_THRESHOLD
+        )
+        .values_list("value", flat=True)
+        .first()
+    )
+    return DeliveryConfig(
+        delivery=products[DELIVERY_TITLE],
+        free_delivery=products[FREE_DELIVERY_TITLE],
+        express_delivery=products.get(EXPRESS_DELIVERY_TITLE),
+        free_threshold=Decimal(threshold),
+    )
+
+
+def get_delivery_config() -> DeliveryConfig:
+    """
+    Конфигурация доставки из памяти процесса.
+    Актуальность проверяется по версии тэга в кеше, которую сбрасывают
+    сигналы изменения товаров доставки (во всех процессах сразу)
+    :return: DeliveryConfig
+    """
+    global _delivery_config
+
+    version = get_tag_versions((DELIVERY_TAG,))[DELIVERY_TAG]
+    if _delivery_config is None or _delivery_config[0] != version:
+        _delivery_config = (version, load_delivery_config())
+        log.info("Загружена конфигурация доставки")
+    return _delivery_config[1]
+
+
+def with_products(queryset: QuerySet) -> QuerySet:
+    """
+    Заказы вместе с покупателем и строками заказа (атрибут lines,
+    в порядке цены товаров): товары строк, их изображения и тэги
+    загружаются заранее, поэтому количество запросов не зависит
+    от числа заказов и позиций
+    :param queryset: QuerySet
+        выборка заказов
+    :return: QuerySet
+    """
+    lines = (
+        OrderInfoBasket.objects.select_related("product")
+        .prefetch_related("product__images", "product__tags")
+        .order_by("product__price", "pk")
+    )
+    return queryset.select_related("user__profile").prefetch_related(
+        Prefetch("orderinfobasket_set", queryset=lines, to_attr="lines")
+    )
+
+
+def _lock_cart(cart_token: str) -> None:
+    """
+    Блокировка корзины до конца транзакции (advisory lock PostgreSQL):
+    параллельные запросы оформления одной корзины выполняются по очереди
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [cart_token])
+
+
+def cart_hash(items: dict[int, dict]) -> str:
+    """
+    Хэш содержимого корзины (товары, количество и цены)
+    :param items: dict[int, dict]
+        товары корзины по id
+    :return: str
+    """
+    content = ";".join(
+        f"{product_id}:{item['quantity']}:{item['price']}"
+        for product_id, item in sorted(items.items())
+    )
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def pending_order(cart_token: str, contents_hash: str) -> Order | None:
+    """
+    Неоплаченный заказ, уже оформленный из корзины с тем же содержимым
+    (корзина удаляется после успешной оплаты заказа).
+    Измененная после оформления корзина оформляется в новый заказ
+    :param cart_token: str
+        токен корзины покупателя
+    :param contents_hash: str
+        хэш текущего содержимого корзины (cart_hash)
+    :return: Order | None
+    """
+    return (
+        Order.objects.filter(cart_token=cart_token, cart_hash=contents_hash)
+        .exclude(status=StatusType.PAID)
+        .order_by("-created_at")
+        .first()
+    )
+
+
+def create_order(user: User, cart) -> Order | None:
+    """
+    Создание заказа из корзины в одной транзакции:
+    подтверждение резерва, расчет стоимости за один проход по корзине,
+    вставка всех позиций заказа одним запросом.
+    Повторное оформление той же корзины (двойная отправка, повтор запроса)
+    возвращает уже созданный заказ без повторного списания товара со склада
+    :param user: User
+        покупатель
+    :param cart: Cart | RedisCart
+        корзина покупателя
+    :return: Order | None
+        созданный заказ (None - корзина пуста)
+    """
+    delivery_config = get_delivery_config()
+
+    with transaction.atomic():
+        items = {int(i_id): dict(cart.get(i_id)) for i_id in cart.list_id_products()}
+        if not items:
+            return None
+
+        _lock_cart(cart.token)
+        order = pending_order(cart.token, cart_hash(items))
+        if order is not None:
+            log.info("Корзина %s уже оформлена в заказ %s", cart.token, order.pk)
+            return order
+
+        # резерв корзины подтверждается, недостающий товар убирается из корзины
+        held = checkout(
+            cart.token,
+            {product_id: item["quantity"] for product_id, item in items.items()},
+        )
+        shortages = dict()
+        for product_id, count in held.items():
+            shortage = items[product_id]["quantity"] - count
+            if shortage > 0:
+                log.info(
+                    "Товара с id %s не хватает на складе: %s", product_id, shortage
+                )
+                shortages[product_id] = shortage
+                items[product_id]["quantity"] = count
+
+        if shortages:
+            # корзина хранится вне базы данных (сессия, Redis) и при откате
+            # транзакции не восстанавливается: меняется после ее фиксации
+            def remove_shortages():
+                for product_id, shortage in shortages.items():
+                    cart.remove(product_id, shortage)
+
+            transaction.on_commit(remove_shortages)
+
+        items = {
+            product_id: item for product_id, item in items.items() if item["quantity"]
+        }
+        if not items:
+            return None
+        # хэш содержимого, которое останется в корзине после удаления
+        # недостающего товара: повтор запроса найдет этот заказ
+        contents_hash = cart_hash(items)
+
+        free_delivery_flags = dict(
+            Product.objects.filter(pk__in=items).values_list("pk", "freeDelivery")
+        )
+
+        total_cost = Decimal(0)
+        free_delivery = True
+        lines = []
+        for product_id, item in items.items():
+            if product_id not in free_delivery_flags:
+                continue
+            free_delivery &= free_delivery_flags[product_id]
+            total_cost += Decimal(item["quantity"]) * Decimal(item["price"])
+            lines.append(
+                OrderInfoBasket(
+                    product_id=product_id,
+                    count_in_order=item["quantity"],
+                    price_in_order=item["price"],
+                )
+            )
+
+        if not free_delivery and total_cost < delivery_config.free_threshold:
+            delivery = delivery_config.delivery
+            total_cost += delivery.price
+        else:
+            delivery = delivery_config.free_delivery
+        lines.append(
+            OrderInfoBasket(
+                product=delivery, count_in_order=1, price_in_order=delivery.price
+            )
+        )
+
+        order = Order.objects.create(
+            user=user,
+            total_cost=total_cost,
+            cart_token=cart.token,
+            cart_hash=contents_hash,
+        )
+        for line in lines:
+            line.order = order
+        OrderInfoBasket.objects.bulk_create(lines)
+
+    log.info("Новый ордер с %s создан, статус ордера %s" % (order.pk, order.status))
+    return order
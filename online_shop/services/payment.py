@@ -1,11 +1,26 @@
 import re
+import hashlib
+import hmac
 import logging
+import uuid
+from dataclasses import dataclass
+from decimal import Decimal
 
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils.module_loading import import_string
 from rest_framework.request import Request
 from rest_framework import status
 
+from basket.cart import discard_cart
+from orders.models import Order, Payment, PaymentStatus, StatusType
+
 log = logging.getLogger(__name__)
 
+# статусы платежа, при которых заказ нельзя оплатить повторно
+ACTIVE_PAYMENT_STATUSES = (PaymentStatus.PROCESSING, PaymentStatus.SUCCEEDED)
+
 
 def checking_payments(request: Request):
     """
@@ -52,3 +67,231 @@ def checking_payments(request: Request):
     log.info("Данные указаны верно")
 
     return response
+
+
+@dataclass(frozen=True)
+class PaymentResult:
+    """
+    Ответ провайдера на списание средств
+    (статус processing - результат придет позже на callback)
+    """
+
+    status: str
+    transaction_id: str = ""
+    message: str = ""
+
+
+class PaymentProviderError(Exception):
+    """
+    Провайдер недоступен, списание можно повторить с тем же ключом
+    """
+
+
+class PaymentProvider(object):
+    """
+    Адаптер платежного провайдера
+    """
+
+    def tokenize(self, card: dict) -> str:
+        """
+        Замена данных платежной карты токеном провайдера.
+        Данные карты не покидают запрос покупателя: в очередь задач
+        и базу данных передается только токен
+        :param card: dict
+            данные платежной карты
+        :return: str
+        """
+        raise NotImplementedError
+
+    def charge(
+        self, idempotency_key: str, amount: Decimal, card_token: str
+    ) -> PaymentResult:
+        """
+        Списание средств с карты. Повторный вызов с тем же ключом
+        идемпотентности не должен приводить к повторному списанию
+        :param idempotency_key: str
+            ключ идемпотентности платежа
+        :param amount: Decimal
+            сумма платежа
+        :param card_token: str
+            токен платежной карты (tokenize)
+        :return: PaymentResult
+        """
+        raise NotImplementedError
+
+
+class FakePaymentProvider(PaymentProvider):
+    """
+    Локальный провайдер для разработки и тестов:
+    отклоняет платежи с карт, номер которых заканчивается на 0
+    """
+
+    # выполненные списания по ключам идемпотентности
+    charges: dict[str, PaymentResult] = dict()
+
+    def tokenize(self, card: dict) -> str:
+        # в токене остаются только последние цифры номера карты
+        return f"tok_{uuid.uuid4().hex}_{card['number'][-4:]}"
+
+    def charge(
+        self, idempotency_key: str, amount: Decimal, card_token: str
+    ) -> PaymentResult:
+        if idempotency_key not in self.charges:
+            if card_token.endswith("0"):
+                result = PaymentResult(
+                    status=PaymentStatus.FAILED, message="Платеж отклонен"
+                )
+            else:
+                result = PaymentResult(
+                    status=PaymentStatus.SUCCEEDED,
+                    transaction_id=uuid.uuid4().hex,
+                    message="Оплата прошла успешно",
+                )
+            self.charges[idempotency_key] = result
+        return self.charges[idempotency_key]
+
+
+class IdempotencyKeyConflict(Exception):
+    """
+    Ключ идемпотентности уже использован платежом по другому заказу
+    """
+
+
+def get_payment_provider() -> PaymentProvider:
+    """
+    Провайдер, выбранный в настройке PAYMENT_PROVIDER
+    :return: PaymentProvider
+    """
+    return import_string(settings.PAYMENT_PROVIDER)()
+
+
+def start_payment(order: Order, idempotency_key: str | None) -> tuple[Payment, bool]:
+    """
+    Регистрация платежа по заказу в статусе processing.
+    Повторный запрос с тем же ключом, а также оплата заказа, по которому
+    уже есть обрабатываемый или успешный платеж, возвращают этот платеж.
+    Ключ, использованный платежом по другому заказу, вызывает IdempotencyKeyConflict
+    :param order: Order
+    :param idempotency_key: str | None
+        ключ идемпотентности из запроса (None - генерируется новый)
+    :return: tuple[Payment, bool]
+        платеж и признак того, что он создан этим запросом
+    """
+    if idempotency_key:
+        payment = Payment.objects.filter(idempotency_key=idempotency_key).first()
+        if payment is not None:
+            if payment.order_id != order.pk:
+                raise IdempotencyKeyConflict(idempotency_key)
+            return payment, False
+
+    active = Payment.objects.filter(
+        order=order, status__in=ACTIVE_PAYMENT_STATUSES
+    ).first()
+    if active is not None:
+        return active, False
+
+    try:
+        with transaction.atomic():
+            payment = Payment.objects.create(
+                order=order,
+                idempotency_key=idempotency_key or uuid.uuid4().hex,
+                amount=order.total_cost,
+            )
+    except IntegrityError:
+        # параллельный запрос успел зарегистрировать платеж
+        payment = Payment.objects.filter(
+            Q(idempotency_key=idempotency_key)
+            | Q(order=order, status__in=ACTIVE_PAYMENT_STATUSES)
+        ).first()
+        if payment is None or payment.order_id != order.pk:
+            raise IdempotencyKeyConflict(idempotency_key)
+        return payment, False
+
+    log.info("Платеж %s по заказу %s принят в обработку", payment.pk, order.pk)
+    return payment, True
+
+
+def complete_payment(payment_id: int, result: PaymentResult) -> Payment | None:
+    """
+    Фиксация результата платежа (повторная фиксация игнорируется).
+    После успешной оплаты удаляется корзина, из которой оформлен заказ,
+    при отказе корзина сохраняется для повторной оплаты
+    :param payment_id: int
+    :param result: PaymentResult
+    :return: Payment | None
+        платеж, если заказ оплачен этим вызовом
+    """
+    with transaction.atomic():
+        payment = (
+            Payment.objects.select_for_update()
+            .filter(pk=payment_id, status=PaymentStatus.PROCESSING)
+            .first()
+        )
+        if payment is None or result.status == PaymentStatus.PROCESSING:
+            return None
+
+        payment.status = result.status
+        payment.transaction_id = result.transaction_id
+        payment.message = result.message
+        payment.save()
+
+        if payment.status == PaymentStatus.SUCCEEDED:
+            order = Order.objects.filter(pk=payment.order_id)
+            order.update(status=StatusType.PAID)
+            cart_token = order.values_list("cart_token", flat=True).first()
+            if cart_token:
+                transaction.on_commit(lambda: discard_cart(cart_token))
+
+    log.info(
+        "Платеж %s по заказу %s завершен со статусом %s",
+        payment.pk,
+        payment.order_id,
+        payment.status,
+    )
+    if payment.status == PaymentStatus.SUCCEEDED:
+        return payment
+    return None
+
+
+def process_payment(payment_id: int, card_token: str) -> Payment | None:
+    """
+    Списание средств через провайдера и фиксация результата
+    :param payment_id: int
+    :param card_token: str
+        токен платежной карты
+    :return: Payment | None
+        платеж, если заказ оплачен
+    """
+    payment = Payment.objects.filter(
+        pk=payment_id, status=PaymentStatus.PROCESSING
+    ).first()
+    if payment is None:
+        return None
+
+    result = get_payment_provider().charge(
+        payment.idempotency_key, payment.amount, card_token
+    )
+    return complete_payment(payment.pk, result)
+
+
+def callback_signature(body: bytes) -> str:
+    """
+    Подпись тела callback-запроса провайдера (HMAC-SHA256)
+    :param body: bytes
+    :return: str
+    """
+    return hmac.new(
+        settings.PAYMENT_WEBHOOK_SECRET.encode(), body, hashlib.sha256
+    ).hexdigest()
+
+
+def check_callback_signature(body: bytes, signature: str) -> bool:
+    """
+    Проверка подписи callback-запроса провайдера
+    :param body: bytes
+    :param signature: str
+    :return: bool
+    """
+    if not settings.PAYMENT_WEBHOOK_SECRET:
+        return False
+    return hmac.compare_digest(callback_signature(body), signature)
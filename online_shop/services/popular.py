@@ -0,0 +1,126 @@
+import logging
+from datetime import timedelta
+
+from django.db.models import F, FloatField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, Ln
+from django.utils import timezone
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from orders.models import OrderInfoBasket
+from services.order import DELIVERY_TITLES
+from shopapp.models import Product
+
+log = logging.getLogger(__name__)
+
+# отсортированное множество Redis: id товара -> обратное место в рейтинге
+POPULAR_KEY = "popular:products"
+POPULAR_LOCK = "popular:products:lock"
+
+# в рейтинге хранится больше товаров, чем выводится, на случай удаления товаров
+POPULAR_SIZE = 32
+# период, за который учитываются продажи товара
+SALES_PERIOD = timedelta(days=30)
+# «априорное» количество отзывов: рейтинг с малым числом отзывов снижается
+REVIEWS_PRIOR = 3
+# время, за которое перестроение рейтинга должно завершиться (сек)
+REFRESH_TIMEOUT = 5 * 60
+
+
+def ranking(size: int = POPULAR_SIZE) -> list[tuple[int, float]]:
+    """
+    Расчет рейтинга популярности одним запросом к базе данных:
+    средняя оценка, взвешенная по количеству отзывов, плюс логарифм
+    количества товара в заказах за SALES_PERIOD
+    :param size: int
+        количество товаров в рейтинге
+    :return: list[tuple[int, float]]
+        id товара и его score в порядке убывания
+    """
+    since = timezone.now() - SALES_PERIOD
+    sales = (
+        OrderInfoBasket.objects.filter(
+            product=OuterRef("pk"), order__created_at__gte=since
+        )
+        .values("product")
+        .annotate(total=Sum("count_in_order"))
+        .values("total")
+    )
+    reviews = Cast("reviews_count", FloatField())
+    score = F("rating_avg") * reviews / (reviews + REVIEWS_PRIOR) + Ln(
+        Cast(Coalesce(Subquery(sales), 0), FloatField()) + Value(1.0)
+    )
+
+    return list(
+        Product.objects.exclude(title__in=DELIVERY_TITLES)
+        .annotate(score=score)
+        .order_by("-score", "pk")
+        .values_list("pk", "score")[:size]
+    )
+
+
+def refresh_popular() -> int | None:
+    """
+    Перестроение рейтинга популярных товаров.
+    Одновременно выполняется только одно перестроение (блокировка в Redis),
+    новый рейтинг записывается во временный ключ и подменяет старый
+    атомарно (RENAME), поэтому читатели не видят пустой или неполный рейтинг
+    :return: int | None
+        количество товаров в рейтинге (None - перестроение уже выполняется)
+    """
+    redis = get_redis_connection("default")
+    lock = redis.lock(POPULAR_LOCK, timeout=REFRESH_TIMEOUT)
+    if not lock.acquire(blocking=False):
+        log.info("Рейтинг популярных товаров уже перестраивается")
+        return None
+
+    try:
+        scores = ranking()
+        if scores:
+            staging = f"{POPULAR_KEY}:staging"
+            pipeline = redis.pipeline()
+            pipeline.delete(staging)
+            # score - обратное место в рейтинге (порядок при равных score
+            # в Redis лексикографический, поэтому сами score не сохраняются)
+            pipeline.zadd(
+                staging,
+                {str(pk): len(scores) - place for place, (pk, _) in enumerate(scores)},
+            )
+            pipeline.rename(staging, POPULAR_KEY)
+            pipeline.execute()
+        else:
+            redis.delete(POPULAR_KEY)
+    finally:
+        lock.release()
+
+    log.info("Рейтинг популярных товаров перестроен: %s товаров", len(scores))
+    return len(scores)
+
+
+def popular_product_ids(limit: int) -> list[int]:
+    """
+    Id самых популярных товаров из рейтинга в Redis.
+    Если рейтинга еще нет (первый запуск) - он строится в текущем запросе,
+    пока другой процесс его строит - используется сортировка по рейтингу
+    отзывов (индекс rating_avg)
+    :param limit: int
+        количество товаров
+    :return: list[int]
+    """
+    try:
+        redis = get_redis_connection("default")
+        ids = redis.zrevrange(POPULAR_KEY, 0, limit - 1)
+        if not ids and refresh_popular() is not None:
+            ids = redis.zrevrange(POPULAR_KEY, 0, limit - 1)
+    except RedisError as exp:
+        log.warning("Рейтинг популярных товаров недоступен: %s", exp)
+        ids = []
+
+    if ids:
+        return [int(pk) for pk in ids]
+
+    return list(
+        Product.objects.exclude(title__in=DELIVERY_TITLES)
+        .order_by("-rating_avg", "pk")
+        .values_list("pk", flat=True)[:limit]
+    )
@@ -0,0 +1,111 @@
+import logging
+from decimal import Decimal
+from typing import Iterable
+
+from django.db.models import F, OuterRef, QuerySet, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from shopapp.models import Product, Sales
+
+log = logging.getLogger(__name__)
+
+
+def current_price():
+    """
+    Выражение цены товара с учетом скидки, действующей в текущий момент
+    """
+    now = timezone.now()
+    sales = Sales.objects.filter(
+        product=OuterRef("pk"), dateFrom__lte=now, dateTo__gte=now
+    ).values("salePrice")
+    return Coalesce(Subquery(sales), F("price"))
+
+
+def refresh_effective_prices(queryset: QuerySet) -> list[tuple[int, int]]:
+    """
+    Пересчет цены с учетом скидки (Product.effective_price) для товаров
+    выборки, у которых она изменилась
+    :param queryset: QuerySet
+        товары для проверки
+    :return: list[tuple[int, int]]
+        id и категория каждого товара с измененной ценой
+    """
+    changed = list(
+        queryset.annotate(new_price=current_price())
+        .exclude(effective_price=F("new_price"))
+        .order_by()
+        .values_list("pk", "category_id")
+    )
+    if changed:
+        Product.objects.filter(pk__in=[pk for pk, _ in changed]).update(
+            effective_price=current_price()
+        )
+        log.info("Пересчитаны цены со скидкой %s товаров", len(changed))
+    return changed
+
+
+def effective_prices(product_ids: Iterable[int]) -> dict[int, Decimal]:
+    """
+    Цены товаров с учетом действующих скидок (одним запросом)
+    :param product_ids: Iterable[int]
+        id товаров
+    :return: dict[int, Decimal]
+        цена каждого найденного товара
+    """
+    rows = (
+        Product.objects.filter(pk__in=list(product_ids))
+        .order_by()
+        .values_list("pk", "effective_price")
+    )
+    return dict(rows)
+
+
+class PriceResolver(object):
+    """
+    Цены товаров в рамках одного запроса: каждая цена загружается один раз,
+    недостающие цены догружаются одним запросом на весь список
+    """
+
+    def __init__(self):
+        self._prices = dict()
+
+    def prices(self, product_ids: Iterable[int]) -> dict[int, Decimal]:
+        """
+        Цены указанных товаров
+        :param product_ids: Iterable[int]
+        :return: dict[int, Decimal]
+        """
+        product_ids = [int(product_id) for product_id in product_ids]
+        missing = [
+            product_id for product_id in product_ids if product_id not in self._prices
+        ]
+        if missing:
+            self._prices.update(effective_prices(missing))
+        return {
+            product_id: self._prices[product_id]
+            for product_id in product_ids
+            if product_id in self._prices
+        }
+
+    def price(self, product_id: int) -> Decimal:
+        """
+        Цена одного товара
+        :param product_id: int
+        :return: Decimal
+        """
+        return self.prices([product_id])[int(product_id)]
+
+
+def get_price_resolver(request) -> PriceResolver:
+    """
+    Цены товаров, запомненные для текущего запроса
+    :param request:
+        запрос Django или DRF
+    :return: PriceResolver
+    """
+    request = getattr(request, "_request", request)
+    resolver = getattr(request, "_price_resolver", None)
+    if resolver is None:
+        resolver = request._price_resolver = PriceResolver()
+    return resolver
@@ -0,0 +1,308 @@
+import logging
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from basket.models import Reservation
+from services.cache import CATEGORY_TAG, PRODUCT_TAG, invalidate_tags
+from shopapp.models import Product
+
+log = logging.getLogger(__name__)
+
+
+def reservation_deadline() -> datetime:
+    """
+    Время окончания резерва, отсчитываемое от текущего момента
+    :return: datetime
+    """
+    return timezone.now() + timedelta(seconds=settings.CART_RESERVATION_TTL)
+
+
+def _lock_stock(product_id: int) -> int | None:
+    """
+    Блокировка строки товара до конца транзакции (SELECT ... FOR UPDATE).
+    Все операции с остатком товара сначала блокируют его строку,
+    поэтому параллельные запросы к одному товару выполняются по очереди
+    :param product_id: int
+    :return: int | None
+        остаток товара на складе (None - товар не найден)
+    """
+    return (
+        Product.objects.select_for_update()
+        .filter(pk=product_id)
+        .values_list("count", flat=True)
+        .first()
+    )
+
+
+def _stock_changed(product_id: int) -> None:
+    """
+    Сброс кеша товара и его категории после фиксации транзакции
+    с изменением его остатка (остаток влияет на страницы каталога
+    и фасеты с фильтром по наличию)
+    """
+
+    def invalidate():
+        tags = [PRODUCT_TAG.format(product_id)]
+        category_id = (
+            Product.objects.filter(pk=product_id)
+            .values_list("category_id", flat=True)
+            .first()
+        )
+        if category_id is not None:
+            tags.append(CATEGORY_TAG.format(category_id))
+        invalidate_tags(*tags)
+
+    transaction.on_commit(invalidate)
+
+
+def _take_stock(cart_token: str, product_id: int, quantity: int) -> int:
+    """
+    Перенос товара со склада в резерв корзины (строка товара должна быть
+    заблокирована). Если товара не хватает - резервируется весь остаток
+    :return: int
+        зарезервированное количество
+    """
+    stock = _lock_stock(product_id)
+    if stock is None:
+        raise Product.DoesNotExist(f"Product with id {product_id} does not exist")
+
+    reserved = max(0, min(quantity, stock))
+    if reserved == 0:
+        return 0
+
+    Product.objects.filter(pk=product_id).update(count=F("count") - reserved)
+    updated = Reservation.objects.filter(
+        cart_token=cart_token, product_id=product_id
+    ).update(quantity=F("quantity") + reserved, expires_at=reservation_deadline())
+    if not updated:
+        Reservation.objects.create(
+            cart_token=cart_token,
+            product_id=product_id,
+            quantity=reserved,
+            expires_at=reservation_deadline(),
+        )
+
+    _stock_changed(product_id)
+    return reserved
+
+
+def _return_stock(cart_token: str, product_id: int, quantity: int) -> int:
+    """
+    Возврат товара из резерва корзины на склад
+    (строка товара должна быть заблокирована)
+    :return: int
+        возвращенное количество
+    """
+    reservation = Reservation.objects.filter(
+        cart_token=cart_token, product_id=product_id
+    ).first()
+    if reservation is None:
+        return 0
+
+    released = max(0, min(quantity, reservation.quantity))
+    if released == reservation.quantity:
+        reservation.delete()
+    else:
+        Reservation.objects.filter(pk=reservation.pk).update(
+            quantity=F("quantity") - released
+        )
+
+    if released:
+        Product.objects.filter(pk=product_id).update(count=F("count") + released)
+        _stock_changed(product_id)
+    return released
+
+
+def reserve(cart_token: str, product_id: int, quantity: int) -> int:
+    """
+    Резервирование товара под корзину (при нехватке - частичное)
+    :param cart_token: str
+        токен корзины покупателя
+    :param product_id: int
+        id товара
+    :param quantity: int
+        запрошенное количество
+    :return: int
+        фактически зарезервированное количество (0 - товара нет на складе)
+    """
+    with transaction.atomic():
+        reserved = _take_stock(cart_token, product_id, quantity)
+        touch(cart_token)
+
+    log.info(
+        "Товар с id %s зарезервирован в количестве %s из %s",
+        product_id,
+        reserved,
+        quantity,
+    )
+    return reserved
+
+
+def release(cart_token: str, product_id: int, quantity: int) -> int:
+    """
+    Возврат зарезервированного товара на склад
+    :param cart_token: str
+        токен корзины покупателя
+    :param product_id: int
+        id товара
+    :param quantity: int
+        возвращаемое количество
+    :return: int
+        фактически возвращенное количество (не больше резерва корзины)
+    """
+    with transaction.atomic():
+        if _lock_stock(product_id) is None:
+            return 0
+        released = _return_stock(cart_token, product_id, quantity)
+
+    log.info("Товар с id %s возвращен на склад в количестве %s", product_id, released)
+    return released
+
+
+def touch(cart_token: str) -> None:
+    """
+    Продление резерва корзины (при любом обращении покупателя к корзине)
+    :param cart_token: str
+    :return: None
+    """
+    Reservation.objects.filter(cart_token=cart_token).update(
+        expires_at=reservation_deadline()
+    )
+
+
+def merge(from_token: str, to_token: str) -> None:
+    """
+    Перенос резерва одной корзины в другую (при объединении корзин)
+    :param from_token: str
+        токен исходной корзины
+    :param to_token: str
+        токен корзины, в которую переносится резерв
+    :return: None
+    """
+    with transaction.atomic():
+        product_ids = sorted(
+            Reservation.objects.filter(cart_token=from_token).values_list(
+                "product_id", flat=True
+            )
+        )
+        for product_id in product_ids:
+            _lock_stock(product_id)
+            quantity = (
+                Reservation.objects.filter(cart_token=from_token, product_id=product_id)
+                .values_list("quantity", flat=True)
+                .first()
+            )
+            if quantity is None:
+                continue
+
+            updated = Reservation.objects.filter(
+                cart_token=to_token, product_id=product_id
+            ).update(
+                quantity=F("quantity") + quantity, expires_at=reservation_deadline()
+            )
+            source = Reservation.objects.filter(
+                cart_token=from_token, product_id=product_id
+            )
+            if updated:
+                source.delete()
+            else:
+                source.update(cart_token=to_token, expires_at=reservation_deadline())
+
+
+def checkout(cart_token: str, items: dict[int, int]) -> dict[int, int]:
+    """
+    Подтверждение резерва корзины при оформлении заказа.
+    Истекший резерв восстанавливается (насколько хватает остатка),
+    лишний резерв возвращается на склад, после чего резерв снимается -
+    товар считается проданным
+    :param cart_token: str
+        токен корзины покупателя
+    :param items: dict[int, int]
+        количество каждого товара в корзине
+    :return: dict[int, int]
+        количество каждого товара, которое удалось сохранить за заказом
+    """
+    held = dict()
+    with transaction.atomic():
+        product_ids = sorted(
+            set(items)
+            | set(
+                Reservation.objects.filter(cart_token=cart_token).values_list(
+                    "product_id", flat=True
+                )
+            )
+        )
+        # товары корзины блокируются одним запросом в порядке id,
+        # чтобы исключить взаимоблокировки
+        existing = set(
+            Product.objects.select_for_update()
+            .filter(pk__in=product_ids)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        reserved = dict(
+            Reservation.objects.filter(cart_token=cart_token).values_list(
+                "product_id", "quantity"
+            )
+        )
+
+        for product_id in product_ids:
+            if product_id not in existing:
+                if product_id in items:
+                    held[product_id] = 0
+                continue
+
+            quantity = items.get(product_id, 0)
+            current = reserved.get(product_id, 0)
+            if current < quantity:
+                current += _take_stock(cart_token, product_id, quantity - current)
+            elif current > quantity:
+                current -= _return_stock(cart_token, product_id, current - quantity)
+
+            if product_id in items:
+                held[product_id] = current
+
+        Reservation.objects.filter(cart_token=cart_token).delete()
+
+    log.info("Резерв корзины %s подтвержден: %s", cart_token, held)
+    return held
+
+
+def release_expired(now: datetime | None = None) -> int:
+    """
+    Возврат на склад товаров из просроченных резервов (брошенных корзин)
+    :param now: datetime | None
+        момент времени, на который проверяется срок резерва
+    :return: int
+        количество снятых резервов
+    """
+    now = now or timezone.now()
+    expired = (
+        Reservation.objects.filter(expires_at__lte=now)
+        .order_by("product_id")
+        .values_list("cart_token", "product_id")
+    )
+
+    released = 0
+    for cart_token, product_id in expired:
+        with transaction.atomic():
+            _lock_stock(product_id)
+            # резерв мог быть продлен или снят, пока ожидалась блокировка
+            quantity = (
+                Reservation.objects.filter(
+                    cart_token=cart_token, product_id=product_id, expires_at__lte=now
+                )
+                .values_list("quantity", flat=True)
+                .first()
+            )
+            if quantity is None:
+                continue
+            _return_stock(cart_token, product_id, quantity)
+            released += 1
+
+    log.info("Снято просроченных резервов: %s", released)
+    return released
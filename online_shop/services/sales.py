@@ -0,0 +1,86 @@
+import logging
+from math import ceil
+
+from django.db.models import DecimalField, ExpressionWrapper, F, Min, Q, QuerySet
+from django.db.models.functions import NullIf
+from django.utils import timezone
+
+from services.cache import SALES_TAG, get_tag_versions, get_tagged, set_tagged
+from services.metrics import serializer_data
+from shopapp.models import Sales
+from shopapp.serializers import SalesRowSerializer
+
+log = logging.getLogger(__name__)
+
+# порядок списка скидок: по id или по размеру скидки (от большей к меньшей)
+SALES_SORTS = ("id", "discount")
+SALES_CACHE_KEY = "sales_list:{}"
+# наибольшее время хранения списка в кеше (сек), если граница периода
+# ближайшей скидки еще не скоро
+SALES_CACHE_TIMEOUT = 60 * 60
+
+
+def active_sales(sort: str = "id") -> QuerySet:
+    """
+    Действующие скидки (индекс по dateFrom, dateTo).
+    Размер скидки считается в запросе к базе данных
+    :param sort: str
+        порядок списка (SALES_SORTS)
+    :return: QuerySet
+    """
+    now = timezone.now()
+    queryset = Sales.objects.filter(dateFrom__lte=now, dateTo__gte=now)
+    if sort != "discount":
+        return queryset.order_by("id")
+
+    discount = ExpressionWrapper(
+        (F("product__price") - F("salePrice")) / NullIf(F("product__price"), 0),
+        output_field=DecimalField(),
+    )
+    return queryset.annotate(discount=discount).order_by(
+        F("discount").desc(nulls_last=True), "id"
+    )
+
+
+def sales_cache_timeout() -> int:
+    """
+    Время до ближайшего начала или окончания периода скидки (сек):
+    в этот момент список действующих скидок меняется и строится заново
+    :return: int
+    """
+    now = timezone.now()
+    boundaries = Sales.objects.aggregate(
+        next_start=Min("dateFrom", filter=Q(dateFrom__gt=now)),
+        next_end=Min("dateTo", filter=Q(dateTo__gte=now)),
+    )
+    timeout = SALES_CACHE_TIMEOUT
+    for boundary in boundaries.values():
+        if boundary is not None:
+            timeout = min(timeout, ceil((boundary - now).total_seconds()) + 1)
+    return max(timeout, 1)
+
+
+def get_sales_list(sort: str) -> list[dict]:
+    """
+    Полный список действующих скидок в формате SalesSerializer из кеша.
+    Список строится один раз для всех страниц, хранится до ближайшей
+    границы периода скидки и инвалидируется тэгом при изменении скидок
+    и товаров со скидкой
+    :param sort: str
+        порядок списка (SALES_SORTS)
+    :return: list[dict]
+    """
+    cache_key = SALES_CACHE_KEY.format(sort)
+    data = get_tagged(cache_key)
+    if data is not None:
+        log.info("Получаем список скидок из кеша %s", cache_key)
+        return data
+
+    versions = get_tag_versions((SALES_TAG,))
+    timeout = sales_cache_timeout()
+    data = serializer_data(
+        SalesRowSerializer(SalesRowSerializer.values_queryset(active_sales(sort)))
+    )
+    set_tagged(cache_key, data, versions, timeout)
+    log.info("Записываем список скидок в кеш %s на %s сек", cache_key, timeout)
+    return data
@@ -13,4 +13,4 @@ class ProfileSchema:
 class CategoriesSchema:
     id: int
     title: str
-    image: dict[str, str]
+    image: dict
@@ -0,0 +1,153 @@
+import logging
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    TrigramWordSimilarity,
+)
+from django.db.models import F, OuterRef, QuerySet, Subquery, TextField, Value
+from django.db.models.functions import Coalesce, Concat
+
+log = logging.getLogger(__name__)
+
+# конфигурация полнотекстового поиска PostgreSQL
+SEARCH_CONFIG = "russian"
+
+# количество подсказок к поисковому запросу
+SUGGESTIONS_LIMIT = 5
+
+
+def build_search_vector(product_model) -> SearchVector:
+    """
+    Выражение поискового вектора товара
+    (наименование, описания, тэги и характеристики с разным весом)
+    :param product_model:
+        модель товара (может быть исторической моделью из миграции)
+    :return: SearchVector
+    """
+    tag_model = product_model._meta.get_field("tags").related_model
+    specification_model = product_model._meta.get_field("specifications").related_model
+
+    tags = (
+        tag_model.objects.filter(products=OuterRef("pk"))
+        .order_by()
+        .values("products")
+        .annotate(text=StringAgg("name", " "))
+        .values("text")
+    )
+    specifications = (
+        specification_model.objects.filter(product=OuterRef("pk"))
+        .order_by()
+        .values("product")
+        .annotate(text=StringAgg(Concat("name", Value(" "), "value"), " "))
+        .values("text")
+    )
+
+    return (
+        SearchVector("title", weight="A", config=SEARCH_CONFIG)
+        + SearchVector(
+            Coalesce(Subquery(tags), Value(""), output_field=TextField()),
+            weight="B",
+            config=SEARCH_CONFIG,
+        )
+        + SearchVector("description", weight="B", config=SEARCH_CONFIG)
+        + SearchVector("fullDescription", weight="C", config=SEARCH_CONFIG)
+        + SearchVector(
+            Coalesce(Subquery(specifications), Value(""), output_field=TextField()),
+            weight="D",
+            config=SEARCH_CONFIG,
+        )
+    )
+
+
+def update_search_vector(queryset: QuerySet) -> int:
+    """
+    Пересчет поискового вектора товаров одним запросом UPDATE
+    :param queryset: QuerySet
+        товары для обновления
+    :return: int
+        количество обновленных товаров
+    """
+    updated = queryset.update(search_vector=build_search_vector(queryset.model))
+    log.debug("Обновлен поисковый вектор %s товаров", updated)
+    return updated
+
+
+def fulltext_search(queryset: QuerySet, query: str) -> QuerySet:
+    """
+    Полнотекстовый поиск товаров по индексу GIN с ранжированием (поле rank)
+    :param queryset: QuerySet
+        исходная выборка товаров
+    :param query: str
+        поисковый запрос
+    :return: QuerySet
+    """
+    search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type="websearch")
+    return queryset.filter(search_vector=search_query).annotate(
+        rank=SearchRank(F("search_vector"), search_query)
+    )
+
+
+def trigram_search(queryset: QuerySet, query: str) -> QuerySet:
+    """
+    Поиск товаров по триграммам наименования с ранжированием (поле rank)
+    :param queryset: QuerySet
+        исходная выборка товаров
+    :param query: str
+        поисковый запрос
+    :return: QuerySet
+    """
+    log.info("Полнотекстовый поиск по запросу %r пуст, ищем по триграммам", query)
+    return queryset.filter(title__trigram_word_similar=query).annotate(
+        rank=TrigramWordSimilarity(query, "title")
+    )
+
+
+def search_products(queryset: QuerySet, query: str) -> QuerySet:
+    """
+    Поиск товаров по запросу с ранжированием (поле rank).
+    Сначала выполняется полнотекстовый поиск по индексу GIN,
+    если он ничего не нашел - поиск по триграммам наименования
+    (находит товары при опечатках в запросе)
+    :param queryset: QuerySet
+        исходная выборка товаров
+    :param query: str
+        поисковый запрос
+    :return: QuerySet
+    """
+    found = fulltext_search(queryset, query)
+    if found.exists():
+        return found
+    return trigram_search(queryset, query)
+
+
+async def asearch_products(queryset: QuerySet, query: str) -> QuerySet:
+    """
+    Асинхронный вариант search_products
+    :param queryset: QuerySet
+    :param query: str
+    :return: QuerySet
+    """
+    found = fulltext_search(queryset, query)
+    if await found.aexists():
+        return found
+    return trigram_search(queryset, query)
+
+
+def search_suggestions(queryset: QuerySet, query: str) -> list[str]:
+    """
+    Подсказки к поисковому запросу (наиболее похожие наименования товаров)
+    :param queryset: QuerySet
+        исходная выборка товаров
+    :param query: str
+        поисковый запрос
+    :return: list[str]
+    """
+    return list(
+        queryset.filter(title__trigram_word_similar=query)
+        .annotate(similarity=TrigramWordSimilarity(query, "title"))
+        .order_by("-similarity")
+        .values_list("title", flat=True)[:SUGGESTIONS_LIMIT]
+    )
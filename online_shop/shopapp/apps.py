@@ -5,3 +5,6 @@ class ShopappConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "shopapp"
     verbose_name = "Товары"
+
+    def ready(self):
+        import shopapp.signals  # noqa: F401
@@ -0,0 +1,226 @@
+import json
+import random
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from time import perf_counter
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, Request, build_opener
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from services.benchmark import latency_summary, queries_summary
+
+# шаги сценария покупателя в порядке выполнения
+STEPS = ("categories", "catalog", "product", "basket add", "basket", "order", "payment")
+
+CATALOG_PARAMS = {
+    "filter[name]": "",
+    "filter[minPrice]": 0,
+    "filter[maxPrice]": 1000000,
+    "filter[freeDelivery]": "false",
+    "filter[available]": "true",
+    "currentPage": 1,
+    "sort": "price",
+    "sortType": "inc",
+    "limit": 20,
+}
+
+CARD = {
+    "name": "Lena Lee",
+    "number": "9999999999999999",
+    "year": "23",
+    "month": "11",
+    "code": "123",
+}
+
+
+class ClientTransport(object):
+    """
+    Requests through the Django test client (in-process, with query counts)
+    """
+
+    def __init__(self):
+        host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else "localhost"
+        self.client = Client(HTTP_HOST=host)
+
+    def request(self, method: str, path: str, data: dict | None = None):
+        with CaptureQueriesContext(connection) as queries:
+            start = perf_counter()
+            if method == "GET":
+                response = self.client.get(path, data)
+            else:
+                response = self.client.post(
+                    path, data or {}, content_type="application/json"
+                )
+            elapsed = perf_counter() - start
+        return response.status_code, response.json(), elapsed, len(queries)
+
+
+class HttpTransport(object):
+    """
+    Requests to a running server (with its own session cookie)
+    """
+
+    def __init__(self, base_url: str, timeout: float):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.opener = build_opener(HTTPCookieProcessor(CookieJar()))
+
+    def request(self, method: str, path: str, data: dict | None = None):
+        url = self.base_url + path
+        body = None
+        if method == "GET" and data:
+            url = f"{url}?{urlencode(data)}"
+        elif method == "POST":
+            body = json.dumps(data or {}).encode()
+
+        request = Request(
+            url, data=body, method=method, headers={"Content-Type": "application/json"}
+        )
+        start = perf_counter()
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                status, content = response.status, response.read()
+        except HTTPError as exp:
+            status, content = exp.code, exp.read()
+        except (URLError, TimeoutError):
+            status, content = 0, b""
+        elapsed = perf_counter() - start
+
+        try:
+            payload = json.loads(content)
+        except ValueError:
+            payload = None
+        return status, payload, elapsed, None
+
+
+class Command(BaseCommand):
+    """
+    Replays shopper journeys (categories -> catalog -> product -> basket ->
+    order -> payment) and reports latency percentiles, requests per second
+    and database queries per request for every step.
+    Without --url journeys run in-process and are rolled back;
+    with --url they are sent to a running server (orders are kept)
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--journeys", type=int, default=50, help="Number of shopper journeys"
+        )
+        parser.add_argument(
+            "--url", help="Base URL of a running server (in-process when omitted)"
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=8,
+            help="Concurrent shoppers (with --url only)",
+        )
+        parser.add_argument(
+            "--timeout", type=float, default=30, help="Request timeout (seconds)"
+        )
+        parser.add_argument("--seed", type=int, default=1, help="Random seed")
+
+    @staticmethod
+    def leaf_categories(tree: list[dict]) -> list[int]:
+        leaves = []
+        for node in tree:
+            if node.get("subcategories"):
+                leaves.extend(Command.leaf_categories(node["subcategories"]))
+            else:
+                leaves.append(node["id"])
+        return leaves
+
+    def journey(self, transport, rng: random.Random) -> list[tuple]:
+        """
+        One shopper journey: (step, status code, seconds, queries) of every request
+        """
+        results = []
+
+        def step(name: str, method: str, path: str, data: dict | None = None):
+            status, payload, elapsed, queries = transport.request(method, path, data)
+            results.append((name, status, elapsed, queries))
+            return status, payload
+
+        status, tree = step("categories", "GET", "/api/categories/")
+        categories = self.leaf_categories(tree or []) if status == 200 else []
+        if not categories:
+            return results
+
+        params = dict(CATALOG_PARAMS, category=rng.choice(categories))
+        status, page = step("catalog", "GET", "/api/catalog/", params)
+        items = [item for item in (page or {}).get("items", []) if item["count"]]
+        if status != 200 or not items:
+            return results
+
+        product_id = rng.choice(items)["id"]
+        step("product", "GET", f"/api/product/{product_id}/")
+        status, _ = step(
+            "basket add", "POST", "/api/basket/", {"id": product_id, "count": 1}
+        )
+        if status != 201:
+            return results
+        step("basket", "GET", "/api/basket/")
+
+        status, order = step("order", "POST", "/api/orders/")
+        if status != 201:
+            return results
+        step("payment", "POST", f"/api/payment/{order['orderId']}/", CARD)
+        return results
+
+    def run_in_process(self, journeys: int, rng: random.Random) -> list[tuple]:
+        results = []
+        for _ in range(journeys):
+            with transaction.atomic():
+                results.extend(self.journey(ClientTransport(), rng))
+                transaction.set_rollback(True)
+        return results
+
+    def run_http(self, options, rng: random.Random) -> list[tuple]:
+        base_url = options["url"].rstrip("/")
+        seeds = [rng.random() for _ in range(options["journeys"])]
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+            journeys = executor.map(
+                lambda seed: self.journey(
+                    HttpTransport(base_url, options["timeout"]), random.Random(seed)
+                ),
+                seeds,
+            )
+            return [result for journey in journeys for result in journey]
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        target = options["url"] or "in-process client"
+        self.stdout.write(f"Replay {options['journeys']} shopper journeys: {target}")
+
+        start = perf_counter()
+        if options["url"]:
+            results = self.run_http(options, rng)
+        else:
+            results = self.run_in_process(options["journeys"], rng)
+        elapsed = perf_counter() - start
+
+        for name in STEPS:
+            rows = [row for row in results if row[0] == name]
+            if not rows:
+                continue
+            latencies = [row[2] for row in rows]
+            errors = sum(1 for row in rows if not 200 <= row[1] < 300)
+            queries = [row[3] for row in rows if row[3] is not None]
+            self.stdout.write(
+                f"{name}: {len(rows)} requests, {errors} errors, "
+                f"{latency_summary(latencies)}, {queries_summary(queries)}"
+            )
+
+        self.stdout.write(
+            f"total: {len(results)} requests, "
+            f"{latency_summary([row[2] for row in results])}"
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"Throughput: {len(results) / elapsed:.1f} requests/s")
+        )
@@ -0,0 +1,114 @@
+import tracemalloc
+from time import perf_counter
+
+from django.core.management import BaseCommand
+from django.db import connection
+from django.db.models import Prefetch
+from django.test.utils import CaptureQueriesContext
+
+from basket.serializers import BasketSerializer
+from services.order import DELIVERY_TITLES
+from shopapp.models import Product, Review
+from shopapp.serializers import ProductSerializer, ProductShortSerializer
+
+# прежний набор связанных данных, который загружался для всех представлений
+# (все отзывы товара; в for_detail их не больше REVIEWS_PREVIEW, поэтому
+# вывод товаров с большим числом отзывов отличается)
+FULL_PREFETCH = (
+    "tags",
+    "images",
+    "specifications",
+    Prefetch(
+        "reviews",
+        queryset=Review.objects.select_related("author").order_by("-date", "-id"),
+        to_attr="latest_reviews",
+    ),
+)
+
+
+class Command(BaseCommand):
+    """
+    Compares the purpose-built product querysets (for_short_list, for_detail,
+    for_basket) with the former full prefetch for every endpoint shape:
+    database queries, serialization time and peak Python memory.
+    The serialized output of both variants must be identical
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit", type=int, default=20, help="Products on a list page"
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=5, help="Runs of every variant"
+        )
+
+    @staticmethod
+    def measure(build, serialize) -> tuple[object, int, float, float]:
+        tracemalloc.start()
+        with CaptureQueriesContext(connection) as queries:
+            start = perf_counter()
+            data = serialize(build())
+            elapsed = perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return data, len(queries), elapsed, peak
+
+    def compare(self, name: str, full, trimmed, serialize, repeat: int) -> None:
+        results = dict()
+        for variant, build in (("full", full), ("trimmed", trimmed)):
+            runs = [self.measure(build, serialize) for _ in range(repeat)]
+            results[variant] = runs[0][0]
+            self.stdout.write(
+                f"{name} [{variant}]: {runs[0][1]} queries, "
+                f"{min(run[2] for run in runs) * 1000:.1f} ms, "
+                f"peak {max(run[3] for run in runs) / 1024:.0f} KiB"
+            )
+
+        if results["full"] != results["trimmed"]:
+            self.stdout.write(self.style.ERROR(f"{name}: serialized output differs"))
+
+    def handle(self, *args, **options):
+        limit, repeat = options["limit"], options["repeat"]
+        products = Product.objects.exclude(title__in=DELIVERY_TITLES)
+        ids = list(
+            products.order_by("-reviews_count", "pk").values_list("pk", flat=True)[
+                :limit
+            ]
+        )
+        # корзина без контекста запроса: цена и количество из заглушек
+        basket_context = {
+            "cart": {pk: {"quantity": 1} for pk in ids},
+            "prices": {pk: 0 for pk in ids},
+        }
+
+        self.compare(
+            "catalog",
+            lambda: products.prefetch_related(*FULL_PREFETCH)
+            .select_related("category")
+            .order_by("price", "id")[:limit],
+            lambda: products.for_short_list().order_by("price", "id")[:limit],
+            lambda queryset: ProductShortSerializer(queryset, many=True).data,
+            repeat,
+        )
+        self.compare(
+            "product",
+            lambda: products.prefetch_related(*FULL_PREFETCH)
+            .select_related("category")
+            .filter(pk=ids[0])
+            .first(),
+            lambda: products.for_detail().filter(pk=ids[0]).first(),
+            lambda product: ProductSerializer(product).data,
+            repeat,
+        )
+        self.compare(
+            "basket",
+            lambda: products.prefetch_related(*FULL_PREFETCH)
+            .select_related("category")
+            .filter(pk__in=ids)
+            .order_by("id"),
+            lambda: products.filter(pk__in=ids).for_basket(),
+            lambda queryset: BasketSerializer(
+                queryset, many=True, context=basket_context
+            ).data,
+            repeat,
+        )
@@ -0,0 +1,103 @@
+import json
+from time import perf_counter
+
+from django.core.management import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from api.renderers import FastJSONRenderer
+from services.order import DELIVERY_TITLES
+from shopapp.models import Product, Sales
+from shopapp.serializers import (
+    ProductShortRowSerializer,
+    ProductShortSerializer,
+    SalesRowSerializer,
+    SalesSerializer,
+)
+
+
+class Command(BaseCommand):
+    """
+    Micro-benchmark of list serialization: ModelSerializer + JSONRenderer
+    against .values() row serializers + orjson renderer, per 1,000 products
+    (the rendered JSON of both paths must be identical)
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--products", type=int, default=1000, help="Products per run"
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=5, help="Runs of every variant"
+        )
+
+    @staticmethod
+    def measure(serialize, renderer) -> tuple[bytes, float, float]:
+        start = perf_counter()
+        data = serialize()
+        serialized = perf_counter()
+        content = renderer.render(data)
+        return content, serialized - start, perf_counter() - serialized
+
+    def compare(self, name: str, variants: dict, repeat: int) -> None:
+        contents = []
+        for variant, (serialize, renderer) in variants.items():
+            runs = [self.measure(serialize, renderer) for _ in range(repeat)]
+            contents.append(runs[0][0])
+            self.stdout.write(
+                f"{name} [{variant}]: "
+                f"serialize {min(run[1] for run in runs) * 1000:.1f} ms, "
+                f"render {min(run[2] for run in runs) * 1000:.1f} ms"
+            )
+
+        if any(json.loads(content) != json.loads(contents[0]) for content in contents):
+            self.stdout.write(self.style.ERROR(f"{name}: rendered JSON differs"))
+
+    def handle(self, *args, **options):
+        limit, repeat = options["products"], options["repeat"]
+        products = Product.objects.exclude(title__in=DELIVERY_TITLES).order_by("id")[
+            :limit
+        ]
+        sales = Sales.objects.order_by("id")[:limit]
+        self.stdout.write(
+            f"Serialize {products.count()} products and {sales.count()} sales"
+        )
+
+        self.compare(
+            "products",
+            {
+                "ModelSerializer": (
+                    lambda: ProductShortSerializer(
+                        products.for_short_list(), many=True
+                    ).data,
+                    JSONRenderer(),
+                ),
+                "rows": (
+                    lambda: ProductShortRowSerializer(
+                        ProductShortRowSerializer.values_queryset(products)
+                    ).data,
+                    FastJSONRenderer(),
+                ),
+            },
+            repeat,
+        )
+        self.compare(
+            "sales",
+            {
+                "ModelSerializer": (
+                    lambda: SalesSerializer(
+                        sales.select_related("product").prefetch_related(
+                            "product__images"
+                        ),
+                        many=True,
+                    ).data,
+                    JSONRenderer(),
+                ),
+                "rows": (
+                    lambda: SalesRowSerializer(
+                        SalesRowSerializer.values_queryset(sales)
+                    ).data,
+                    FastJSONRenderer(),
+                ),
+            },
+            repeat,
+        )
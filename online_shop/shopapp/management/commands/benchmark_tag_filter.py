@@ -0,0 +1,94 @@
+from time import perf_counter
+
+from django.core.management import BaseCommand
+from django.db.models import Count
+
+from shopapp.models import Product
+from shopapp.utils import tags_filter
+
+
+class Command(BaseCommand):
+    """
+    Compares catalog tag filters on growing tag sets: the former join
+    with DISTINCT against the EXISTS semi-join ("any" mode), and a join
+    per tag against the grouped subquery ("all" mode).
+    Run on a large catalog (generate_catalog); both variants of a mode
+    must return the same products
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=int,
+            nargs="+",
+            default=[1, 3, 10, 30],
+            help="Numbers of tags in the filter",
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=5, help="Runs of every variant"
+        )
+
+    @staticmethod
+    def measure(build) -> tuple[list[int], float]:
+        start = perf_counter()
+        ids = list(build().order_by("price", "id").values_list("id", flat=True))
+        return ids, perf_counter() - start
+
+    def compare(self, name: str, variants: dict, repeat: int) -> None:
+        results = dict()
+        for variant, build in variants.items():
+            runs = [self.measure(build) for _ in range(repeat)]
+            results[variant] = runs[0][0]
+            self.stdout.write(
+                f"{name} [{variant}]: {len(runs[0][0])} products, "
+                f"{min(run[1] for run in runs) * 1000:.1f} ms"
+            )
+
+        first, *other = results.values()
+        if any(ids != first for ids in other):
+            self.stdout.write(self.style.ERROR(f"{name}: products differ"))
+
+    def handle(self, *args, **options):
+        # самые распространенные тэги: фильтр по ним затрагивает больше товаров
+        popular_tags = list(
+            Product.tags.through.objects.values("tag_id")
+            .annotate(products=Count("product_id"))
+            .order_by("-products", "tag_id")
+            .values_list("tag_id", flat=True)
+        )
+        self.stdout.write(
+            f"{Product.objects.count()} products, {len(popular_tags)} tags in use"
+        )
+
+        for size in options["sizes"]:
+            tags = popular_tags[:size]
+            if len(tags) < size:
+                break
+
+            self.compare(
+                f"any of {size} tags",
+                {
+                    "join + DISTINCT": lambda: Product.objects.filter(
+                        tags__in=tags
+                    ).distinct(),
+                    "EXISTS": lambda: Product.objects.filter(tags_filter(tags, "any")),
+                },
+                options["repeat"],
+            )
+
+            def joins():
+                queryset = Product.objects.all()
+                for tag in tags:
+                    queryset = queryset.filter(tags=tag)
+                return queryset
+
+            self.compare(
+                f"all of {size} tags",
+                {
+                    "join per tag": joins,
+                    "GROUP BY HAVING": lambda: Product.objects.filter(
+                        tags_filter(tags, "all")
+                    ),
+                },
+                options["repeat"],
+            )
@@ -0,0 +1,271 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.core.management import BaseCommand, CommandError, call_command
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from orders.models import Order, OrderInfoBasket, StatusType
+from services.cache import CATEGORIES_TAG, CATEGORY_TAG, SALES_TAG, invalidate_tags
+from services.order import DELIVERY_TITLES
+from services.pricing import refresh_effective_prices
+from shopapp.models import (
+    Category,
+    Product,
+    ProductImage,
+    Review,
+    Sales,
+    Specification,
+)
+
+# префикс slug синтетических товаров (по нему они удаляются)
+GENERATED_SLUG = "synthetic-"
+
+MAX_PRICE = Decimal("999999.99")
+
+
+class Command(BaseCommand):
+    """
+    Generates a synthetic catalog in the shape of the loaded fixture data:
+    products are cloned from fixture products (category, tags, images,
+    specifications) with random prices and stock, plus reviews, sales and orders
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--products", type=int, default=10_000, help="Number of products"
+        )
+        parser.add_argument(
+            "--reviews", type=int, default=3, help="Average reviews per product"
+        )
+        parser.add_argument(
+            "--sales", type=float, default=0.1, help="Share of products on sale"
+        )
+        parser.add_argument("--orders", type=int, default=1000, help="Number of orders")
+        parser.add_argument(
+            "--batch-size", type=int, default=5000, help="Rows per INSERT"
+        )
+        parser.add_argument("--seed", type=int, default=1, help="Random seed")
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Delete previously generated data and exit",
+        )
+
+    @staticmethod
+    def batches(iterable, size: int):
+        iterator = iter(iterable)
+        while batch := list(islice(iterator, size)):
+            yield batch
+
+    def delete_cascade(self, cursor, model, condition: str, params: list) -> int:
+        """
+        Deletes rows matching the SQL condition together with the rows that
+        reference them with on_delete=CASCADE, by set-based DELETE statements
+        (model signals are not sent, caches are refreshed afterwards)
+        """
+        quote = connection.ops.quote_name
+        table = quote(model._meta.db_table)
+        selected = (
+            f"SELECT {quote(model._meta.pk.column)} FROM {table} WHERE {condition}"
+        )
+
+        for field in model._meta.local_many_to_many:
+            through = field.remote_field.through
+            if through._meta.auto_created:
+                cursor.execute(
+                    f"DELETE FROM {quote(through._meta.db_table)} "
+                    f"WHERE {quote(field.m2m_column_name())} IN ({selected})",
+                    params,
+                )
+
+        for relation in model._meta.get_fields(include_hidden=True):
+            if not relation.auto_created or relation.concrete:
+                continue
+            if relation.many_to_many or relation.on_delete is not models.CASCADE:
+                continue
+            self.delete_cascade(
+                cursor,
+                relation.related_model,
+                f"{quote(relation.field.column)} IN ({selected})",
+                params,
+            )
+
+        cursor.execute(f"DELETE FROM {table} WHERE {condition}", params)
+        return cursor.rowcount
+
+    def clear(self) -> None:
+        params = [f"{GENERATED_SLUG}%"]
+        # заказы выбираются до удаления, условие на их строки удаляется каскадом
+        order_ids = list(
+            OrderInfoBasket.objects.filter(product__slug__startswith=GENERATED_SLUG)
+            .values_list("order_id", flat=True)
+            .distinct()
+        )
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            orders = self.delete_cascade(cursor, Order, "id = ANY(%s)", [order_ids])
+            products = self.delete_cascade(cursor, Product, "slug LIKE %s", params)
+
+        self.stdout.write(f"Deleted {products} products and {orders} orders")
+
+    def handle(self, *args, **options):
+        if options["clear"]:
+            self.clear()
+            self.refresh()
+            return
+
+        rng = random.Random(options["seed"])
+        templates = list(
+            Product.objects.exclude(title__in=DELIVERY_TITLES)
+            .exclude(slug__startswith=GENERATED_SLUG)
+            .prefetch_related("tags", "images", "specifications")
+        )
+        users = list(User.objects.values_list("pk", flat=True))
+        texts = list(Review.objects.values_list("text", flat=True)) or ["Отзыв"]
+        if not templates or not users:
+            raise CommandError("Load fixtures/data.json before generating a catalog")
+
+        offset = Product.objects.filter(slug__startswith=GENERATED_SLUG).count()
+        self.stdout.write(
+            f"Generate {options['products']} products from {len(templates)} templates"
+        )
+
+        prices = dict()
+        numbers = range(offset, offset + options["products"])
+        for batch in self.batches(numbers, options["batch_size"]):
+            with transaction.atomic():
+                prices.update(self.create_products(batch, templates, rng, options))
+            self.stdout.write(f"Products: {len(prices)}")
+
+        if prices:
+            self.create_reviews(list(prices), users, texts, rng, options)
+            self.create_orders(prices, users, rng, options)
+
+        call_command("rebuild_ratings", stdout=self.stdout)
+        call_command("rebuild_search", stdout=self.stdout)
+        self.refresh()
+
+        self.stdout.write(self.style.SUCCESS("Synthetic catalog generated"))
+
+    def create_products(self, numbers, templates, rng, options) -> dict[int, Decimal]:
+        now = timezone.now()
+        sources = [rng.choice(templates) for _ in numbers]
+        products = Product.objects.bulk_create(
+            Product(
+                category_id=template.category_id,
+                price=min(
+                    MAX_PRICE,
+                    (template.price * Decimal(rng.uniform(0.7, 1.3))).quantize(
+                        Decimal("0.01")
+                    ),
+                ),
+                count=rng.randint(0, 50),
+                title=f"{template.title} #{number}",
+                description=template.description,
+                fullDescription=template.fullDescription,
+                freeDelivery=template.freeDelivery,
+                slug=f"{GENERATED_SLUG}{number}",
+            )
+            for number, template in zip(numbers, sources)
+        )
+
+        tags, images, specifications, sales = [], [], [], []
+        for product, template in zip(products, sources):
+            tags.extend(
+                Product.tags.through(product_id=product.pk, tag_id=tag.pk)
+                for tag in template.tags.all()
+            )
+            images.extend(
+                ProductImage(product=product, src=image.src.name, alt=image.alt)
+                for image in template.images.all()
+            )
+            specifications.extend(
+                Specification(product=product, name=spec.name, value=spec.value)
+                for spec in template.specifications.all()
+            )
+            if rng.random() < options["sales"]:
+                # часть скидок уже закончилась
+                date_from = now - timedelta(days=rng.randint(0, 30))
+                sales.append(
+                    Sales(
+                        product=product,
+                        salePrice=(product.price * Decimal("0.8")).quantize(
+                            Decimal("0.01")
+                        ),
+                        dateFrom=date_from,
+                        dateTo=date_from + timedelta(days=rng.randint(1, 60)),
+                    )
+                )
+
+        Product.tags.through.objects.bulk_create(tags)
+        ProductImage.objects.bulk_create(images)
+        Specification.objects.bulk_create(specifications)
+        Sales.objects.bulk_create(sales)
+        refresh_effective_prices(
+            Product.objects.filter(pk__in=[product.pk for product in products])
+        )
+        return {product.pk: product.price for product in products}
+
+    def create_reviews(self, product_ids, users, texts, rng, options) -> None:
+        def reviews():
+            for product_id in product_ids:
+                for _ in range(rng.randint(0, options["reviews"] * 2)):
+                    yield Review(
+                        author_id=rng.choice(users),
+                        product_id=product_id,
+                        text=rng.choice(texts),
+                        rate=rng.randint(1, 5),
+                    )
+
+        created = 0
+        for batch in self.batches(reviews(), options["batch_size"]):
+            Review.objects.bulk_create(batch)
+            created += len(batch)
+        self.stdout.write(f"Reviews: {created}")
+
+    def create_orders(self, prices, users, rng, options) -> None:
+        product_ids = list(prices)
+        created = 0
+        for batch in self.batches(range(options["orders"]), options["batch_size"]):
+            with transaction.atomic():
+                baskets = [
+                    rng.sample(product_ids, min(len(product_ids), rng.randint(1, 5)))
+                    for _ in batch
+                ]
+                orders = Order.objects.bulk_create(
+                    Order(
+                        user_id=rng.choice(users),
+                        status=rng.choice(StatusType.values),
+                        total_cost=sum((prices[pk] for pk in basket), Decimal(0))
+                        or Decimal("0.01"),
+                    )
+                    for basket in baskets
+                )
+                OrderInfoBasket.objects.bulk_create(
+                    OrderInfoBasket(
+                        order=order,
+                        product_id=product_id,
+                        count_in_order=1,
+                        price_in_order=prices[product_id] or Decimal("0.01"),
+                    )
+                    for order, basket in zip(orders, baskets)
+                    for product_id in basket
+                )
+            created += len(batch)
+        self.stdout.write(f"Orders: {created}")
+
+    def refresh(self) -> None:
+        # синтетические данные создаются в обход сигналов, поэтому кеш
+        # каталога, категорий, баннеров и скидок сбрасывается явно
+        invalidate_tags(
+            CATEGORIES_TAG,
+            SALES_TAG,
+            *(
+                CATEGORY_TAG.format(pk)
+                for pk in Category.objects.values_list("pk", flat=True)
+            ),
+        )
@@ -0,0 +1,36 @@
+from django.core.management import BaseCommand
+
+from shopapp.models import Category, ProductImage
+from shopapp.tasks import generate_image_variants
+
+
+class Command(BaseCommand):
+    """
+    Builds thumbnails and WebP/AVIF variants for already uploaded product
+    and category images (new uploads are processed by a Celery task)
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Rebuild variants of images that already have them",
+        )
+
+    def handle(self, *args, **options):
+        sources = (
+            ("productimage", ProductImage.objects.exclude(src=""), "variants"),
+            (
+                "category",
+                Category.objects.exclude(image="").exclude(image__isnull=True),
+                "image_variants",
+            ),
+        )
+        for model, queryset, variants_field in sources:
+            if not options["all"]:
+                queryset = queryset.filter(**{variants_field: {}})
+
+            built = 0
+            for pk in queryset.values_list("pk", flat=True).iterator():
+                built += bool(generate_image_variants(model, pk))
+            self.stdout.write(f"{model}: variants built for {built} images")
@@ -0,0 +1,103 @@
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from urllib.error import HTTPError, URLError
+from urllib.request import urlopen
+
+from django.core.management import BaseCommand
+
+from services.benchmark import latency_summary
+
+# эндпоинты каталога, нагружаемые по умолчанию
+DEFAULT_PATHS = (
+    "/api/catalog/?filter%5Bname%5D=&filter%5BminPrice%5D=0"
+    "&filter%5BmaxPrice%5D=500000&filter%5BfreeDelivery%5D=false"
+    "&filter%5Bavailable%5D=false&currentPage=1&category=4&sort=price"
+    "&sortType=inc&limit=20",
+    "/api/product/1/",
+    "/api/banners/",
+    "/api/categories/",
+)
+
+
+class Command(BaseCommand):
+    """
+    Load test of a running server: concurrent GET requests to catalog endpoints,
+    reports throughput and latency percentiles (run against the WSGI and the
+    ASGI serving mode with the same data to compare them)
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url", default="http://127.0.0.1:8000", help="Server base URL"
+        )
+        parser.add_argument(
+            "--paths",
+            nargs="+",
+            default=list(DEFAULT_PATHS),
+            help="Request paths (requests are spread evenly between them)",
+        )
+        parser.add_argument(
+            "--requests", type=int, default=400, help="Total number of requests"
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=16, help="Concurrent clients"
+        )
+        parser.add_argument(
+            "--timeout", type=float, default=30, help="Request timeout (seconds)"
+        )
+
+    @staticmethod
+    def fetch(url: str, timeout: float) -> tuple[str, float, bool]:
+        start = perf_counter()
+        try:
+            with urlopen(url, timeout=timeout) as response:
+                response.read()
+                ok = response.status == 200
+        except (HTTPError, URLError, TimeoutError):
+            ok = False
+        return url, perf_counter() - start, ok
+
+    def report(self, title: str, latencies: list[float], errors: int) -> None:
+        self.stdout.write(
+            f"{title}: {len(latencies)} requests, {errors} errors, "
+            f"{latency_summary(latencies)}"
+        )
+
+    def handle(self, *args, **options):
+        base_url = options["url"].rstrip("/")
+        paths = options["paths"]
+        urls = [
+            base_url + paths[number % len(paths)]
+            for number in range(options["requests"])
+        ]
+
+        # прогрев кешей и соединений с базой данных
+        for path in paths:
+            self.fetch(base_url + path, options["timeout"])
+
+        self.stdout.write(
+            f"Load test of {base_url}: {len(urls)} requests, "
+            f"{options['concurrency']} concurrent clients"
+        )
+        start = perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+            results = list(
+                executor.map(lambda url: self.fetch(url, options["timeout"]), urls)
+            )
+        elapsed = perf_counter() - start
+
+        for path in paths:
+            url = base_url + path
+            self.report(
+                path,
+                [latency for i_url, latency, _ in results if i_url == url],
+                sum(1 for i_url, _, ok in results if i_url == url and not ok),
+            )
+        self.report(
+            "total",
+            [latency for _, latency, _ in results],
+            sum(1 for _, _, ok in results if not ok),
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"Throughput: {len(results) / elapsed:.1f} requests/s")
+        )
@@ -0,0 +1,46 @@
+from django.core.management import BaseCommand
+from django.db.models import (
+    Avg,
+    Count,
+    FloatField,
+    OuterRef,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce
+
+from shopapp.models import Product, Review
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds denormalized product ratings (rating_sum, rating_avg, reviews_count)
+    """
+
+    def handle(self, *args, **options):
+        self.stdout.write("Start rebuild product ratings")
+
+        reviews = (
+            Review.objects.filter(product=OuterRef("pk")).order_by().values("product")
+        )
+        updated = Product.objects.update(
+            rating_sum=Coalesce(
+                Subquery(reviews.annotate(total=Sum("rate")).values("total")),
+                Value(0),
+            ),
+            reviews_count=Coalesce(
+                Subquery(reviews.annotate(total=Count("id")).values("total")),
+                Value(0),
+            ),
+            rating_avg=Coalesce(
+                Subquery(
+                    reviews.annotate(
+                        total=Avg("rate", output_field=FloatField())
+                    ).values("total")
+                ),
+                Value(0.0),
+            ),
+        )
+
+        self.stdout.write(self.style.SUCCESS(f"Ratings rebuilt for {updated} products"))
@@ -0,0 +1,19 @@
+from django.core.management import BaseCommand
+
+from services.search import update_search_vector
+from shopapp.models import Product
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds full-text search vectors of all products
+    """
+
+    def handle(self, *args, **options):
+        self.stdout.write("Start rebuild product search vectors")
+
+        updated = update_search_vector(Product.objects.all())
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Search vectors rebuilt for {updated} products")
+        )
@@ -0,0 +1,63 @@
+# Generated by Django 5.1.15 on 2026-10-18 17:53
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, FloatField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_product_rating(apps, schema_editor):
+    Product = apps.get_model("shopapp", "Product")
+    Review = apps.get_model("shopapp", "Review")
+
+    reviews = Review.objects.filter(product=OuterRef("pk")).order_by().values("product")
+    Product.objects.update(
+        rating_sum=Coalesce(
+            Subquery(reviews.annotate(total=Sum("rate")).values("total")), Value(0)
+        ),
+        reviews_count=Coalesce(
+            Subquery(reviews.annotate(total=Count("id")).values("total")), Value(0)
+        ),
+        rating_avg=Coalesce(
+            Subquery(
+                reviews.annotate(total=Avg("rate", output_field=FloatField())).values(
+                    "total"
+                )
+            ),
+            Value(0.0),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shopapp", "0021_alter_sales_saleprice"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="rating_avg",
+            field=models.FloatField(
+                db_index=True, default=0.0, editable=False, verbose_name="Рейтинг"
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_sum",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Сумма оценок"
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="reviews_count",
+            field=models.PositiveIntegerField(
+                db_index=True,
+                default=0,
+                editable=False,
+                verbose_name="Количество отзывов",
+            ),
+        ),
+        migrations.RunPython(fill_product_rating, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.1.15 on 2026-10-18 18:02
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# поисковый вектор на момент миграции (services.search.build_search_vector):
+# наименование, тэги, описания и характеристики товара с разным весом
+FILL_SEARCH_VECTOR_SQL = """
+UPDATE {product} AS p SET search_vector =
+    setweight(to_tsvector('russian'::regconfig, COALESCE(p.title, '')), 'A')
+    || setweight(to_tsvector('russian'::regconfig, COALESCE((
+        SELECT string_agg(t.name, ' ')
+        FROM {product_tags} AS pt JOIN {tag} AS t ON t.id = pt.tag_id
+        WHERE pt.product_id = p.id
+    ), '')), 'B')
+    || setweight(to_tsvector('russian'::regconfig, COALESCE(p.description, '')), 'B')
+    || setweight(
+        to_tsvector('russian'::regconfig, COALESCE(p."fullDescription", '')), 'C'
+    )
+    || setweight(to_tsvector('russian'::regconfig, COALESCE((
+        SELECT string_agg(s.name || ' ' || s.value, ' ')
+        FROM {specification} AS s
+        WHERE s.product_id = p.id
+    ), '')), 'D')
+"""
+
+
+def fill_search_vector(apps, schema_editor):
+    Product = apps.get_model("shopapp", "Product")
+    Tag = apps.get_model("shopapp", "Tag")
+    Specification = apps.get_model("shopapp", "Specification")
+
+    quote = schema_editor.quote_name
+    schema_editor.execute(
+        FILL_SEARCH_VECTOR_SQL.format(
+            product=quote(Product._meta.db_table),
+            product_tags=quote(Product.tags.through._meta.db_table),
+            tag=quote(Tag._meta.db_table),
+            specification=quote(Specification._meta.db_table),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shopapp", "0022_product_rating"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name="product",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True, verbose_name="Поисковый вектор"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="product_search_index"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["title"],
+                name="product_title_trgm_index",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+        migrations.RunPython(fill_search_vector, migrations.RunPython.noop),
+    ]
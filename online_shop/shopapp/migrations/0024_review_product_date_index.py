@@ -0,0 +1,21 @@
+# Generated by Django 5.1.15 on 2026-10-18 18:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shopapp", "0023_product_search"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="review",
+            index=models.Index(
+                fields=["product", "-date", "-id"], name="review_product_date_index"
+            ),
+        ),
+    ]
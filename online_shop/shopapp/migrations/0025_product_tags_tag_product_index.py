@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Индекс (tag_id, product_id) таблицы связей товаров и тэгов для фильтра
+    каталога по тэгам (промежуточная модель создается Django автоматически,
+    поэтому индекс добавляется SQL-запросом)
+    """
+
+    dependencies = [
+        ("shopapp", "0024_review_product_date_index"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="CREATE INDEX IF NOT EXISTS product_tags_tag_product_index "
+            "ON shopapp_product_tags (tag_id, product_id)",
+            reverse_sql="DROP INDEX IF EXISTS product_tags_tag_product_index",
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.15 on 2026-10-18 18:58
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def fill_effective_price(apps, schema_editor):
+    Product = apps.get_model("shopapp", "Product")
+    Sales = apps.get_model("shopapp", "Sales")
+
+    now = timezone.now()
+    sales = Sales.objects.filter(
+        product=OuterRef("pk"), dateFrom__lte=now, dateTo__gte=now
+    ).values("salePrice")
+    Product.objects.update(effective_price=Coalesce(Subquery(sales), F("price")))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shopapp", "0025_product_tags_tag_product_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="effective_price",
+            field=models.DecimalField(
+                db_index=True,
+                decimal_places=2,
+                default=0,
+                editable=False,
+                max_digits=8,
+                verbose_name="Цена с учетом скидки",
+            ),
+        ),
+        migrations.RunPython(fill_effective_price, migrations.RunPython.noop),
+    ]
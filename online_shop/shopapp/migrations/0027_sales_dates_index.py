@@ -0,0 +1,17 @@
+# Generated by Django 5.1.15 on 2026-10-18 19:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shopapp", "0026_product_effective_price"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="sales",
+            index=models.Index(fields=["dateFrom", "dateTo"], name="sales_dates_index"),
+        ),
+    ]
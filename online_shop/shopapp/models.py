@@ -3,7 +3,8 @@ from decimal import Decimal
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.contrib.postgres.indexes import HashIndex, BrinIndex
+from django.contrib.postgres.indexes import HashIndex, BrinIndex, GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import FileExtensionValidator
 from django.urls import reverse
 
@@ -63,6 +64,10 @@ class Category(models.Model):
             validate_file_size,
         ],
     )
+    # уменьшенные копии изображения (строятся задачей Celery после загрузки)
+    image_variants = models.JSONField(
+        default=dict, blank=True, editable=False, verbose_name="Варианты изображения"
+    )
     subcategories = models.ForeignKey(
         "self",
         on_delete=models.CASCADE,
@@ -106,6 +111,71 @@ class Category(models.Model):
         return reverse("category_detail", kwargs={"slug": self.slug})
 
 
+class ProductQuerySet(models.QuerySet):
+    """
+    Выборки товаров под конкретные сериализаторы: загружаются только
+    выводимые поля и связанные данные
+    """
+
+    # поля товара, которые выводит ProductShortSerializer
+    SHORT_FIELDS = (
+        "id",
+        "category__id",
+        "price",
+        "effective_price",
+        "count",
+        "date",
+        "title",
+        "description",
+        "freeDelivery",
+        "reviews_count",
+        "rating_avg",
+    )
+
+    def for_short_list(self) -> "ProductQuerySet":
+        """
+        Товары для списков (ProductShortSerializer): без полного описания,
+        поискового вектора, характеристик и отзывов
+        """
+        return (
+            self.select_related("category")
+            .only(*self.SHORT_FIELDS)
+            .prefetch_related("tags", "images")
+        )
+
+    # количество последних отзывов, выводимых вместе с товаром
+    # (остальные - постранично через /api/product/<pk>/reviews/)
+    REVIEWS_PREVIEW = 10
+
+    def for_detail(self) -> "ProductQuerySet":
+        """
+        Товар со всеми выводимыми данными (ProductSerializer):
+        последние REVIEWS_PREVIEW отзывов загружаются вместе с авторами
+        """
+        reviews = Review.objects.select_related("author").order_by("-date", "-id")
+        return (
+            self.select_related("category")
+            .only(*self.SHORT_FIELDS, "fullDescription")
+            .prefetch_related(
+                "tags",
+                "images",
+                "specifications",
+                models.Prefetch(
+                    "reviews",
+                    queryset=reviews[: self.REVIEWS_PREVIEW],
+                    to_attr="latest_reviews",
+                ),
+            )
+        )
+
+    def for_basket(self) -> "ProductQuerySet":
+        """
+        Товары корзины (BasketSerializer выводит те же данные, что
+        и ProductSerializer) в порядке id
+        """
+        return self.for_detail().order_by("id")
+
+
 class Product(models.Model):
     category = models.ForeignKey(
         Category,
@@ -141,6 +211,35 @@ class Product(models.Model):
 
     slug = models.SlugField(verbose_name="URL", max_length=255, blank=True, unique=True)
 
+    # денормализованные данные отзывов (обновляются сигналами модели Review)
+    rating_sum = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Сумма оценок"
+    )
+    rating_avg = models.FloatField(
+        default=0.0, editable=False, verbose_name="Рейтинг", db_index=True
+    )
+    reviews_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Количество отзывов", db_index=True
+    )
+
+    # цена с учетом действующей скидки (обновляется сигналами товара и скидок
+    # и периодической задачей на границах периодов скидок)
+    effective_price = models.DecimalField(
+        default=0,
+        max_digits=8,
+        decimal_places=2,
+        editable=False,
+        verbose_name="Цена с учетом скидки",
+        db_index=True,
+    )
+
+    # поисковый вектор (обновляется сигналами товара, тэгов и характеристик)
+    search_vector = SearchVectorField(
+        null=True, editable=False, verbose_name="Поисковый вектор"
+    )
+
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         """
         Сортировка, имена в административной панели, индексы
@@ -152,6 +251,12 @@ class Product(models.Model):
 
         indexes = [
             BrinIndex(fields=["date"], name="product_date_index"),
+            GinIndex(fields=["search_vector"], name="product_search_index"),
+            GinIndex(
+                fields=["title"],
+                name="product_title_trgm_index",
+                opclasses=["gin_trgm_ops"],
+            ),
         ]
 
     def save(self, *args, **kwargs):
@@ -181,6 +286,10 @@ class ProductImage(models.Model):
     )
     src = models.ImageField(upload_to=product_images_directory_path)
     alt = models.CharField(max_length=200, null=False, blank=True)
+    # уменьшенные копии изображения (строятся задачей Celery после загрузки)
+    variants = models.JSONField(
+        default=dict, blank=True, editable=False, verbose_name="Варианты изображения"
+    )
 
     class Meta:
         """
@@ -226,6 +335,10 @@ class Review(models.Model):
 
         indexes = [
             BrinIndex(fields=["date"], name="review_date_index"),
+            # отзывы товара по курсору (от новых к старым)
+            models.Index(
+                fields=["product", "-date", "-id"], name="review_product_date_index"
+            ),
         ]
 
     def __str__(self):
@@ -287,6 +400,10 @@ class Sales(models.Model):
         verbose_name = "Скидка"
         verbose_name_plural = "Скидки"
 
+        indexes = [
+            models.Index(fields=["dateFrom", "dateTo"], name="sales_dates_index"),
+        ]
+
     def __str__(self):
         """
         Возвращение строки
@@ -0,0 +1,236 @@
+import json
+import logging
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from hashlib import md5
+from math import ceil
+
+from django.core.paginator import Paginator
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from services.cache import get_tag_versions, get_tagged, set_tagged
+
+log = logging.getLogger(__name__)
+
+# время хранения количества товаров каталога в кеше (сек)
+COUNT_CACHE_TIMEOUT = 5 * 60
+
+
+def catalog_cache_key(prefix: str, request: Request, exclude: tuple[str, ...]) -> str:
+    """
+    Формирование ключа кеша по параметрам запроса каталога
+    :param prefix: str
+        префикс ключа
+    :param request: Request
+        запрос с параметрами фильтрации
+    :param exclude: tuple[str, ...]
+        параметры, не влияющие на результат
+    :return: str
+    """
+    params = sorted(
+        (name, sorted(values))
+        for name, values in request.GET.lists()
+        if name not in exclude
+    )
+    digest = md5(json.dumps(params, ensure_ascii=False).encode()).hexdigest()
+    return f"{prefix}:{digest}"
+
+
+def cached_count(
+    queryset: QuerySet, cache_key: str, cache_tags: tuple[str, ...] = ()
+) -> int:
+    """
+    Количество записей выборки (значение хранится в кеше и является приближенным)
+    :param queryset: QuerySet
+    :param cache_key: str
+    :param cache_tags: tuple[str, ...]
+        тэги инвалидации значения
+    :return: int
+    """
+    count = get_tagged(cache_key)
+    if count is None:
+        versions = get_tag_versions(cache_tags)
+        count = queryset.count()
+        set_tagged(cache_key, count, versions, COUNT_CACHE_TIMEOUT)
+    return count
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Пагинатор, берущий общее количество записей из кеша
+    """
+
+    def __init__(
+        self,
+        *args,
+        cache_key: str | None = None,
+        cache_tags: tuple[str, ...] = (),
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.cache_key = cache_key
+        self.cache_tags = cache_tags
+
+    @cached_property
+    def count(self) -> int:
+        if self.cache_key is None:
+            return super().count
+        return cached_count(self.object_list, self.cache_key, self.cache_tags)
+
+
+class CustomPagination(PageNumberPagination):
+    page_size = 10
+    max_page_size = 1000
+    page_query_param = "currentPage"
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "items": data,
+                "currentPage": self.page.number,
+                "lastPage": self.page.paginator.num_pages,
+            }
+        )
+
+
+class CatalogPagination(CustomPagination):
+    """
+    Постраничный вывод каталога с кешированием количества товаров
+    """
+
+    def __init__(
+        self, count_cache_key: str | None = None, count_cache_tags: tuple[str, ...] = ()
+    ):
+        self.count_cache_key = count_cache_key
+        self.count_cache_tags = count_cache_tags
+
+    def django_paginator_class(self, queryset, page_size):
+        return CachedCountPaginator(
+            queryset,
+            page_size,
+            cache_key=self.count_cache_key,
+            cache_tags=self.count_cache_tags,
+        )
+
+
+class CatalogCursorPagination(BasePagination):
+    """
+    Курсорная (keyset) пагинация каталога.
+
+    Курсор хранит значение поля сортировки и id последнего товара страницы,
+    следующая страница выбирается условием WHERE по этим значениям без OFFSET.
+    Выборка должна быть отсортирована по полю сортировки и id.
+    """
+
+    cursor_query_param = "cursor"
+    page_query_param = "currentPage"
+    page_size_query_param = "limit"
+    page_size = 20
+    max_page_size = 100
+
+    def __init__(
+        self, count_cache_key: str | None = None, count_cache_tags: tuple[str, ...] = ()
+    ):
+        self.count_cache_key = count_cache_key
+        self.count_cache_tags = count_cache_tags
+
+    @staticmethod
+    def encode_cursor(value, pk: int) -> str:
+        """
+        Кодирование позиции в непрозрачную строку
+        """
+        if hasattr(value, "isoformat"):
+            value = value.isoformat()
+        data = json.dumps({"v": str(value), "id": pk})
+        return urlsafe_b64encode(data.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> dict | None:
+        """
+        Декодирование позиции из строки курсора
+        """
+        if not cursor:
+            return None
+        try:
+            data = json.loads(urlsafe_b64decode(cursor.encode()).decode())
+            return {"v": str(data["v"]), "id": int(data["id"])}
+        except (TypeError, ValueError, KeyError):
+            log.info("Некорректный курсор каталога %s", cursor)
+            raise NotFound("Invalid cursor")
+
+    def get_page_size(self, request: Request) -> int:
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def paginate_queryset(self, queryset: QuerySet, request: Request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = queryset.query.order_by[0]
+        self.field = self.ordering.lstrip("-")
+
+        # общее количество считается до отбора по курсору
+        if self.count_cache_key is None:
+            self.total = queryset.count()
+        else:
+            self.total = cached_count(
+                queryset, self.count_cache_key, self.count_cache_tags
+            )
+
+        position = self.decode_cursor(
+            request.query_params.get(self.cursor_query_param, "")
+        )
+        if position is not None:
+            lookup = "lt" if self.ordering.startswith("-") else "gt"
+            queryset = queryset.filter(
+                Q(**{f"{self.field}__{lookup}": position["v"]})
+                | Q(**{self.field: position["v"], f"id__{lookup}": position["id"]})
+            )
+
+        page = list(queryset[: self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        self.page = page[: self.page_size]
+        return self.page
+
+    def get_next_cursor(self) -> str | None:
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        # страница может состоять из моделей или строк .values()
+        if isinstance(last, dict):
+            return self.encode_cursor(last[self.field], last["id"])
+        return self.encode_cursor(getattr(last, self.field), last.pk)
+
+    def get_current_page(self) -> int:
+        try:
+            return int(self.request.query_params[self.page_query_param])
+        except (KeyError, ValueError):
+            return 1
+
+    def get_last_page(self) -> int:
+        return max(1, ceil(self.total / self.page_size))
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "items": data,
+                "currentPage": self.get_current_page(),
+                "lastPage": self.get_last_page(),
+                "nextCursor": self.get_next_cursor(),
+            }
+        )
+
+
+class ReviewCursorPagination(CatalogCursorPagination):
+    """
+    Курсорная пагинация отзывов товара (от новых к старым)
+    """
+
+    page_size = 10
+    max_page_size = 50
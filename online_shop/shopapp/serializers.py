@@ -1,14 +1,16 @@
 import logging
+from collections import defaultdict
 
 import locale
 
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
 from rest_framework import serializers
-from django.db.models import Avg, Count, Value, FloatField
-from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 from drf_spectacular.utils import extend_schema_field
 from drf_spectacular.types import OpenApiTypes
 
+from services.images import variants_srcset
 from .models import (
     Product,
     ProductImage,
@@ -61,8 +63,8 @@ class ReviewSerializer(serializers.ModelSerializer):
 
     @extend_schema_field(OpenApiTypes.STR)
     def get_email(self, obj):
-        user: User = User.objects.first()
-        return user.email
+        # автор загружается вместе с отзывом (select_related)
+        return obj.author.email
 
     class Meta:
         model = Review
@@ -77,37 +79,38 @@ class ReviewSerializer(serializers.ModelSerializer):
 
 class ProductImageSerializer(serializers.ModelSerializer):
     src = serializers.SerializerMethodField()
+    # уменьшенные копии: размер -> формат -> адрес
+    srcset = serializers.SerializerMethodField()
 
     @extend_schema_field(OpenApiTypes.STR)
     def get_src(self, obj):
         return "".join(["/media/", str(obj.src)])
 
+    @extend_schema_field(OpenApiTypes.OBJECT)
+    def get_srcset(self, obj):
+        return variants_srcset(obj.variants)
+
     class Meta:
         model = ProductImage
         fields = (
             "src",
             "alt",
+            "srcset",
         )
 
 
 class ProductSerializer(serializers.ModelSerializer):
     images = ProductImageSerializer(many=True, read_only=True)
     specifications = SpecificationSerializer(many=True, read_only=True)
-    reviews = ReviewSerializer(many=True, read_only=True)
+    reviews = ReviewSerializer(source="latest_reviews", many=True, read_only=True)
     # вывод списка только значений из пары ключ: значение
     tags = serializers.StringRelatedField(many=True)
     # вывод только id из связанной модели Category
     category = serializers.SlugRelatedField(
         queryset=Category.objects.all(), slug_field="id"
     )
-    # создание дополнительного поля с расчетным средним значением
-    rating = serializers.SerializerMethodField()
-
-    @extend_schema_field(OpenApiTypes.FLOAT)
-    def get_rating(self, obj):
-        return Product.objects.filter(pk=obj.pk).aggregate(
-            rating=Coalesce(Avg("reviews__rate", output_field=FloatField()), Value(0.0))
-        )["rating"]
+    # среднее значение оценок (денормализованное поле товара)
+    rating = serializers.FloatField(source="rating_avg", read_only=True)
 
     class Meta:
         model = Product
@@ -136,22 +139,10 @@ class ProductShortSerializer(serializers.ModelSerializer):
     category = serializers.SlugRelatedField(
         queryset=Category.objects.all(), slug_field="id"
     )
-    # расчет количества отзывов о продукте
-    reviews = serializers.SerializerMethodField()
-    # создание дополнительного поля с расчетным средним значением
-    rating = serializers.SerializerMethodField()
-
-    @extend_schema_field(OpenApiTypes.FLOAT)
-    def get_rating(self, obj):
-        return Product.objects.filter(pk=obj.pk).aggregate(
-            rating=Coalesce(Avg("reviews__rate", output_field=FloatField()), Value(0.0))
-        )["rating"]
-
-    @extend_schema_field(OpenApiTypes.INT)
-    def get_reviews(self, obj):
-        return Product.objects.filter(pk=obj.pk).aggregate(
-            reviews=Count("reviews__id")
-        )["reviews"]
+    # количество отзывов о продукте (денормализованное поле товара)
+    reviews = serializers.IntegerField(source="reviews_count", read_only=True)
+    # среднее значение оценок (денормализованное поле товара)
+    rating = serializers.FloatField(source="rating_avg", read_only=True)
 
     class Meta:
         model = Product
@@ -204,3 +195,138 @@ class SalesSerializer(serializers.ModelSerializer):
             "title",
             "images",
         )
+
+
+def images_by_product(product_ids: list[int]) -> dict[int, list[dict]]:
+    """
+    Изображения товаров в формате ProductImageSerializer одним запросом
+    :param product_ids: list[int]
+    :return: dict[int, list[dict]]
+        изображения каждого товара
+    """
+    images = defaultdict(list)
+    rows = ProductImage.objects.filter(product_id__in=product_ids).values_list(
+        "product_id", "src", "alt", "variants"
+    )
+    for product_id, src, alt, variants in rows:
+        images[product_id].append(
+            {
+                "src": "".join(["/media/", src]),
+                "alt": alt,
+                "srcset": variants_srcset(variants),
+            }
+        )
+    return images
+
+
+class ProductShortRowSerializer(object):
+    """
+    Быстрый вывод списка товаров в формате ProductShortSerializer
+    из строк .values(): без создания моделей и обхода полей сериализатора
+    (только для чтения)
+    """
+
+    FIELDS = (
+        "id",
+        "category_id",
+        "price",
+        # не выводится, нужно для курсора при сортировке по цене
+        "effective_price",
+        "count",
+        "date",
+        "title",
+        "description",
+        "freeDelivery",
+        "reviews_count",
+        "rating_avg",
+    )
+
+    # поля, форматирование которых совпадает с ProductShortSerializer
+    price_field = serializers.DecimalField(max_digits=8, decimal_places=2)
+    date_field = serializers.DateTimeField()
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+
+    @classmethod
+    def values_queryset(cls, queryset: QuerySet) -> QuerySet:
+        """
+        Строки товаров выборки с выводимыми полями
+        """
+        return queryset.prefetch_related(None).values(*cls.FIELDS)
+
+    @cached_property
+    def data(self) -> list[dict]:
+        product_ids = [row["id"] for row in self.rows]
+        images = images_by_product(product_ids)
+        tags = defaultdict(list)
+        tag_rows = (
+            Product.tags.through.objects.filter(product_id__in=product_ids)
+            .order_by("tag__name", "tag_id")
+            .values_list("product_id", "tag_id", "tag__name")
+        )
+        for product_id, tag_id, name in tag_rows:
+            tags[product_id].append({"id": tag_id, "name": name})
+
+        return [
+            {
+                "id": row["id"],
+                "category": row["category_id"],
+                "price": self.price_field.to_representation(row["price"]),
+                "count": row["count"],
+                "date": self.date_field.to_representation(row["date"]),
+                "title": row["title"],
+                "description": row["description"],
+                "freeDelivery": row["freeDelivery"],
+                "images": images[row["id"]],
+                "tags": tags[row["id"]],
+                "reviews": row["reviews_count"],
+                "rating": row["rating_avg"],
+            }
+            for row in self.rows
+        ]
+
+
+class SalesRowSerializer(object):
+    """
+    Быстрый вывод списка скидок в формате SalesSerializer из строк .values()
+    (только для чтения)
+    """
+
+    FIELDS = (
+        "product_id",
+        "product__price",
+        "salePrice",
+        "dateFrom",
+        "dateTo",
+        "product__title",
+    )
+
+    sale_price_field = serializers.DecimalField(max_digits=8, decimal_places=2)
+    date_field = serializers.DateTimeField(format="%m-%d")
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+
+    @classmethod
+    def values_queryset(cls, queryset: QuerySet) -> QuerySet:
+        """
+        Строки скидок выборки с выводимыми полями
+        """
+        return queryset.prefetch_related(None).values(*cls.FIELDS)
+
+    @cached_property
+    def data(self) -> list[dict]:
+        images = images_by_product([row["product_id"] for row in self.rows])
+        return [
+            {
+                "id": row["product_id"],
+                "price": row["product__price"],
+                "salePrice": self.sale_price_field.to_representation(row["salePrice"]),
+                "dateFrom": self.date_field.to_representation(row["dateFrom"]),
+                "dateTo": self.date_field.to_representation(row["dateTo"]),
+                "title": row["product__title"],
+                "images": images[row["product_id"]],
+            }
+            for row in self.rows
+        ]
@@ -0,0 +1,369 @@
+import logging
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from services.banners import BANNERS_REBUILD_DELAY, BANNERS_REBUILD_KEY
+from services.cache import (
+    CATEGORIES_TAG,
+    CATEGORY_TAG,
+    DELIVERY_TAG,
+    PRODUCT_TAG,
+    SALES_TAG,
+    invalidate_tags,
+)
+from services.order import DELIVERY_TITLES, FREE_DELIVERY_THRESHOLD
+from services.pricing import refresh_effective_prices
+from services.search import update_search_vector
+from shopapp.models import (
+    Category,
+    Product,
+    ProductImage,
+    Review,
+    Sales,
+    Specification,
+    Tag,
+)
+from shopapp.tasks import IMAGE_FIELDS, generate_image_variants, rebuild_banners
+
+log = logging.getLogger(__name__)
+
+
+def schedule_banners_rebuild() -> None:
+    """
+    Перестроение списка товаров для баннеров после фиксации транзакции
+    (изменения за BANNERS_REBUILD_DELAY обрабатываются одной задачей)
+    :return: None
+    """
+    if not cache.add(BANNERS_REBUILD_KEY, True, BANNERS_REBUILD_DELAY * 2):
+        return
+    transaction.on_commit(
+        lambda: rebuild_banners.apply_async(countdown=BANNERS_REBUILD_DELAY)
+    )
+
+
+def shift_product_rating(product_id: int, rate_delta: int, count_delta: int) -> None:
+    """
+    Изменение денормализованного рейтинга товара одним запросом UPDATE
+    :param product_id: int
+        id товара
+    :param rate_delta: int
+        изменение суммы оценок
+    :param count_delta: int
+        изменение количества отзывов
+    :return: None
+    """
+    rating_sum = F("rating_sum") + rate_delta
+    reviews_count = F("reviews_count") + count_delta
+
+    Product.objects.filter(pk=product_id).update(
+        rating_sum=rating_sum,
+        reviews_count=reviews_count,
+        rating_avg=Coalesce(
+            Cast(rating_sum, FloatField()) / NullIf(reviews_count, Value(0)),
+            Value(0.0),
+        ),
+    )
+    log.info(
+        "Рейтинг товара с id %s изменен (оценки %+d, отзывы %+d)",
+        product_id,
+        rate_delta,
+        count_delta,
+    )
+
+
+def invalidate_sales_list(product_id: int) -> None:
+    """
+    Инвалидация списка скидок, если у товара есть скидка
+    (список выводит наименование, цену и изображения товара)
+    :param product_id: int
+        id товара
+    :return: None
+    """
+    if Sales.objects.filter(product_id=product_id).exists():
+        invalidate_tags(SALES_TAG)
+
+
+def invalidate_product_cache(product_id: int, category_id: int | None = None) -> None:
+    """
+    Инвалидация закешированных данных товара и его категории
+    :param product_id: int
+        id товара
+    :param category_id: int | None
+        id категории товара (если не передан - берется из базы)
+    :return: None
+    """
+    if category_id is None:
+        category_id = (
+            Product.objects.filter(pk=product_id)
+            .values_list("category_id", flat=True)
+            .first()
+        )
+
+    tags = [PRODUCT_TAG.format(product_id)]
+    if category_id is not None:
+        tags.append(CATEGORY_TAG.format(category_id))
+    invalidate_tags(*tags)
+    schedule_banners_rebuild()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_categories(sender, instance: Category, **kwargs):
+    """
+    Сброс закешированного дерева категорий при изменении или удалении категории
+    """
+    invalidate_tags(CATEGORIES_TAG)
+    schedule_banners_rebuild()
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_category(sender, instance: Product, raw: bool, **kwargs):
+    """
+    Запоминание прежних категории и наименования товара перед его изменением
+    """
+    instance._previous_category_id = None
+    instance._previous_title = None
+    if raw or instance.pk is None:
+        return
+    previous = (
+        Product.objects.filter(pk=instance.pk)
+        .values_list("category_id", "title")
+        .first()
+    )
+    if previous is not None:
+        instance._previous_category_id, instance._previous_title = previous
+
+
+@receiver(post_save, sender=Product)
+def refresh_product_price(sender, instance: Product, **kwargs):
+    """
+    Пересчет цены с учетом скидки при изменении товара
+    (до инвалидации кеша товара)
+    """
+    refresh_effective_prices(Product.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product(sender, instance: Product, **kwargs):
+    """
+    Инвалидация кеша при изменении или удалении товара
+    """
+    invalidate_product_cache(instance.pk, instance.category_id)
+    invalidate_sales_list(instance.pk)
+
+    previous = getattr(instance, "_previous_category_id", None)
+    if previous is not None and previous != instance.category_id:
+        invalidate_tags(CATEGORY_TAG.format(previous))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_delivery(sender, instance: Product, **kwargs):
+    """
+    Сброс конфигурации доставки при изменении товаров доставки
+    (в том числе при переименовании товара доставки)
+    """
+    previous = getattr(instance, "_previous_title", None)
+    if instance.title in DELIVERY_TITLES or previous in DELIVERY_TITLES:
+        invalidate_tags(DELIVERY_TAG)
+
+
+@receiver(post_save, sender=Specification)
+@receiver(post_delete, sender=Specification)
+def invalidate_delivery_threshold(sender, instance: Specification, **kwargs):
+    """
+    Сброс конфигурации доставки при изменении порога бесплатной доставки
+    """
+    if instance.name == FREE_DELIVERY_THRESHOLD:
+        invalidate_tags(DELIVERY_TAG)
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def invalidate_product_tags(
+    sender, instance, action: str, reverse: bool, pk_set: set | None, **kwargs
+):
+    """
+    Инвалидация кеша при изменении тэгов товара
+    """
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            invalidate_product_cache(instance.pk, instance.category_id)
+        return
+
+    # изменение товаров со стороны тэга
+    if action in ("post_add", "post_remove"):
+        products = Product.objects.filter(pk__in=pk_set)
+    elif action == "pre_clear":
+        products = instance.products.all()
+    else:
+        return
+
+    for product_id, category_id in products.values_list("pk", "category_id"):
+        invalidate_product_cache(product_id, category_id)
+
+
+@receiver(post_save, sender=Sales)
+@receiver(post_delete, sender=Sales)
+def invalidate_product_sale(sender, instance: Sales, **kwargs):
+    """
+    Пересчет цены товара с учетом скидки и инвалидация кеша товара
+    и его категории при изменении скидки
+    (скидка влияет на выбор товаров для баннеров)
+    """
+    refresh_effective_prices(Product.objects.filter(pk=instance.product_id))
+    invalidate_product_cache(instance.product_id)
+    invalidate_tags(SALES_TAG)
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=Specification)
+@receiver(post_delete, sender=Specification)
+def invalidate_product_related(sender, instance, **kwargs):
+    """
+    Инвалидация кеша товара и его категории при изменении
+    его изображений или характеристик
+    """
+    invalidate_product_cache(instance.product_id)
+    if sender is ProductImage:
+        invalidate_sales_list(instance.product_id)
+
+
+@receiver(pre_save, sender=ProductImage)
+@receiver(pre_save, sender=Category)
+def remember_image_change(sender, instance, raw: bool, **kwargs):
+    """
+    Отметка о новом изображении: прежние варианты сбрасываются
+    (до построения новых выводится оригинал)
+    """
+    instance._image_changed = False
+    file_field, variants_field = IMAGE_FIELDS[sender._meta.model_name]
+    name = getattr(instance, file_field).name
+    if raw or not name:
+        return
+
+    previous = None
+    if instance.pk is not None:
+        previous = (
+            sender.objects.filter(pk=instance.pk).values_list(file_field, flat=True)
+        ).first()
+    if name != previous:
+        instance._image_changed = True
+        setattr(instance, variants_field, dict())
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=Category)
+def schedule_image_variants(sender, instance, **kwargs):
+    """
+    Построение вариантов нового изображения после фиксации транзакции
+    """
+    if not getattr(instance, "_image_changed", False):
+        return
+    model, pk = sender._meta.model_name, instance.pk
+    transaction.on_commit(lambda: generate_image_variants.delay(model, pk))
+
+
+@receiver(post_save, sender=Product)
+def refresh_product_search(sender, instance: Product, **kwargs):
+    """
+    Пересчет поискового вектора сохраненного товара
+    """
+    update_search_vector(Product.objects.filter(pk=instance.pk))
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def refresh_product_search_tags(
+    sender, instance, action: str, reverse: bool, pk_set: set | None, **kwargs
+):
+    """
+    Пересчет поискового вектора при изменении тэгов товара
+    """
+    if reverse and action == "pre_clear":
+        # после очистки со стороны тэга его товары будут уже неизвестны
+        instance._cleared_product_ids = list(
+            instance.products.values_list("pk", flat=True)
+        )
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if not reverse:
+        product_ids = [instance.pk]
+    elif action == "post_clear":
+        product_ids = getattr(instance, "_cleared_product_ids", [])
+    else:
+        product_ids = pk_set
+    update_search_vector(Product.objects.filter(pk__in=product_ids))
+
+
+@receiver(post_save, sender=Tag)
+def refresh_tag_products_search(sender, instance: Tag, created: bool, **kwargs):
+    """
+    Пересчет поискового вектора товаров переименованного тэга
+    """
+    if not created:
+        update_search_vector(Product.objects.filter(tags=instance))
+
+
+@receiver(post_save, sender=Specification)
+@receiver(post_delete, sender=Specification)
+def refresh_specification_search(sender, instance: Specification, **kwargs):
+    """
+    Пересчет поискового вектора товара при изменении его характеристик
+    """
+    update_search_vector(Product.objects.filter(pk=instance.product_id))
+
+
+@receiver(pre_save, sender=Review)
+def remember_review_rate(sender, instance: Review, raw: bool, **kwargs):
+    """
+    Запоминание прежней оценки отзыва перед его изменением
+    """
+    instance._previous_rate = None
+    if raw or instance.pk is None:
+        return
+    instance._previous_rate = (
+        Review.objects.filter(pk=instance.pk).values("product_id", "rate").first()
+    )
+
+
+@receiver(post_save, sender=Review)
+def add_review_rate(sender, instance: Review, created: bool, raw: bool, **kwargs):
+    """
+    Учет оценки нового или измененного отзыва в рейтинге товара
+    (при загрузке фикстур рейтинг берется из самих фикстур)
+    и инвалидация кеша товара и его категории
+    """
+    invalidate_product_cache(instance.product_id)
+    if raw:
+        return
+
+    previous = getattr(instance, "_previous_rate", None)
+    if created or previous is None:
+        shift_product_rating(instance.product_id, instance.rate, 1)
+    elif previous["product_id"] == instance.product_id:
+        if previous["rate"] != instance.rate:
+            shift_product_rating(
+                instance.product_id, instance.rate - previous["rate"], 0
+            )
+    else:
+        # отзыв перенесен на другой товар: меняется и прежний товар
+        shift_product_rating(previous["product_id"], -previous["rate"], -1)
+        shift_product_rating(instance.product_id, instance.rate, 1)
+        invalidate_product_cache(previous["product_id"])
+
+
+@receiver(post_delete, sender=Review)
+def remove_review_rate(sender, instance: Review, **kwargs):
+    """
+    Исключение оценки удаленного отзыва из рейтинга товара
+    """
+    shift_product_rating(instance.product_id, -instance.rate, -1)
+    invalidate_product_cache(instance.product_id)
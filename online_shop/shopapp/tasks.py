@@ -0,0 +1,102 @@
+import logging
+
+from celery import shared_task
+from django.apps import apps
+from django.core.cache import cache
+from PIL import UnidentifiedImageError
+
+from services.banners import BANNERS_REBUILD_KEY, build_banners
+from services.cache import (
+    CATEGORIES_TAG,
+    CATEGORY_TAG,
+    PRODUCT_TAG,
+    SALES_TAG,
+    invalidate_tags,
+)
+from services.images import generate_variants
+from services.popular import refresh_popular
+from services.pricing import refresh_effective_prices
+from shopapp.models import Product
+
+log = logging.getLogger(__name__)
+
+# модели с изображениями: поле файла и поле его вариантов
+IMAGE_FIELDS = {
+    "productimage": ("src", "variants"),
+    "category": ("image", "image_variants"),
+}
+
+
+@shared_task
+def refresh_popular_products() -> int | None:
+    """
+    Периодическая задача перестроения рейтинга популярных товаров
+    """
+    return refresh_popular()
+
+
+@shared_task
+def rebuild_banners() -> int:
+    """
+    Перестроение списка товаров для баннеров после изменения товаров
+    """
+    # изменения во время перестроения запланируют следующее
+    cache.delete(BANNERS_REBUILD_KEY)
+    return len(build_banners())
+
+
+@shared_task
+def refresh_sale_prices() -> int:
+    """
+    Периодическая задача пересчета цен товаров со скидками: цены меняются
+    при наступлении и окончании периода скидки
+    """
+    changed = refresh_effective_prices(Product.objects.filter(sales__isnull=False))
+    if changed:
+        invalidate_tags(
+            *{PRODUCT_TAG.format(pk) for pk, _ in changed},
+            *{CATEGORY_TAG.format(category_id) for _, category_id in changed},
+        )
+        # задача уже выполняется в воркере: баннеры перестраиваются сразу
+        rebuild_banners()
+    return len(changed)
+
+
+@shared_task
+def generate_image_variants(model: str, pk: int) -> int:
+    """
+    Построение уменьшенных копий загруженного изображения товара
+    или категории и сброс кеша, в котором выводится изображение
+    :param model: str
+        имя модели (IMAGE_FIELDS)
+    :param pk: int
+        id записи
+    :return: int
+        количество построенных размеров
+    """
+    model_class = apps.get_model("shopapp", model)
+    file_field, variants_field = IMAGE_FIELDS[model]
+    instance = model_class.objects.filter(pk=pk).first()
+    name = getattr(instance, file_field).name if instance is not None else None
+    if not name:
+        return 0
+
+    try:
+        variants = generate_variants(name)
+    except (FileNotFoundError, UnidentifiedImageError) as exp:
+        log.warning("Не удалось построить варианты изображения %s: %s", name, exp)
+        return 0
+
+    # изображение могло смениться, пока строились варианты
+    model_class.objects.filter(pk=pk, **{file_field: name}).update(
+        **{variants_field: variants}
+    )
+    if model == "category":
+        invalidate_tags(CATEGORIES_TAG)
+    else:
+        invalidate_tags(
+            PRODUCT_TAG.format(instance.product_id),
+            CATEGORY_TAG.format(instance.product.category_id),
+            SALES_TAG,
+        )
+    return len(variants)
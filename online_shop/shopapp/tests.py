@@ -1,10 +1,41 @@
 import json
-from django.test import TestCase
+from datetime import timedelta
+from io import BytesIO
+from tempfile import TemporaryDirectory
+
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from asgiref.sync import async_to_sync
+from django.test import RequestFactory, TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from django.db.models import Count
 from django.contrib.auth.models import User
+from django_redis import get_redis_connection
+from PIL import Image
 
-from .models import Product
+from services.banners import banners_cache_key
+from services.cache import (
+    CATEGORIES_TAG,
+    CATEGORY_TAG,
+    PRODUCT_TAG,
+    SALES_TAG,
+    get_tag_versions,
+    invalidate_tags,
+)
+from services.images import VARIANT_SIZES
+from services.order import DELIVERY_TITLES
+from services.popular import POPULAR_KEY, POPULAR_LOCK, ranking, refresh_popular
+from .models import Category, Product, ProductImage, ProductQuerySet, Review, Sales
+from .tasks import generate_image_variants, refresh_sale_prices
+from . import views
+from .serializers import (
+    ProductShortRowSerializer,
+    ProductShortSerializer,
+    SalesRowSerializer,
+    SalesSerializer,
+)
 
 
 class ProductTestCase(TestCase):
@@ -30,17 +61,238 @@ class ProductTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(received_data[0]["title"], "Компьютеры и ноутбуки")
 
-    def test_get_sales(self):
+    def test_get_product_conditional(self):
+        """
+        Тестирование кеширования карточки товара и ответа 304 по ETag
+        """
+        url = reverse("api:product_details", args=("4",))
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Last-Modified", response)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+        product = Product.objects.get(pk=4)
+        product.description = "Новое описание"
+        product.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.json()["description"], "Новое описание")
+
+    def test_get_catalog_facets(self):
+        """
+        Тестирование фасетов фильтров каталога и их сброса при изменении товара
+        """
+        invalidate_tags(CATEGORY_TAG.format(4))
+        url = reverse("api:catalog_facets")
+        data = {"category": 4, "filter[maxPrice]": 100000}
+
+        with self.assertNumQueries(3):
+            received_data = self.client.get(url, data).json()
+        self.assertEqual(received_data["count"], 1)
+        # диапазон цен считается без фильтра по цене
+        self.assertEqual(received_data["price"], {"min": 19990.0, "max": 139990.0})
+        self.assertEqual(
+            sum(bucket["count"] for bucket in received_data["histogram"]), 2
+        )
+        self.assertEqual(received_data["available"], 0)
+
+        with self.assertNumQueries(0):
+            self.client.get(url, data)
+
+        product = Product.objects.get(category_id=4, price=19990)
+        product.count = 5
+        product.save()
+
+        received_data = self.client.get(url, data).json()
+        self.assertEqual(received_data["available"], 1)
+
+    def test_get_catalog_facets_single_price(self):
         """
-        Тестирование выгрузки скидок
+        Тестирование фасетов категории с одним товаром (одна цена):
+        гистограмма из одного интервала строится без запроса к базе данных
         """
+        invalidate_tags(CATEGORY_TAG.format(10))
+        product = Product.objects.get(category_id=10)
+
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("api:catalog_facets"), {"category": 10})
+        received_data = response.json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            received_data["histogram"],
+            [
+                {
+                    "min": float(product.effective_price),
+                    "max": float(product.effective_price),
+                    "count": 1,
+                }
+            ],
+        )
+
+    def test_get_catalog_tags_modes(self):
+        """
+        Тестирование фильтра каталога по нескольким тэгам (любой/все):
+        товар выводится один раз с неискаженными рейтингом и числом отзывов
+        """
+        invalidate_tags(CATEGORY_TAG.format(9))
         data = {
             "currentPage": 1,
+            "filter[name]": "",
+            "filter[minPrice]": 0,
+            "filter[maxPrice]": 500000,
+            "filter[freeDelivery]": "false",
+            "filter[available]": "false",
+            "category": 9,
+            "sort": "price",
+            "sortType": "dec",
+            "limit": 20,
+            "tags[]": [10, 11, 15],
         }
-        response = self.client.get(reverse("api:sales"), data)
+
+        received_data = self.client.get(reverse("api:catalog"), data).json()
+        items = {item["id"]: item for item in received_data["items"]}
+        self.assertEqual(len(received_data["items"]), 2)
+        self.assertEqual((items[1]["rating"], items[1]["reviews"]), (4.5, 2))
+        self.assertEqual((items[2]["rating"], items[2]["reviews"]), (5.0, 1))
+
+        data["tagsMode"] = "all"
+        received_data = self.client.get(reverse("api:catalog"), data).json()
+        self.assertEqual([item["id"] for item in received_data["items"]], [1])
+
+        data["tags[]"] = [11, 15]
+        received_data = self.client.get(reverse("api:catalog"), data).json()
+        self.assertEqual([item["id"] for item in received_data["items"]], [1, 2])
+
+    def test_effective_price_sale_window(self):
+        """
+        Тестирование цены со скидкой: фильтр каталога по цене учитывает
+        скидку, по окончании скидки цена восстанавливается задачей
+        """
+        invalidate_tags(CATEGORY_TAG.format(4))
+        now = timezone.now()
+        Sales.objects.create(
+            product_id=4,
+            salePrice=1000,
+            dateFrom=now - timedelta(days=1),
+            dateTo=now + timedelta(days=1),
+        )
+        self.assertEqual(Product.objects.get(pk=4).effective_price, 1000)
+
+        data = {
+            "currentPage": 1,
+            "filter[name]": "",
+            "filter[minPrice]": 0,
+            "filter[maxPrice]": 5000,
+            "filter[freeDelivery]": "false",
+            "filter[available]": "false",
+            "category": 4,
+            "sort": "price",
+            "sortType": "dec",
+            "limit": 20,
+        }
+        received_data = self.client.get(reverse("api:catalog"), data).json()
+        self.assertEqual([item["id"] for item in received_data["items"]], [4])
+
+        # окончание скидки (без сигналов) обрабатывается периодической задачей
+        Sales.objects.filter(product_id=4).update(dateTo=now - timedelta(minutes=1))
+        self.assertEqual(refresh_sale_prices(), 1)
+        self.assertEqual(Product.objects.get(pk=4).effective_price, 19990)
+
+        received_data = self.client.get(reverse("api:catalog"), data).json()
+        self.assertEqual(received_data["items"], [])
+
+    def test_product_image_variants(self):
+        """
+        Тестирование построения уменьшенных копий загруженного изображения
+        и вывода их адресов в карточке товара
+        """
+        buffer = BytesIO()
+        Image.new("RGB", (1200, 800), "white").save(buffer, "PNG")
+
+        with TemporaryDirectory() as media_root, override_settings(
+            MEDIA_ROOT=media_root
+        ):
+            with self.captureOnCommitCallbacks() as callbacks:
+                image = ProductImage.objects.create(
+                    product_id=4,
+                    src=SimpleUploadedFile("photo.png", buffer.getvalue()),
+                    alt="photo",
+                )
+            self.assertEqual(len(callbacks), 1)
+
+            self.assertEqual(generate_image_variants("productimage", image.pk), 2)
+            image.refresh_from_db()
+            with default_storage.open(image.variants["thumb"]["webp"]) as file:
+                self.assertEqual(max(Image.open(file).size), VARIANT_SIZES["thumb"])
+
+            response = self.client.get(reverse("api:product_details", args=("4",)))
+            srcset = [
+                item["srcset"]
+                for item in response.json()["images"]
+                if item["alt"] == "photo"
+            ][0]
+            self.assertEqual(
+                srcset["thumb"]["webp"], "/media/products/product_4/photo.thumb.webp"
+            )
+
+    def test_get_categories_cache(self):
+        """
+        Тестирование кеширования дерева категорий и его сброса при изменении
+        """
+        self.client.get(reverse("api:categories"))
+        with self.assertNumQueries(0):
+            self.client.get(reverse("api:categories"))
+
+        category = Category.objects.get(title="Ноутбуки")
+        category.title = "Ноутбуки и ультрабуки"
+        category.save()
+
+        response = self.client.get(reverse("api:categories"))
+        received_data = json.loads(response.content)
+        subcategories = [
+            subcategory["title"] for subcategory in received_data[0]["subcategories"]
+        ]
+        self.assertIn("Ноутбуки и ультрабуки", subcategories)
+
+    def test_get_sales(self):
+        """
+        Тестирование выгрузки действующих скидок (скидки фикстуры закончились)
+        """
+        invalidate_tags(SALES_TAG)
+        now = timezone.now()
+        for product_id, sale_price in ((4, 17990), (6, 31102)):
+            Sales.objects.create(
+                product_id=product_id,
+                salePrice=sale_price,
+                dateFrom=now - timedelta(days=1),
+                dateTo=now + timedelta(days=1),
+            )
+
+        response = self.client.get(reverse("api:sales"), {"currentPage": 1})
         received_data = json.loads(response.content)
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(len(received_data["items"]), 2)
+        self.assertEqual([item["id"] for item in received_data["items"]], [4, 6])
+
+        # список закеширован целиком, страницы выдаются без запросов
+        with self.assertNumQueries(0):
+            self.client.get(reverse("api:sales"), {"currentPage": 1})
+
+        response = self.client.get(
+            reverse("api:sales"), {"currentPage": 1, "sort": "discount"}
+        )
+        self.assertEqual([item["id"] for item in response.json()["items"]], [6, 4])
+
+        Sales.objects.filter(product_id=6).delete()
+        response = self.client.get(reverse("api:sales"), {"currentPage": 1})
+        self.assertEqual([item["id"] for item in response.json()["items"]], [4])
 
     def test_get_banners(self):
         """
@@ -51,6 +303,151 @@ class ProductTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(received_data), 6)
 
+    def test_get_banners_queries(self):
+        """
+        Тестирование выбора товаров для баннеров одним запросом
+        и сброса кеша баннеров при изменении товара подкатегории
+        """
+        cache.delete(banners_cache_key())
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse("api:banners"))
+        with self.assertNumQueries(0):
+            self.client.get(reverse("api:banners"))
+
+        product = Product.objects.get(pk=response.json()[0]["id"])
+        product.price = 1
+        product.save()
+        received_data = self.client.get(reverse("api:banners")).json()
+
+        self.assertEqual(received_data[0]["price"], "1.00")
+
+    @override_settings(BANNERS_STRATEGY="rating")
+    def test_get_banners_rating(self):
+        """
+        Тестирование выбора товаров для баннеров с максимальным рейтингом
+        """
+        cache.delete(banners_cache_key())
+        received_data = self.client.get(reverse("api:banners")).json()
+        best = (
+            Product.objects.filter(category_id=received_data[0]["category"])
+            .order_by("-rating_avg", "-reviews_count", "pk")
+            .first()
+        )
+
+        self.assertEqual(received_data[0]["id"], best.pk)
+
+    def test_async_views(self):
+        """
+        Тестирование совпадения ответов асинхронных представлений (режим ASGI)
+        с ответами синхронных представлений (режим WSGI), оба строятся без кеша
+        """
+        factory = RequestFactory()
+        tags = (
+            CATEGORIES_TAG,
+            PRODUCT_TAG.format(4),
+            *(
+                CATEGORY_TAG.format(pk)
+                for pk in Category.objects.values_list("pk", flat=True)
+            ),
+        )
+        catalog = {
+            "currentPage": 1,
+            "filter[minPrice]": 0,
+            "filter[maxPrice]": 500000,
+            "category": 11,
+            "sort": "price",
+            "sortType": "dec",
+            "limit": 20,
+            "facets": "true",
+        }
+        cases = (
+            ("CategoriesApiView", "/api/categories/", {}, {}),
+            ("BannersListApiView", "/api/banners/", {}, {}),
+            ("ProductApiView", "/api/product/4/", {}, {"pk": 4}),
+            ("CatalogApiView", "/api/catalog/", catalog, {}),
+            ("CatalogFacetsApiView", "/api/catalog/facets/", catalog, {}),
+            (
+                "CatalogFacetsApiView",
+                "/api/catalog/facets/",
+                {**catalog, "filter[name]": "Galaxi"},
+                {},
+            ),
+        )
+        for name, path, params, kwargs in cases:
+            with self.subTest(name):
+                view = getattr(views, name).as_view()
+                async_view = getattr(views, f"Async{name}").as_view()
+
+                invalidate_tags(*tags)
+                response = view(factory.get(path, params), **kwargs).render()
+                invalidate_tags(*tags)
+                async_response = async_to_sync(async_view)(
+                    factory.get(path, params), **kwargs
+                ).render()
+
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(async_response.content, response.content)
+
+    def test_row_serializers(self):
+        """
+        Тестирование совпадения быстрых сериализаторов списков с ModelSerializer
+        """
+        products = Product.objects.order_by("id")
+        sales = Sales.objects.order_by("id")
+
+        self.assertEqual(
+            ProductShortRowSerializer(
+                ProductShortRowSerializer.values_queryset(products)
+            ).data,
+            ProductShortSerializer(products, many=True).data,
+        )
+        self.assertEqual(
+            SalesRowSerializer(SalesRowSerializer.values_queryset(sales)).data,
+            SalesSerializer(sales, many=True).data,
+        )
+
+    def test_get_popular(self):
+        """
+        Тестирование списка популярных товаров из рейтинга в Redis
+        """
+        redis = get_redis_connection("default")
+        redis.delete(POPULAR_KEY)
+        self.addCleanup(redis.delete, POPULAR_KEY)
+
+        self.assertEqual(refresh_popular(), len(ranking()))
+        response = self.client.get(reverse("api:popular"))
+        received_data = json.loads(response.content)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item["id"] for item in received_data],
+            [pk for pk, _ in ranking()][:8],
+        )
+
+    def test_get_popular_refresh_locked(self):
+        """
+        Тестирование списка популярных товаров, пока рейтинг перестраивается
+        """
+        redis = get_redis_connection("default")
+        redis.delete(POPULAR_KEY)
+        lock = redis.lock(POPULAR_LOCK, timeout=60)
+        lock.acquire()
+        self.addCleanup(lock.release)
+
+        self.assertIsNone(refresh_popular())
+        response = self.client.get(reverse("api:popular"))
+        received_data = json.loads(response.content)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item["id"] for item in received_data],
+            list(
+                Product.objects.exclude(title__in=DELIVERY_TITLES)
+                .order_by("-rating_avg", "pk")
+                .values_list("pk", flat=True)[:8]
+            ),
+        )
+
 
 class ProductSortedTestCase(TestCase):
     fixtures = ["data.json"]
@@ -352,6 +749,147 @@ class ProductSortedTestCase(TestCase):
         self.assertEqual(len(received_data["items"]), 1)
         self.assertIn("AMOLED", received_data["items"][0]["tags"][0]["name"])
 
+    def test_get_catalog_cursor(self):
+        """
+        Тестирование курсорной пагинации каталога (сортировка по убыванию цены)
+        """
+        data = {
+            "currentPage": 1,
+            "filter[name]": "",
+            "filter[minPrice]": 0,
+            "filter[maxPrice]": 500000,
+            "filter[freeDelivery]": "false",
+            "filter[available]": "false",
+            "category": 4,
+            "sort": "price",
+            "sortType": "inc",
+            "limit": 1,
+            "cursor": "",
+        }
+
+        response = self.client.get(reverse("api:catalog"), data)
+        first_page = json.loads(response.content)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(first_page["items"]), 1)
+        self.assertEqual(first_page["items"][0]["price"], "139990.00")
+        self.assertEqual(first_page["lastPage"], 2)
+        self.assertIsNotNone(first_page["nextCursor"])
+
+        data["currentPage"] = 2
+        data["cursor"] = first_page["nextCursor"]
+        response = self.client.get(reverse("api:catalog"), data)
+        second_page = json.loads(response.content)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(second_page["currentPage"], 2)
+        self.assertEqual(second_page["items"][0]["price"], "19990.00")
+        self.assertIsNone(second_page["nextCursor"])
+
+    def test_get_catalog_invalid_cursor(self):
+        """
+        Тестирование курсорной пагинации каталога с некорректным курсором
+        """
+        data = {
+            "filter[name]": "",
+            "filter[minPrice]": 0,
+            "filter[maxPrice]": 500000,
+            "filter[freeDelivery]": "false",
+            "filter[available]": "false",
+            "category": 4,
+            "sort": "date",
+            "sortType": "inc",
+            "limit": 20,
+            "cursor": "not-a-cursor",
+        }
+
+        response = self.client.get(reverse("api:catalog"), data)
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_get_catalog_cache_invalidation(self):
+        """
+        Тестирование сброса закешированной страницы каталога при изменении товара
+        """
+        data = {
+            "currentPage": 1,
+            "filter[name]": "",
+            "filter[minPrice]": 0,
+            "filter[maxPrice]": 500000,
+            "filter[freeDelivery]": "false",
+            "filter[available]": "false",
+            "category": 4,
+            "sort": "price",
+            "sortType": "inc",
+            "limit": 20,
+        }
+
+        response = self.client.get(reverse("api:catalog"), data)
+        self.assertEqual(response.status_code, 200)
+
+        product = Product.objects.get(pk=response.data["items"][0]["id"])
+        product.price = 99
+        product.save()
+
+        response = self.client.get(reverse("api:catalog"), data)
+        prices = {item["id"]: item["price"] for item in response.data["items"]}
+        self.assertEqual(prices[product.pk], "99.00")
+
+
+class ProductSearchTestCase(TestCase):
+    fixtures = ["data.json"]
+
+    def test_search_full_text(self):
+        """
+        Тестирование полнотекстового поиска (словоформы, характеристики товара)
+        """
+        response = self.client.get(reverse("api:search"), {"query": "ноутбуки"})
+        items = json.loads(response.content)["items"]
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({item["id"] for item in items}, {6, 7})
+
+        response = self.client.get(reverse("api:search"), {"query": "DDR3"})
+        items = json.loads(response.content)["items"]
+
+        self.assertEqual([item["id"] for item in items], [8])
+
+    def test_search_catalog_blank_name(self):
+        """
+        Тестирование каталога и фасетов с пустым наименованием в фильтре
+        (значение по умолчанию " " не ограничивает выборку)
+        """
+        invalidate_tags(CATEGORY_TAG.format(11))
+        data = {
+            "currentPage": 1,
+            "filter[name]": " ",
+            "filter[minPrice]": 0,
+            "filter[maxPrice]": 500000,
+            "category": 11,
+            "sort": "price",
+            "sortType": "dec",
+            "limit": 20,
+        }
+
+        catalog = self.client.get(reverse("api:catalog"), data).json()
+        facets = self.client.get(reverse("api:catalog_facets"), data).json()
+
+        self.assertEqual(len(catalog["items"]), 3)
+        self.assertEqual(facets["count"], 3)
+
+    def test_search_typo(self):
+        """
+        Тестирование поиска по триграммам при опечатке в запросе
+        """
+        response = self.client.get(reverse("api:search"), {"query": "Galaxi"})
+        data = json.loads(response.content)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item["id"] for item in data["items"]], [3])
+        self.assertEqual(
+            data["suggestions"], ["Samsung Galaxy S24 Ultra EU 12/1 ТБ, фиолетовый"]
+        )
+
 
 class ProductReviewCase(TestCase):
     fixtures = ["data.json"]
@@ -412,3 +950,84 @@ class ProductReviewCase(TestCase):
             count_product_after["reviews__id__count"]
             > count_product_before["reviews__id__count"]
         )
+
+    def test_reviews_update_product_rating(self):
+        """
+        Тестирование пересчета рейтинга товара при создании, изменении и удалении отзыва
+        """
+        self.client.force_login(self.user)
+        data = {
+            "text": "Отличный телефон с прекрасными характеристиками",
+            "rate": 4,
+        }
+        self.client.post(reverse("api:product_reviews", args=("3",)), data)
+
+        product = Product.objects.get(pk=3)
+        self.assertEqual(product.reviews_count, 2)
+        self.assertEqual(product.rating_sum, 7)
+        self.assertEqual(product.rating_avg, 3.5)
+
+        review = Review.objects.get(product=product, author=self.user)
+        review.rate = 5
+        review.save()
+        product.refresh_from_db()
+        self.assertEqual(product.rating_avg, 4.0)
+
+        Review.objects.filter(product=product).delete()
+        product.refresh_from_db()
+        self.assertEqual(product.reviews_count, 0)
+        self.assertEqual(product.rating_avg, 0.0)
+
+    def test_reviews_moved_product_cache(self):
+        """
+        Тестирование инвалидации кеша обоих товаров при переносе отзыва
+        """
+        review = Review.objects.filter(product_id=3).first()
+        tags = (PRODUCT_TAG.format(3), PRODUCT_TAG.format(4))
+        versions = get_tag_versions(tags)
+
+        review.product_id = 4
+        review.save()
+
+        changed = get_tag_versions(tags)
+        for tag in tags:
+            self.assertNotEqual(changed[tag], versions[tag])
+
+    def test_reviews_list_cursor(self):
+        """
+        Тестирование постраничного вывода отзывов о товаре по курсору
+        """
+        Review.objects.bulk_create(
+            Review(author=self.user, product_id=4, text=f"Отзыв {number}", rate=5)
+            for number in range(15)
+        )
+        url = reverse("api:product_reviews", args=("4",))
+        total = Review.objects.filter(product_id=4).count()
+
+        first_page = self.client.get(url, {"limit": 10}).json()
+        second_page = self.client.get(
+            url, {"limit": 10, "cursor": first_page["nextCursor"]}
+        ).json()
+
+        self.assertEqual(len(first_page["items"]), 10)
+        self.assertEqual(len(second_page["items"]), total - 10)
+        self.assertIsNone(second_page["nextCursor"])
+        self.assertEqual(first_page["items"][0]["email"], "alex@shop.com")
+
+    def test_product_reviews_preview(self):
+        """
+        Тестирование ограничения количества отзывов в карточке товара
+        """
+        Review.objects.bulk_create(
+            Review(author=self.user, product_id=4, text=f"Отзыв {number}", rate=5)
+            for number in range(30)
+        )
+        # bulk_create не отправляет сигналы, карточка в кеше не сбрасывается
+        cache.delete("product_detail:4")
+
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse("api:product_details", args=("4",)))
+
+        self.assertEqual(
+            len(response.json()["reviews"]), ProductQuerySet.REVIEWS_PREVIEW
+        )
@@ -1,12 +1,23 @@
-from django.db.models import Avg, Count, Q, Value, FloatField
-from django.db.models.functions import Coalesce
+from django.db.models import Count, Exists, OuterRef, Q
 from django.shortcuts import get_object_or_404
 
+from services.search import search_products
 from shopapp.models import (
     Product,
     Category,
 )
 
+# режимы фильтра по тэгам: товар с любым из тэгов или со всеми тэгами
+TAGS_MODES = ("any", "all")
+
+# соответствие вида сортировки полю таблицы товаров
+SORT_FIELDS = {
+    # цена с учетом действующей скидки
+    "price": "effective_price",
+    "rating": "rating_avg",
+    "reviews": "reviews_count",
+}
+
 
 def get_order_field(sort: str, sort_type: str) -> str:
     """
@@ -19,73 +30,156 @@ def get_order_field(sort: str, sort_type: str) -> str:
         сформированный аргумент сортировки
     """
 
-    res = "count_reviews" if sort == "reviews" else sort
+    res = SORT_FIELDS.get(sort, sort)
     res = "-" + res if sort_type == "inc" else res
 
     return res
 
 
-def sorted_products(request):
-    min_price = request.GET.get("filter[minPrice]")
-    max_price = request.GET.get("filter[maxPrice]")
-    free_delivery = (
-        True
-        if request.GET.get("filter[freeDelivery]").capitalize() == "True"
-        else False
-    )
-    available = (
-        True if request.GET.get("filter[available]").capitalize() == "True" else False
-    )
-    sort = request.GET.get("sort")
-    sort_type = request.GET.get("sortType")
-    tags = request.GET.getlist("tags[]")
-    name_product = request.GET.get("filter[name]")
-
+def get_category_id(request) -> int:
+    """
+    Номер категории каталога из запроса
+    (если категория не указана - первая из подкатегорий)
+    :param request:
+        запрос с параметрами фильтрации
+    :return: int
+    """
     # категория в запросе не определена
     if isinstance(request.GET.get("category"), str):
-        category_id = int(request.GET.get("category"))
-    else:
-        category: Category = Category.objects.exclude(
-            subcategories__isnull=True
-        ).first()
-        category_id = category.pk
+        return int(request.GET.get("category"))
+
+    category: Category = Category.objects.exclude(subcategories__isnull=True).first()
+    return category.pk
+
+
+async def aget_category_id(request) -> int:
+    """
+    Асинхронный вариант get_category_id
+    :param request:
+    :return: int
+    """
+    if isinstance(request.GET.get("category"), str):
+        return int(request.GET.get("category"))
+
+    category: Category = await Category.objects.exclude(
+        subcategories__isnull=True
+    ).afirst()
+    return category.pk
+
+
+def query_flag(request, name: str) -> bool:
+    """
+    Значение флага из параметров запроса (передается строкой "true"/"false")
+    :param request:
+        запрос с параметрами
+    :param name: str
+        имя параметра
+    :return: bool
+    """
+    return (request.GET.get(name) or "").capitalize() == "True"
+
+
+def tags_filter(tags: list, mode: str = "any") -> Q:
+    """
+    Фильтр товаров по тэгам без соединения с таблицей тэгов
+    (соединение размножает строки товаров и требует DISTINCT).
+    Режим "any" - полусоединение EXISTS, режим "all" - товары, у которых
+    количество найденных тэгов равно количеству запрошенных
+    (оба запроса используют индекс (tag_id, product_id) таблицы связей)
+    :param tags: list
+        id тэгов
+    :param mode: str
+        режим фильтра (TAGS_MODES)
+    :return: Q
+    """
+    product_tags = Product.tags.through.objects.filter(tag__in=tags)
+    if mode == "all":
+        return Q(
+            pk__in=product_tags.values("product_id")
+            .annotate(matched=Count("tag_id"))
+            .filter(matched=len(set(tags)))
+            .values("product_id")
+        )
+    return Q(Exists(product_tags.filter(product=OuterRef("pk"))))
+
+
+def get_catalog_filters(request, category_id: int | None = None) -> dict:
+    """
+    Параметры фильтрации каталога из запроса
+    :param request:
+        запрос с параметрами фильтрации
+    :param category_id: int | None
+        номер категории (если не передан - get_category_id)
+    :return: dict
+    """
+    if category_id is None:
+        category_id = get_category_id(request)
+    return {
+        "category_id": category_id,
+        "min_price": request.GET.get("filter[minPrice]"),
+        "max_price": request.GET.get("filter[maxPrice]"),
+        "free_delivery": query_flag(request, "filter[freeDelivery]"),
+        "available": query_flag(request, "filter[available]"),
+        "tags": request.GET.getlist("tags[]"),
+        "tags_mode": request.GET.get("tagsMode") or TAGS_MODES[0],
+        # пустая строка или пробелы (значение по умолчанию " ") - без поиска
+        "name": (request.GET.get("filter[name]") or "").strip(),
+    }
+
+
+def sorted_products(request, use_limit: bool = True):
+    """
+    Формирование отфильтрованного и отсортированного списка товаров каталога
+    :param request:
+        запрос с параметрами фильтрации и сортировки
+    :param use_limit: bool
+        ограничить выборку параметром limit (для курсорной пагинации не нужно)
+    :return: QuerySet
+    """
+    catalog_filters = get_catalog_filters(request)
+    sort = request.GET.get("sort")
+    sort_type = request.GET.get("sortType")
+    tags = catalog_filters["tags"]
+    name_product = catalog_filters["name"]
 
     limit = int(request.GET.get("limit"))
 
-    category: Category = get_object_or_404(Category, pk=category_id)
+    category: Category = get_object_or_404(Category, pk=catalog_filters["category_id"])
     filters = Q()
     filters &= Q(category=category)  # фильтр по категории
-    filters &= Q(price__range=(min_price, max_price))  # фильтр по цене
-
-    # фильтр по наименованию
-    if name_product:
-        filters &= Q(title__icontains=name_product)
+    # фильтр по цене с учетом скидки
+    filters &= Q(
+        effective_price__range=(
+            catalog_filters["min_price"],
+            catalog_filters["max_price"],
+        )
+    )
 
     # фильтр по доставке (бесплатная/платная)
     # если фильтр установлен, то сортируем - иначе выводим все товары
-    if free_delivery:
-        filters &= Q(freeDelivery=free_delivery)
+    if catalog_filters["free_delivery"]:
+        filters &= Q(freeDelivery=True)
 
-    if available:
+    if catalog_filters["available"]:
         filters &= Q(count__gt=0)  # фильтр по наличию товара
 
     if tags:
-        filters &= Q(tags__in=tags)  # фильтр по тэгам
+        # фильтр по тэгам (любой из тэгов или все тэги)
+        filters &= tags_filter(tags, catalog_filters["tags_mode"])
 
     # установка поля таблицы для cортировки по (популярности, цене, отзывам, новизне)
     sorted = get_order_field(sort, sort_type)
+    # id в качестве второго поля делает порядок однозначным (нужно для курсора)
+    sorted_id = "-id" if sorted.startswith("-") else "id"
 
     queryset: Product = (
-        Product.objects.filter(filters)
-        .annotate(
-            rating=Coalesce(Avg("reviews__rate", output_field=FloatField()), Value(0.0))
-        )
-        # .annotate(rating=Avg("reviews__rate"))
-        .annotate(count_reviews=Count("reviews__id"))
-        .select_related("category")
-        .prefetch_related(
-            "tags", "images", "specifications", "reviews", "reviews__author"
-        )
-        .order_by(sorted)[:limit]
+        Product.objects.filter(filters).for_short_list().order_by(sorted, sorted_id)
     )
+
+    # полнотекстовый поиск по наименованию, описанию, тэгам и характеристикам
+    if name_product:
+        queryset = search_products(queryset, name_product)
+
+    if use_limit:
+        return queryset[:limit]
     return queryset
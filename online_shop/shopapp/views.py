@@ -1,19 +1,19 @@
 import logging
-from dataclasses import asdict
+import time
 
-from django.db.models.functions import Coalesce
+from adrf.views import APIView as AsyncAPIView
+from asgiref.sync import sync_to_async
 from django.shortcuts import get_object_or_404
-from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django.utils.decorators import method_decorator
+from django.utils.http import http_date
 from django.views.decorators.cache import cache_page
 from django.contrib.auth.models import User
-from django.db.models import Avg, Value, FloatField
 from rest_framework import status
 from rest_framework.generics import ListAPIView
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from drf_spectacular.utils import (
     extend_schema,
     extend_schema_view,
@@ -24,38 +24,68 @@ from drf_spectacular.utils import (
 
 from shopapp.models import (
     Product,
+    Review,
     Tag,
     Sales,
-    Category,
 )
 
 from shopapp.serializers import (
     TagSerializer,
     ProductSerializer,
     ProductShortSerializer,
+    ProductShortRowSerializer,
     ReviewDBSerializer,
+    ReviewSerializer,
     SalesSerializer,
 )
 
-from services.schemas import CategoriesSchema
-from shopapp.utils import sorted_products
+from services.cache import (
+    CATEGORY_TAG,
+    PRODUCT_TAG,
+    aget_tag_versions,
+    aget_tagged,
+    aset_tagged,
+    get_tag_versions,
+    get_tagged,
+    set_tagged,
+)
+from services.banners import abuild_banners, banners_cache_key, build_banners
+from services.categories import aget_category_tree, get_category_tree
+from services.facets import astore_facets, facets_cache_key, store_facets
+from services.metrics import serializer_data
+from services.popular import popular_product_ids
+from services.sales import SALES_SORTS, get_sales_list
+from services.search import search_products, search_suggestions
+from shopapp.utils import (
+    TAGS_MODES,
+    aget_category_id,
+    sorted_products,
+    get_category_id,
+    query_flag,
+)
+from shopapp.pagination import (
+    CustomPagination,
+    CatalogPagination,
+    CatalogCursorPagination,
+    ReviewCursorPagination,
+    catalog_cache_key,
+)
 
 log = logging.getLogger(__name__)
 
+# время хранения страницы каталога в кеше (сек)
+CATALOG_CACHE_TIMEOUT = 10 * 60
 
-class CustomPagination(PageNumberPagination):
-    page_size = 10
-    max_page_size = 1000
-    page_query_param = "currentPage"
+# количество популярных товаров и время хранения их списка в кеше (сек)
+POPULAR_LIMIT = 8
+POPULAR_CACHE_TIMEOUT = 60 * 60
 
-    def get_paginated_response(self, data):
-        return Response(
-            {
-                "items": data,
-                "currentPage": self.page.number,
-                "lastPage": self.page.paginator.num_pages,
-            }
-        )
+# время хранения карточки товара в кеше (сек)
+PRODUCT_CACHE_TIMEOUT = 24 * 60 * 60
+
+# количество товаров в результатах поиска (по умолчанию и максимальное)
+SEARCH_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
 
 
 class TagApiView(APIView):
@@ -98,50 +128,158 @@ class TagApiView(APIView):
         )
         serializer = TagSerializer(tags, many=True)
         return Response(
-            serializer.data,
+            serializer_data(serializer),
             status=status.HTTP_200_OK,
         )
 
 
+# описание в схеме API, общее для синхронного и асинхронного вариантов
+product_schema = extend_schema(
+    tags=["product"],
+    summary="Вывод информации по продукту с id",
+    responses={
+        status.HTTP_200_OK: ProductSerializer,
+        status.HTTP_400_BAD_REQUEST: OpenApiResponse(
+            response=None,
+            description="Product not found",
+        ),
+        status.HTTP_500_INTERNAL_SERVER_ERROR: OpenApiResponse(
+            response=None,
+            description="Что-то пошло не так",
+        ),
+    },
+)
+
+
 class ProductApiView(APIView):
-    @extend_schema(
-        tags=["product"],
-        summary="Вывод информации по продукту с id",
-        responses={
-            status.HTTP_200_OK: ProductSerializer,
-            status.HTTP_400_BAD_REQUEST: OpenApiResponse(
-                response=None,
-                description="Product not found",
-            ),
-            status.HTTP_500_INTERNAL_SERVER_ERROR: OpenApiResponse(
-                response=None,
-                description="Что-то пошло не так",
-            ),
-        },
-    )
+    @product_schema
     def get(self, request, pk: int):
         log.info("Запрос информации по продукту с id %s", pk)
-        product: Product = (
-            Product.objects.filter(pk=pk)
-            .select_related("category")
-            .prefetch_related(
-                "tags", "images", "specifications", "reviews", "reviews__author"
-            )
-            .first()
-        )
+        # карточка кешируется вместе с ETag (версия тэга товара) и временем
+        # построения; тэг инвалидируется сигналами товара, его отзывов,
+        # скидок, характеристик и изображений
+        cache_key = f"product_detail:{pk}"
+        entry = get_tagged(cache_key)
 
-        if product is None:
+        if entry is None:
+            entry = self.build_product(pk, cache_key)
+        else:
+            log.info("Получаем данные продукта из кеша %s", cache_key)
+
+        return self.product_response(request, pk, entry)
+
+    @staticmethod
+    def product_response(request, pk: int, entry: dict | None):
+        """
+        Ответ с карточкой товара: заголовки ETag и Last-Modified,
+        304 Not Modified при совпадении версии у клиента
+        :param request:
+        :param pk: int
+            id товара
+        :param entry: dict | None
+            данные товара из кеша (None - товар не найден)
+        :return: Response | HttpResponseNotModified
+        """
+        if entry is None:
             log.info("Продукт с id %s не найден", pk)
             return Response(
                 {"massage": "Product not found"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        serializer = ProductSerializer(product)
-        log.info("Запрос информации по продукту с id %s успешно выполнен", pk)
-        return Response(
-            serializer.data,
+
+        response = Response(
+            entry["data"],
             status=status.HTTP_200_OK,
         )
+        response["ETag"] = entry["etag"]
+        response["Last-Modified"] = http_date(entry["modified"])
+        # клиент и прокси хранят карточку, но проверяют ее актуальность
+        patch_cache_control(response, public=True, no_cache=True)
+        log.info("Запрос информации по продукту с id %s успешно выполнен", pk)
+        # 304 Not Modified по заголовкам If-None-Match / If-Modified-Since
+        return get_conditional_response(
+            request,
+            etag=entry["etag"],
+            last_modified=entry["modified"],
+            response=response,
+        )
+
+    @staticmethod
+    def build_product(pk: int, cache_key: str) -> dict | None:
+        """
+        Построение карточки товара и сохранение ее в кеше
+        :param pk: int
+            id товара
+        :param cache_key: str
+            ключ записи кеша
+        :return: dict | None
+            данные товара, ETag и время построения (None - товар не найден)
+        """
+        tag = PRODUCT_TAG.format(pk)
+        versions = get_tag_versions((tag,))
+
+        product: Product = Product.objects.filter(pk=pk).for_detail().first()
+        if product is None:
+            return None
+
+        entry = ProductApiView.product_entry(product, versions[tag])
+        set_tagged(cache_key, entry, versions, PRODUCT_CACHE_TIMEOUT)
+        log.info("Записываем данные продукта в кеш %s", cache_key)
+        return entry
+
+    @staticmethod
+    def product_entry(product: Product, version: str) -> dict:
+        """
+        Запись кеша с карточкой товара
+        :param product: Product
+            товар со связанными данными (for_detail)
+        :param version: str
+            версия тэга товара (ETag)
+        :return: dict
+        """
+        return {
+            "data": serializer_data(ProductSerializer(product)),
+            "etag": f'"{version}"',
+            "modified": int(time.time()),
+        }
+
+
+# асинхронный вариант ProductApiView (режим ASGI)
+class AsyncProductApiView(AsyncAPIView, ProductApiView):
+    @product_schema
+    async def get(self, request, pk: int):
+        log.info("Запрос информации по продукту с id %s", pk)
+        cache_key = f"product_detail:{pk}"
+        entry = await aget_tagged(cache_key)
+
+        if entry is None:
+            entry = await self.abuild_product(pk, cache_key)
+        else:
+            log.info("Получаем данные продукта из кеша %s", cache_key)
+
+        return self.product_response(request, pk, entry)
+
+    @staticmethod
+    async def abuild_product(pk: int, cache_key: str) -> dict | None:
+        """
+        Асинхронный вариант build_product
+        :param pk: int
+        :param cache_key: str
+        :return: dict | None
+        """
+        tag = PRODUCT_TAG.format(pk)
+        versions = await aget_tag_versions((tag,))
+
+        # связанные данные загружаются prefetch_related вместе с товаром,
+        # сериализация выполняется без запросов к базе данных
+        product: Product = await Product.objects.filter(pk=pk).for_detail().afirst()
+        if product is None:
+            return None
+
+        entry = ProductApiView.product_entry(product, versions[tag])
+        await aset_tagged(cache_key, entry, versions, PRODUCT_CACHE_TIMEOUT)
+        log.info("Записываем данные продукта в кеш %s", cache_key)
+        return entry
 
 
 class GetUserForReviewApiView(APIView):
@@ -188,6 +326,63 @@ class GetUserForReviewApiView(APIView):
 class ProductReviewApiView(APIView):
     permission_classes = [IsAuthenticated]
 
+    def get_permissions(self):
+        # отзывы доступны всем, создание отзыва - авторизованным пользователям
+        if self.request.method == "GET":
+            return [AllowAny()]
+        return super().get_permissions()
+
+    @extend_schema(
+        tags=["product"],
+        summary="Постраничный вывод отзывов о товаре (от новых к старым)",
+        responses={
+            status.HTTP_200_OK: ReviewSerializer(many=True),
+            status.HTTP_404_NOT_FOUND: OpenApiResponse(
+                response=None,
+                description="No Product matches the given query",
+            ),
+            status.HTTP_500_INTERNAL_SERVER_ERROR: OpenApiResponse(
+                response=None,
+                description="Что-то пошло не так",
+            ),
+        },
+        parameters=[
+            OpenApiParameter(
+                name="cursor",
+                location=OpenApiParameter.QUERY,
+                description="курсор страницы (nextCursor предыдущего ответа)",
+                required=False,
+                type=str,
+            ),
+            OpenApiParameter(
+                name="limit",
+                location=OpenApiParameter.QUERY,
+                description="количество отзывов на странице",
+                required=False,
+                default=10,
+                type=int,
+            ),
+        ],
+    )
+    def get(self, request, pk: int):
+        log.info("Запрос отзывов о товаре с id %s", pk)
+        product: Product = get_object_or_404(Product.objects.only("pk"), pk=pk)
+        queryset = (
+            Review.objects.filter(product=product)
+            .select_related("author")
+            .order_by("-date", "-id")
+        )
+
+        # количество отзывов хранится в кеше до изменения отзывов товара
+        paginator = ReviewCursorPagination(
+            count_cache_key=f"reviews_count:{pk}",
+            count_cache_tags=(PRODUCT_TAG.format(pk),),
+        )
+        result_page = paginator.paginate_queryset(queryset, request)
+
+        serializer = ReviewSerializer(result_page, many=True)
+        return paginator.get_paginated_response(serializer_data(serializer))
+
     @extend_schema(
         tags=["product"],
         summary="Создание отзыва о товаре авторизованного пользователя",
@@ -247,73 +442,467 @@ class ProductReviewApiView(APIView):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+categories_schema = extend_schema(
+    tags=["catalog"],
+    summary="Вывод всех категорий товаров",
+    responses={
+        status.HTTP_500_INTERNAL_SERVER_ERROR: OpenApiResponse(
+            response=None,
+            description="Что-то пошло не так",
+        ),
+    },
+)
+
+
 class CategoriesApiView(APIView):
     serializer_class = None
 
-    @extend_schema(
-        tags=["catalog"],
-        summary="Вывод всех категорий товаров",
-        responses={
-            status.HTTP_500_INTERNAL_SERVER_ERROR: OpenApiResponse(
-                response=None,
-                description="Что-то пошло не так",
-            ),
-        },
-    )
+    @categories_schema
     def get(self, request):
         log.info("Загрузка категорий товара")
-        # список всех каталогов товаров (категорий)
-        all_сategories = []
-        # выборка родительский каталогов
-        сategories = Category.objects.filter(subcategories__isnull=True).exclude(
-            title="Доставка"
+        # дерево категорий строится одним запросом и хранится в кеше
+        all_сategories = get_category_tree()
+
+        return Response(
+            all_сategories,
+            status=status.HTTP_200_OK,
         )
-        for сategory in сategories:
-            data_сategory = CategoriesSchema(
-                id=сategory.id,
-                title=сategory.title,
-                image={
-                    "src": "".join(["/media/", str(сategory.image)]),
-                    "alt": сategory.slug,
-                },
+
+
+# асинхронный вариант CategoriesApiView (режим ASGI)
+class AsyncCategoriesApiView(AsyncAPIView, CategoriesApiView):
+    @categories_schema
+    async def get(self, request):
+        log.info("Загрузка категорий товара")
+        all_сategories = await aget_category_tree()
+
+        return Response(
+            all_сategories,
+            status=status.HTTP_200_OK,
+        )
+
+
+catalog_schema = extend_schema(
+    tags=["catalog"],
+    summary="Вывод списка отфильтрованных товаров из указанного каталога ",
+    responses={
+        status.HTTP_200_OK: ProductShortSerializer(many=True),
+        status.HTTP_400_BAD_REQUEST: OpenApiResponse(
+            response=None,
+            description="В запросе не указан номер категории товаров",
+        ),
+        status.HTTP_404_NOT_FOUND: OpenApiResponse(
+            response=None,
+            description="No Category matches the given query",
+        ),
+        status.HTTP_500_INTERNAL_SERVER_ERROR: OpenApiResponse(
+            response=None,
+            description="Что-то пошло не так",
+        ),
+    },
+    parameters=[
+        OpenApiParameter(
+            name="currentPage",
+            location=OpenApiParameter.QUERY,
+            description="номер страницы",
+            required=False,
+            default=1,
+            type=int,
+        ),
+        OpenApiParameter(
+            name="filter[name]",
+            location=OpenApiParameter.QUERY,
+            description="поисковый запрос (наименование, описание, тэги, "
+            "характеристики товара)",
+            required=False,
+            default=" ",
+            type=str,
+        ),
+        OpenApiParameter(
+            name="filter[minPrice]",
+            location=OpenApiParameter.QUERY,
+            description="минимальная цена",
+            required=False,
+            default=0,
+            type=int,
+        ),
+        OpenApiParameter(
+            name="filter[maxPrice]",
+            location=OpenApiParameter.QUERY,
+            description="максимальная цена",
+            required=False,
+            default=500000,
+            type=int,
+        ),
+        OpenApiParameter(
+            name="filter[freeDelivery]",
+            location=OpenApiParameter.QUERY,
+            description="фильтр по наличию бесплатной доставки",
+            required=False,
+            default="false",
+            type=str,
+        ),
+        OpenApiParameter(
+            name="filter[available]",
+            location=OpenApiParameter.QUERY,
+            description="фильтр по наличию товара",
+            required=False,
+            default="false",
+            type=str,
+        ),
+        OpenApiParameter(
+            name="category",
+            location=OpenApiParameter.QUERY,
+            description="номер категории товара",
+            required=False,
+            default=4,
+            type=int,
+        ),
+        OpenApiParameter(
+            name="sort",
+            location=OpenApiParameter.QUERY,
+            description="название типа сортировки товаров",
+            required=False,
+            default="price",
+            type=str,
+        ),
+        OpenApiParameter(
+            name="sortType",
+            location=OpenApiParameter.QUERY,
+            description="тип сортировки товаров",
+            required=False,
+            default="inc",
+            type=str,
+        ),
+        OpenApiParameter(
+            name="limit",
+            location=OpenApiParameter.QUERY,
+            description="количество товаров в списке",
+            required=False,
+            default=20,
+            type=int,
+        ),
+        OpenApiParameter(
+            name="tags[]",
+            location=OpenApiParameter.QUERY,
+            description="id тэгов",
+            required=False,
+            type=int,
+            many=True,
+        ),
+        OpenApiParameter(
+            name="tagsMode",
+            location=OpenApiParameter.QUERY,
+            description="режим фильтра по тэгам: any - любой из тэгов, "
+            "all - все тэги",
+            required=False,
+            default="any",
+            enum=TAGS_MODES,
+            type=str,
+        ),
+        OpenApiParameter(
+            name="cursor",
+            location=OpenApiParameter.QUERY,
+            description="курсор страницы (nextCursor предыдущего ответа); "
+            "наличие параметра включает курсорную пагинацию, "
+            "для первой страницы передается пустое значение",
+            required=False,
+            type=str,
+        ),
+        OpenApiParameter(
+            name="facets",
+            location=OpenApiParameter.QUERY,
+            description="добавить в ответ фасеты фильтров (блок facets)",
+            required=False,
+            default="false",
+            type=str,
+        ),
+    ],
+)
+
+
+class CatalogApiView(APIView):
+    @catalog_schema
+    def get(self, request):
+        # ответ кешируется по набору параметров запроса и инвалидируется
+        # тэгами категории и попавших в выдачу товаров
+        cache_key = catalog_cache_key("catalog", request, exclude=())
+        data = get_tagged(cache_key)
+
+        if data is None:
+            data = self.build_page(request, cache_key)
+        else:
+            log.info("Получаем данные каталога из кеша %s", cache_key)
+
+        return Response(
+            data,
+            status=status.HTTP_200_OK,
+        )
+
+    def build_page(self, request, cache_key: str) -> dict:
+        """
+        Построение страницы каталога и сохранение ее в кеше
+        """
+        category_tags = (CATEGORY_TAG.format(get_category_id(request)),)
+        versions = get_tag_versions(category_tags)
+
+        data = self.paginate_catalog(request, category_tags)
+        if query_flag(request, "facets"):
+            facets_key = facets_cache_key(request)
+            data["facets"] = get_tagged(facets_key) or store_facets(request, facets_key)
+
+        versions.update(
+            get_tag_versions(PRODUCT_TAG.format(item["id"]) for item in data["items"])
+        )
+        set_tagged(cache_key, data, versions, CATALOG_CACHE_TIMEOUT)
+        log.info("Записываем данные каталога в кеш %s", cache_key)
+        return data
+
+    def paginate_catalog(self, request, category_tags: tuple[str, ...]) -> dict:
+        """
+        Страница каталога с пагинацией по номеру страницы или по курсору
+        """
+        if CatalogCursorPagination.cursor_query_param in request.GET:
+            return self.get_cursor_page(request, category_tags)
+        return self.get_page(request, category_tags)
+
+    def get_page(self, request, category_tags: tuple[str, ...]) -> dict:
+        """
+        Страница каталога с постраничной пагинацией по номеру страницы
+        """
+        current_page = int(request.GET.get("currentPage"))
+
+        queryset = sorted_products(request)
+
+        paginator = CatalogPagination(
+            count_cache_key=catalog_cache_key(
+                "catalog_count",
+                request,
+                exclude=("currentPage", "sort", "sortType"),
+            ),
+            count_cache_tags=category_tags,
+        )
+        result_page = paginator.paginate_queryset(
+            ProductShortRowSerializer.values_queryset(queryset), request
+        )
+
+        serializer = ProductShortRowSerializer(result_page)
+        return {
+            "items": serializer_data(serializer),
+            "currentPage": current_page,
+            "lastPage": paginator.page.paginator.num_pages,
+        }
+
+    def get_cursor_page(self, request, category_tags: tuple[str, ...]) -> dict:
+        """
+        Страница каталога с курсорной пагинацией
+        (без OFFSET, количество страниц берется из кеша)
+        """
+        log.info("Запрос страницы каталога по курсору")
+        queryset = sorted_products(request, use_limit=False)
+
+        paginator = CatalogCursorPagination(
+            count_cache_key=catalog_cache_key(
+                "catalog_cursor_count",
+                request,
+                exclude=("currentPage", "cursor", "sort", "sortType", "limit"),
+            ),
+            count_cache_tags=category_tags,
+        )
+        result_page = paginator.paginate_queryset(
+            ProductShortRowSerializer.values_queryset(queryset), request
+        )
+
+        serializer = ProductShortRowSerializer(result_page)
+        return paginator.get_paginated_response(serializer_data(serializer)).data
+
+
+# асинхронный вариант CatalogApiView (режим ASGI)
+class AsyncCatalogApiView(AsyncAPIView, CatalogApiView):
+    @catalog_schema
+    async def get(self, request):
+        cache_key = catalog_cache_key("catalog", request, exclude=())
+        data = await aget_tagged(cache_key)
+
+        if data is None:
+            data = await self.abuild_page(request, cache_key)
+        else:
+            log.info("Получаем данные каталога из кеша %s", cache_key)
+
+        return Response(
+            data,
+            status=status.HTTP_200_OK,
+        )
+
+    async def abuild_page(self, request, cache_key: str) -> dict:
+        """
+        Асинхронный вариант build_page
+        """
+        category_tags = (CATEGORY_TAG.format(await aget_category_id(request)),)
+        versions = await aget_tag_versions(category_tags)
+
+        # пагинация DRF и кеш количества товаров - синхронный код
+        data = await sync_to_async(self.paginate_catalog)(request, category_tags)
+        if query_flag(request, "facets"):
+            facets_key = facets_cache_key(request)
+            data["facets"] = await aget_tagged(facets_key) or await astore_facets(
+                request, facets_key
+            )
+
+        versions.update(
+            await aget_tag_versions(
+                PRODUCT_TAG.format(item["id"]) for item in data["items"]
             )
-            # Добавление подкаталогов товаров
-            res_сategory = asdict(data_сategory)
-            res_сategory["subcategories"] = list()
-
-            subcategories = Category.objects.filter(subcategories=сategory)
-            for subcategory in subcategories:
-                data_сategory = CategoriesSchema(
-                    id=subcategory.id,
-                    title=subcategory.title,
-                    image={
-                        "src": "".join(["/media/", str(subcategory.image)]),
-                        "alt": subcategory.slug,
+        )
+        await aset_tagged(cache_key, data, versions, CATALOG_CACHE_TIMEOUT)
+        log.info("Записываем данные каталога в кеш %s", cache_key)
+        return data
+
+
+facets_schema = extend_schema(
+    tags=["catalog"],
+    summary="Фасеты фильтров каталога: диапазон и гистограмма цен, "
+    "количество товаров по тэгам, с бесплатной доставкой и в наличии",
+    responses={
+        status.HTTP_200_OK: OpenApiResponse(
+            response=None,
+            description="Фасеты для текущего состояния фильтров",
+            examples=[
+                OpenApiExample(
+                    "Фасеты",
+                    value={
+                        "count": 3,
+                        "price": {"min": 490.0, "max": 3490.0},
+                        "histogram": [
+                            {"min": 490.0, "max": 1990.0, "count": 2},
+                            {"min": 1990.0, "max": 3490.0, "count": 1},
+                        ],
+                        "tags": [{"id": 1, "name": "ноутбук", "count": 3}],
+                        "freeDelivery": 1,
+                        "available": 3,
                     },
                 )
-                res_сategory["subcategories"].append(asdict(data_сategory))
+            ],
+        ),
+        status.HTTP_500_INTERNAL_SERVER_ERROR: OpenApiResponse(
+            response=None,
+            description="Что-то пошло не так",
+        ),
+    },
+    parameters=[
+        OpenApiParameter(
+            name="category",
+            location=OpenApiParameter.QUERY,
+            description="номер категории товара",
+            required=False,
+            default=4,
+            type=int,
+        ),
+        OpenApiParameter(
+            name="filter[name]",
+            location=OpenApiParameter.QUERY,
+            description="поисковый запрос",
+            required=False,
+            type=str,
+        ),
+        OpenApiParameter(
+            name="filter[minPrice]",
+            location=OpenApiParameter.QUERY,
+            description="минимальная цена",
+            required=False,
+            type=int,
+        ),
+        OpenApiParameter(
+            name="filter[maxPrice]",
+            location=OpenApiParameter.QUERY,
+            description="максимальная цена",
+            required=False,
+            type=int,
+        ),
+        OpenApiParameter(
+            name="filter[freeDelivery]",
+            location=OpenApiParameter.QUERY,
+            description="фильтр по наличию бесплатной доставки",
+            required=False,
+            default="false",
+            type=str,
+        ),
+        OpenApiParameter(
+            name="filter[available]",
+            location=OpenApiParameter.QUERY,
+            description="фильтр по наличию товара",
+            required=False,
+            default="false",
+            type=str,
+        ),
+        OpenApiParameter(
+            name="tags[]",
+            location=OpenApiParameter.QUERY,
+            description="id тэгов",
+            required=False,
+            type=int,
+            many=True,
+        ),
+        OpenApiParameter(
+            name="tagsMode",
+            location=OpenApiParameter.QUERY,
+            description="режим фильтра по тэгам: any - любой из тэгов, "
+            "all - все тэги",
+            required=False,
+            default="any",
+            enum=TAGS_MODES,
+            type=str,
+        ),
+    ],
+)
+
 
-            all_сategories.append(res_сategory)
+class CatalogFacetsApiView(APIView):
+    @facets_schema
+    def get(self, request):
+        # фасеты кешируются по параметрам фильтрации и инвалидируются
+        # тэгом категории (меняется при изменении ее товаров)
+        cache_key = facets_cache_key(request)
+        data = get_tagged(cache_key)
+
+        if data is None:
+            data = store_facets(request, cache_key)
+        else:
+            log.info("Получаем фасеты каталога из кеша %s", cache_key)
 
         return Response(
-            all_сategories,
+            data,
             status=status.HTTP_200_OK,
         )
 
 
-class CatalogApiView(APIView):
+# асинхронный вариант CatalogFacetsApiView (режим ASGI)
+class AsyncCatalogFacetsApiView(AsyncAPIView, CatalogFacetsApiView):
+    @facets_schema
+    async def get(self, request):
+        cache_key = facets_cache_key(request)
+        data = await aget_tagged(cache_key)
+
+        if data is None:
+            data = await astore_facets(request, cache_key)
+        else:
+            log.info("Получаем фасеты каталога из кеша %s", cache_key)
+
+        return Response(
+            data,
+            status=status.HTTP_200_OK,
+        )
+
+
+class SearchApiView(APIView):
     @extend_schema(
         tags=["catalog"],
-        summary="Вывод списка отфильтрованных товаров из указанного каталога ",
+        summary="Полнотекстовый поиск товаров с подсказками",
         responses={
-            status.HTTP_200_OK: ProductShortSerializer(many=True),
-            status.HTTP_400_BAD_REQUEST: OpenApiResponse(
-                response=None,
-                description="В запросе не указан номер категории товаров",
-            ),
-            status.HTTP_404_NOT_FOUND: OpenApiResponse(
+            status.HTTP_200_OK: OpenApiResponse(
                 response=None,
-                description="No Category matches the given query",
+                description="Найденные товары (по убыванию релевантности) "
+                "и подсказки к запросу",
             ),
             status.HTTP_500_INTERNAL_SERVER_ERROR: OpenApiResponse(
                 response=None,
@@ -322,145 +911,100 @@ class CatalogApiView(APIView):
         },
         parameters=[
             OpenApiParameter(
-                name="currentPage",
+                name="query",
                 location=OpenApiParameter.QUERY,
-                description="номер страницы",
-                required=False,
-                default=1,
-                type=int,
-            ),
-            OpenApiParameter(
-                name="filter[name]",
-                location=OpenApiParameter.QUERY,
-                description="название фильтра",
-                required=False,
-                default=" ",
-                type=str,
-            ),
-            OpenApiParameter(
-                name="filter[minPrice]",
-                location=OpenApiParameter.QUERY,
-                description="минимальная цена",
-                required=False,
-                default=0,
-                type=int,
-            ),
-            OpenApiParameter(
-                name="filter[maxPrice]",
-                location=OpenApiParameter.QUERY,
-                description="максимальная цена",
-                required=False,
-                default=500000,
-                type=int,
-            ),
-            OpenApiParameter(
-                name="filter[freeDelivery]",
-                location=OpenApiParameter.QUERY,
-                description="фильтр по наличию бесплатной доставки",
-                required=False,
-                default="false",
-                type=str,
-            ),
-            OpenApiParameter(
-                name="filter[available]",
-                location=OpenApiParameter.QUERY,
-                description="фильтр по наличию товара",
-                required=False,
-                default="false",
-                type=str,
-            ),
-            OpenApiParameter(
-                name="category",
-                location=OpenApiParameter.QUERY,
-                description="номер категории товара",
-                required=False,
-                default=4,
-                type=int,
-            ),
-            OpenApiParameter(
-                name="sort",
-                location=OpenApiParameter.QUERY,
-                description="название типа сортировки товаров",
-                required=False,
-                default="price",
-                type=str,
-            ),
-            OpenApiParameter(
-                name="sortType",
-                location=OpenApiParameter.QUERY,
-                description="тип сортировки товаров",
-                required=False,
-                default="inc",
+                description="поисковый запрос",
+                required=True,
                 type=str,
             ),
             OpenApiParameter(
                 name="limit",
                 location=OpenApiParameter.QUERY,
-                description="количество товаров в списке",
+                description="количество товаров в результатах поиска",
                 required=False,
-                default=20,
+                default=SEARCH_LIMIT,
                 type=int,
             ),
         ],
+        examples=[
+            OpenApiExample(
+                "Пример результата поиска",
+                value={
+                    "items": [],
+                    "suggestions": ["Apple iPhone 16 256GB White sim+esim"],
+                },
+                response_only=True,
+            ),
+        ],
     )
     def get(self, request):
-        current_page = int(request.GET.get("currentPage"))
+        query = request.GET.get("query", "").strip()
+        try:
+            limit = int(request.GET.get("limit", SEARCH_LIMIT))
+        except ValueError:
+            limit = SEARCH_LIMIT
+        limit = max(1, min(limit, SEARCH_MAX_LIMIT))
 
-        queryset = sorted_products(request)
+        if not query:
+            return Response(
+                {"items": [], "suggestions": []},
+                status=status.HTTP_200_OK,
+            )
 
-        paginator = CustomPagination()
-        result_page = paginator.paginate_queryset(queryset, request)
-
-        serializer = ProductShortSerializer(result_page, many=True)
-        data = {
-            "items": serializer.data,
-            "currentPage": current_page,
-            "lastPage": paginator.page.paginator.num_pages,
-        }
+        log.info("Поиск товаров по запросу %r", query)
+        products = Product.objects.for_short_list()
+        queryset = search_products(products, query).order_by("-rank", "id")[:limit]
 
+        serializer = ProductShortSerializer(queryset, many=True)
         return Response(
-            data,
+            {
+                "items": serializer_data(serializer),
+                "suggestions": search_suggestions(Product.objects.all(), query),
+            },
             status=status.HTTP_200_OK,
         )
 
 
-@extend_schema(tags=["catalog"])
-@extend_schema_view(
-    list=extend_schema(
+class PopularListApiView(APIView):
+    """
+    Генерирует список из 8 товаров с максимальным рейтингом популярности
+    (рейтинг перестраивается периодической задачей refresh_popular_products)
+    """
+
+    @extend_schema(
+        tags=["catalog"],
         summary="Получить список популярных товаров",
         responses={
-            status.HTTP_200_OK: ProductShortSerializer,
+            status.HTTP_200_OK: ProductShortSerializer(many=True),
             status.HTTP_500_INTERNAL_SERVER_ERROR: OpenApiResponse(
                 response=None,
                 description="Что-то пошло не так",
             ),
         },
-    ),
-)
-class PopularListApiView(ListAPIView):
-    """
-    Генерирует список из 8 товаров с максимальным рейтингом
-    """
-
-    queryset = (
-        Product.objects.all()
-        .annotate(
-            rating=Coalesce(Avg("reviews__rate", output_field=FloatField()), Value(0.0))
-        )
-        .select_related("category")
-        .prefetch_related(
-            "tags", "images", "specifications", "reviews", "reviews__author"
-        )
-        .exclude(title__in=["Доставка", "Экспресс-доставка", "Бесплатная доставка"])
-        .order_by("-rating")[:8]
     )
-    serializer_class = ProductShortSerializer
+    def get(self, request):
+        product_ids = popular_product_ids(POPULAR_LIMIT)
+        # ответ кешируется для текущего набора товаров рейтинга
+        # и инвалидируется тэгами этих товаров
+        cache_key = "popular:{}".format(",".join(map(str, product_ids)))
+        data = get_tagged(cache_key)
 
-    @method_decorator(cache_page(5 * 60 * 60, key_prefix="popular"))
-    def get(self, *args, **kwargs):
-        res = super().get(*args, **kwargs)
-        res.data = res.data["results"]
-        return res
+        if data is None:
+            versions = get_tag_versions(PRODUCT_TAG.format(pk) for pk in product_ids)
+            products = (
+                Product.objects.filter(pk__in=product_ids).for_short_list().in_bulk()
+            )
+            serializer = ProductShortSerializer(
+                [products[pk] for pk in product_ids if pk in products], many=True
+            )
+            data = serializer_data(serializer)
+            set_tagged(cache_key, data, versions, POPULAR_CACHE_TIMEOUT)
+            log.info("Записываем список популярных товаров в кеш %s", cache_key)
+
+        return Response(
+            data,
+            status=status.HTTP_200_OK,
+        )
 
 
 class LimitListApiView(ListAPIView):
@@ -470,10 +1014,7 @@ class LimitListApiView(ListAPIView):
 
     queryset = (
         Product.objects.filter(count__range=(1, 10))
-        .select_related("category")
-        .prefetch_related(
-            "tags", "images", "specifications", "reviews", "reviews__author"
-        )
+        .for_short_list()
         .order_by("id")[:16]
     )
     serializer_class = ProductShortSerializer
@@ -485,6 +1026,19 @@ class LimitListApiView(ListAPIView):
         return res
 
 
+banners_schema = extend_schema(
+    tags=["catalog"],
+    summary="Вывод товаров для каждой категории",
+    responses={
+        status.HTTP_200_OK: ProductShortSerializer(many=True),
+        status.HTTP_500_INTERNAL_SERVER_ERROR: OpenApiResponse(
+            response=None,
+            description="Что-то пошло не так",
+        ),
+    },
+)
+
+
 class BannersListApiView(APIView):
     """
     Генерирует список с товарами по одному из каждой категории
@@ -492,51 +1046,36 @@ class BannersListApiView(APIView):
 
     serializer_class = ProductShortSerializer
 
-    @extend_schema(
-        tags=["catalog"],
-        summary="Вывод товаров для каждой категории",
-        responses={
-            status.HTTP_200_OK: ProductShortSerializer(many=True),
-            status.HTTP_500_INTERNAL_SERVER_ERROR: OpenApiResponse(
-                response=None,
-                description="Что-то пошло не так",
-            ),
-        },
-    )
+    @banners_schema
     def get(self, request):
-        cache_key = "catalog_banners"
-        data_banners = cache.get(cache_key)
+        cache_key = banners_cache_key()
+        data_banners = get_tagged(cache_key)
 
         if data_banners is None:
-            log.info("Create banners list")
+            # товары выбираются одним запросом DISTINCT ON
+            data_banners = build_banners()
+        else:
+            log.info("Получаем данные из кеша %s", cache_key)
 
-            category: Category = (
-                Category.objects.values("pk").exclude(subcategories__isnull=True).all()
-            )
+        return Response(
+            data_banners,
+            status=status.HTTP_200_OK,
+        )
 
-            data_banners = list()
-            list_pk_category = [i_category["pk"] for i_category in category]
-
-            for id_category in list_pk_category:
-                queryset = (
-                    Product.objects.filter(category__pk=id_category)
-                    .select_related("category")
-                    .prefetch_related(
-                        "tags", "images", "specifications", "reviews", "reviews__author"
-                    )
-                    .first()
-                )
 
-                if queryset:
-                    log.info("Category %s add in banners list", id_category)
-                    serializer = ProductShortSerializer(queryset)
-                    data_banners.append(serializer.data)
-                else:
-                    log.info("Category %s not product for banners list", id_category)
+# асинхронный вариант BannersListApiView (режим ASGI)
+class AsyncBannersListApiView(AsyncAPIView, BannersListApiView):
+    """
+    Генерирует список с товарами по одному из каждой категории
+    """
+
+    @banners_schema
+    async def get(self, request):
+        cache_key = banners_cache_key()
+        data_banners = await aget_tagged(cache_key)
 
-            # сохранение данных кеша по ключу
-            cache.set(cache_key, data_banners, 30 * 60 * 60)
-            log.info("Записываем данные в кеш %s", cache_key)
+        if data_banners is None:
+            data_banners = await abuild_banners()
         else:
             log.info("Получаем данные из кеша %s", cache_key)
 
@@ -549,7 +1088,7 @@ class BannersListApiView(APIView):
 @extend_schema(tags=["catalog"])
 @extend_schema_view(
     list=extend_schema(
-        summary="Вывод скидок",
+        summary="Вывод действующих скидок",
         responses={
             status.HTTP_200_OK: SalesSerializer,
             status.HTTP_500_INTERNAL_SERVER_ERROR: OpenApiResponse(
@@ -566,18 +1105,31 @@ class BannersListApiView(APIView):
                 default=1,
                 type=int,
             ),
+            OpenApiParameter(
+                name="sort",
+                location=OpenApiParameter.QUERY,
+                description="порядок списка: id или discount (по размеру скидки)",
+                required=False,
+                default="id",
+                enum=SALES_SORTS,
+                type=str,
+            ),
         ],
     ),
 )
 class SalesListApiView(ListAPIView):
     """
-    Генерирует список товаров со скидкой
+    Генерирует список товаров с действующей скидкой
     """
 
-    queryset = (
-        Sales.objects.select_related("product")
-        .prefetch_related("product__images")
-        .all()
-    )
+    queryset = Sales.objects.all()
     serializer_class = SalesSerializer
     pagination_class = CustomPagination
+
+    def list(self, request, *args, **kwargs):
+        sort = request.GET.get("sort")
+        if sort not in SALES_SORTS:
+            sort = SALES_SORTS[0]
+        # страницы нарезаются из закешированного списка (без запроса COUNT)
+        page = self.paginate_queryset(get_sales_list(sort))
+        return self.get_paginated_response(page)